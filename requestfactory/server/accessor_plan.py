@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+from requestfactory.server.service_layer import ServiceLayer
+
+
+class AccessorPlan(object):
+    """A table of property accessors for a single domain type. Each getter and
+    setter is looked up through {@link ServiceLayer#getGetter(Class, String)} or
+    {@link ServiceLayer#getSetter(Class, String)} the first time the property is
+    used and is then called directly.
+    <p>
+    Instances are created by {@link ServiceLayer#getAccessorPlan(Class)} and
+    are shared by all requests.
+    """
+
+    def __init__(self, layer, domainType):
+        """@param layer the ServiceLayerDecorator that builds the plan
+        @param domainType the domain type whose properties are accessed
+        """
+        self._layer = layer
+        self._domainType = domainType
+        # Maps property names to callables taking the domain object
+        self._getters = dict()
+        # Maps property names to callables taking the domain object and a value
+        self._setters = dict()
+        # Decorators above the layer that replace property access must be called
+        self._getPropertyOverridden = _isOverridden(layer, 'getProperty')
+        self._setPropertyOverridden = _isOverridden(layer, 'setProperty')
+
+
+    def getDomainType(self):
+        return self._domainType
+
+
+    def getGetter(self, prop):
+        """Returns a callable that retrieves the named property from an instance
+        of the domain type.
+        """
+        getter = self._getters.get(prop)
+        if getter is None:
+            getter = self._layer.getTop().getGetter(self._domainType, prop)
+            if getter is None:
+                return self._layer.die(None,
+                        "Could not determine getter for property %s on type %s",
+                        prop, self._domainType.__name__)
+            self._getters[prop] = getter
+        return getter
+
+
+    def getSetter(self, prop):
+        """Returns a callable that sets the named property on an instance of the
+        domain type.
+        """
+        setter = self._setters.get(prop)
+        if setter is None:
+            setter = self._layer.getTop().getSetter(self._domainType, prop)
+            if setter is None:
+                return self._layer.die(None,
+                        "Could not locate setter for property %s in type %s",
+                        prop, self._domainType.__name__)
+            self._setters[prop] = setter
+        return setter
+
+
+    def getValue(self, domainObject, prop):
+        """Retrieve the named property from the domain object."""
+        getter = self._getters.get(prop) or self.getGetter(prop)
+        try:
+            return getter(domainObject)
+        except Exception as e:
+            return self._layer.die(e, "Could not retrieve property %s", prop)
+
+
+    def setValue(self, domainObject, prop, value):
+        """Sets the named property on the domain object."""
+        setter = self._setters.get(prop) or self.getSetter(prop)
+        try:
+            setter(domainObject, value)
+        except Exception as e:
+            self._layer.die(e, "Could not set property %s", prop)
+
+
+    def getProperty(self, domainObject, prop):
+        """Equivalent to {@link ServiceLayer#getProperty(Object, String)}. The
+        getter is called directly unless a decorator overrides
+        {@code getProperty}.
+        """
+        if self._getPropertyOverridden:
+            return self._layer.getTop().getProperty(domainObject, prop)
+        return self.getValue(domainObject, prop)
+
+
+    def setProperty(self, domainObject, prop, expectedType, value):
+        """Equivalent to
+        {@link ServiceLayer#setProperty(Object, String, Class, Object)}. The
+        setter is called directly unless a decorator overrides
+        {@code setProperty}.
+        """
+        if self._setPropertyOverridden:
+            self._layer.getTop().setProperty(domainObject, prop, expectedType,
+                    value)
+        else:
+            self.setValue(domainObject, prop, value)
+
+
+def _isOverridden(layer, name):
+    """Returns {@code true} if a layer above the given one in its chain
+    overrides the named ServiceLayer method.
+    """
+    above = layer.getTop()
+    while above is not None and above is not layer:
+        if ServiceLayer.overrides(above, name):
+            return True
+        above = above.getNext()
+    return False
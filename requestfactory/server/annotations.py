@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Server-side RequestFactory annotations for domain service methods."""
+
+
+_INDEPENDENT = '_requestFactoryIndependent'
+
+
+def independent(method):
+    """Marks a domain service method as independent of the other invocations in
+    a payload: it has no side effects that another invocation could observe, so
+    it may run concurrently with neighbouring independent invocations.
+
+        class EmployeeService(object):
+
+            @staticmethod
+            @independent
+            async def countEmployees():
+                ...
+
+    The annotation must be applied to the function, inside any
+    {@code staticmethod} or {@code classmethod} wrapper.
+    """
+    setattr(method, _INDEPENDENT, True)
+    return method
+
+
+def isIndependent(method):
+    """Returns {@code true} if the domain method has been marked with
+    {@link #independent(method)}.
+    """
+    return getattr(method, _INDEPENDENT, False) is True
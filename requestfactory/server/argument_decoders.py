@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Decoders that turn the wire form of an invocation argument into the value
+passed to a domain method. Each decoder is a callable taking the
+{@link RequestState} and the argument's Splittable, specialized for the
+argument's declared type when the operation is resolved.
+"""
+
+from requestfactory.shared.entity_proxy_id import EntityProxyId
+from requestfactory.shared.impl.entity_codex import EntityCodex
+
+from autobean.shared.value_codex import ValueCodex
+from autobean.vm.impl.type_utils import TypeUtils
+
+
+def compileArgumentDecoders(contextArgs, genericArgs):
+    """Returns a decoder for each argument of a RequestContext method.
+
+    @param contextArgs the raw types of the arguments
+    @param genericArgs the generic types of the arguments
+    @return a list of decoders, in argument order
+    """
+    assert len(contextArgs) == len(genericArgs)
+    return [compileArgumentDecoder(type_, genericType)
+            for type_, genericType in zip(contextArgs, genericArgs)]
+
+
+def compileArgumentDecoder(type_, genericType):
+    """Returns a decoder for a single argument type."""
+    if issubclass(type_, EntityProxyId):
+        def decodeProxyId(source, split):
+            arg = EntityCodex.decode(source, type_, None, split)
+            return source.getResolver().resolveDomainValue(arg, False)
+        return decodeProxyId
+
+    if issubclass(type_, (list, set)):
+        elementType = TypeUtils.ensureBaseType(
+                TypeUtils.getSingleParameterization(type_, genericType))
+        def decodeCollection(source, split):
+            arg = EntityCodex.decode(source, type_, elementType, split)
+            return source.getResolver().resolveDomainValue(arg, True)
+        return decodeCollection
+
+    if ValueCodex.canDecode(type_):
+        # Simple values are passed to the domain method as-is
+        def decodeValue(source, split):
+            if split is None:
+                return None
+            return ValueCodex.decode(type_, split)
+        return decodeValue
+
+    def decodeProxy(source, split):
+        arg = EntityCodex.decode(source, type_, None, split)
+        return source.getResolver().resolveDomainValue(arg, True)
+    return decodeProxy
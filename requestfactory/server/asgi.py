@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""An ASGI application serving RequestFactory JSON requests.
+
+This module requires Python 3.5 or later and is not imported by the rest of
+the package.
+"""
+
+import asyncio
+import logging
+
+from requestfactory.server.coroutines import setThreadEventLoop
+from requestfactory.server.default_exception_handler import DefaultExceptionHandler
+from requestfactory.server.service_layer import ServiceLayer
+from requestfactory.server.simple_request_processor import SimpleRequestProcessor
+from requestfactory.shared.request_factory import RequestFactory
+
+
+SC_OK = 200
+SC_BAD_REQUEST = 400
+SC_METHOD_NOT_ALLOWED = 405
+SC_REQUEST_ENTITY_TOO_LARGE = 413
+SC_INTERNAL_SERVER_ERROR = 500
+
+JSON_CHARSET = 'UTF-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+# The default limit on the size of a request body, in bytes.
+DEFAULT_MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _BadRequest(Exception):
+    """Describes a request that is rejected before being processed."""
+
+    def __init__(self, status, message=''):
+        super(_BadRequest, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class _Disconnected(Exception):
+    """Raised when the client disconnects before sending the whole body."""
+
+
+class RequestFactoryASGIApp(object):
+    """Handles GWT RequestFactory JSON requests as an ASGI application.
+    <p>
+    The request body is read on the event loop, and the payload is processed in
+    an executor so that blocking domain code does not stall other requests. The
+    coroutines returned by {@code async def} domain methods are scheduled back
+    on the event loop.
+    """
+
+    def __init__(self, exceptionHandler=None, serviceDecorators=(), executor=None,
+                maxContentLength=DEFAULT_MAX_CONTENT_LENGTH):
+        """Constructs a new {@link RequestFactoryASGIApp} with a
+        {@code DefaultExceptionHandler} unless provided.
+
+        @param exceptionHandler an {@link ExceptionHandler} instance
+        @param serviceDecorators a sequence of ServiceLayerDecorators that change
+                 how the RequestFactory request processor interact with the
+                 domain objects
+        @param executor the {@code concurrent.futures} executor in which payloads
+                 are processed, or {@code None} to use the event loop's default
+                 executor
+        @param maxContentLength the largest accepted request body, in bytes, or
+                 {@code None} for no limit
+        """
+        if exceptionHandler is None:
+            exceptionHandler = DefaultExceptionHandler()
+
+        self._executor = executor
+        self._maxContentLength = maxContentLength
+        self._processor = SimpleRequestProcessor(ServiceLayer.create(
+                *serviceDecorators))
+        self._processor.setExceptionHandler(exceptionHandler)
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type %s' % scope['type'])
+
+        if scope['method'] != 'POST':
+            await self._respond(send, SC_METHOD_NOT_ALLOWED, b'',
+                    [(b'allow', b'POST')])
+            return
+
+        headers = dict(scope['headers'])
+        contentType = headers.get(b'content-type', b'').decode('latin-1')
+        if not contentType.lower().startswith(JSON_CONTENT_TYPE):
+            await self._respond(send, SC_BAD_REQUEST, ('Content-Type was \'%s\'. '
+                    'Expected \'%s\'.' % (contentType, JSON_CONTENT_TYPE)).encode(
+                    JSON_CHARSET))
+            return
+
+        try:
+            body = await self._readBody(receive, headers)
+        except _BadRequest as e:
+            await self._respond(send, e.status, e.message.encode(JSON_CHARSET))
+            return
+        except _Disconnected:
+            # Nobody is waiting for a response to a truncated payload
+            return
+
+        loop = asyncio.get_event_loop()
+        try:
+            # The UTF-8 body is passed to the processor without being decoded
+            payload = await loop.run_in_executor(self._executor,
+                    self._processPayload, loop, body)
+        except Exception:
+            LOGGER.critical('Unexpected error', exc_info=True)
+            await self._respond(send, SC_INTERNAL_SERVER_ERROR, b'')
+            return
+
+        await self._respond(send, SC_OK, payload,
+                [(b'content-type',
+                  RequestFactory.JSON_CONTENT_TYPE_UTF8.encode('latin-1'))])
+
+
+    def _processPayload(self, loop, body):
+        """Processes a payload in a worker thread, awaiting the coroutines
+        returned by domain methods on the loop serving the request.
+        """
+        previous = setThreadEventLoop(loop)
+        try:
+            return self._processor.processPayload(body)
+        finally:
+            setThreadEventLoop(previous)
+
+
+    async def _readBody(self, receive, headers):
+        """Reads the request body, refusing it with a 413 status once it
+        exceeds the configured size limit.
+
+        @throws _Disconnected if the client goes away before the body is read
+        """
+        limit = self._maxContentLength
+        contentLength = headers.get(b'content-length')
+        if contentLength is not None:
+            try:
+                contentLength = int(contentLength)
+            except ValueError:
+                raise _BadRequest(SC_BAD_REQUEST, 'Invalid Content-Length')
+            if limit is not None and contentLength > limit:
+                raise _BadRequest(SC_REQUEST_ENTITY_TOO_LARGE)
+
+        chunks = list()
+        length = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise _Disconnected()
+            chunk = message.get('body', b'')
+            chunks.append(chunk)
+            length += len(chunk)
+            if limit is not None and length > limit:
+                raise _BadRequest(SC_REQUEST_ENTITY_TOO_LARGE)
+            if not message.get('more_body', False):
+                break
+        return b''.join(chunks)
+
+
+    async def _respond(self, send, status, body, headers=()):
+        headers = list(headers)
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status,
+                'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Base64 encoding with the URL-safe alphabet of GWT's {@code Base64Utils},
+implemented with {@code binascii}.
+
+GWT uses {@code '$'} and {@code '_'} where standard base64 uses {@code '+'}
+and {@code '/'}. Strings are translated to and from the standard alphabet so
+that the C implementation in {@code binascii} does the real work.
+"""
+
+import re
+import binascii
+
+try:
+    _maketrans = bytes.maketrans
+except AttributeError:
+    from string import maketrans as _maketrans
+
+
+_TO_GWT = _maketrans(b'+/', b'$_')
+_FROM_GWT = _maketrans(b'$_', b'+/')
+
+# A padded string in the standard alphabet. binascii skips any other
+# characters instead of rejecting them.
+_VALID = re.compile(br'[A-Za-z0-9+/]*={0,2}\Z')
+
+
+def toBase64(data):
+    """Encodes a string, as UTF-8, in GWT's base64 alphabet.
+
+    @param data the text or bytes to encode
+    @return the padded base64 string
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('UTF-8')
+    encoded = binascii.b2a_base64(data)[:-1].translate(_TO_GWT)
+    if not isinstance(encoded, str):
+        encoded = encoded.decode('ascii')
+    return encoded
+
+
+def fromBase64(encoded):
+    """Decodes a string in GWT's base64 alphabet. Missing padding is tolerated.
+
+    @param encoded the base64 string
+    @return the decoded UTF-8 text
+    @throws ValueError if the string is not valid base64
+    """
+    if not isinstance(encoded, bytes):
+        encoded = encoded.encode('ascii')
+    encoded = encoded.translate(_FROM_GWT)
+    padding = -len(encoded) % 4
+    if padding:
+        encoded += b'=' * padding
+    if _VALID.match(encoded) is None:
+        raise ValueError('Invalid base64 string')
+    try:
+        return binascii.a2b_base64(encoded).decode('UTF-8')
+    except binascii.Error as e:
+        raise ValueError(str(e))
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Utilities for waiting on the coroutines returned by {@code async def} domain
+methods and Locators from the synchronous request processing code.
+
+Payloads are always processed on a worker thread. If an event loop has been
+registered for the thread with {@link #setThreadEventLoop(loop)}, as
+{@code RequestFactoryASGIApp} does, or for the process with
+{@link #setEventLoop(loop)}, awaitables are scheduled on it so that they share
+its connections. Otherwise each worker thread runs its own event loop.
+
+On interpreters without {@code asyncio} no value is ever awaitable and the
+functions in this module return their arguments unchanged.
+"""
+
+import threading
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+_eventLoop = None
+_local = threading.local()
+
+
+def setEventLoop(loop):
+    """Registers the running event loop on which awaitables are scheduled, or
+    {@code None} to use a private event loop in each thread.
+    """
+    global _eventLoop
+    _eventLoop = loop
+
+
+def getEventLoop():
+    """Returns the event loop registered for the current thread or, failing
+    that, for the process, or {@code None}.
+    """
+    loop = getattr(_local, 'eventLoop', None)
+    if loop is None:
+        loop = _eventLoop
+    return loop
+
+
+def setThreadEventLoop(loop):
+    """Registers, for the current thread only, the running event loop on which
+    awaitables are scheduled. It takes precedence over the loop registered with
+    {@link #setEventLoop(loop)}.
+
+    @return the loop that was replaced, to be restored once the payload has
+            been processed
+    """
+    previous = getattr(_local, 'eventLoop', None)
+    _local.eventLoop = loop
+    return previous
+
+
+def isAwaitable(value):
+    """Returns {@code true} if the value is a coroutine, a Future or another
+    object that may be awaited.
+    """
+    if asyncio is None or value is None:
+        return False
+    return asyncio.iscoroutine(value) or hasattr(value, '__await__')
+
+
+def resolve(value):
+    """Waits for an awaitable value and returns its result. Any other value is
+    returned unchanged.
+
+    @throws Exception the exception raised by the awaitable
+    """
+    if not isAwaitable(value):
+        return value
+    return resolveAll([value], False)[0]
+
+
+def resolveAll(values, returnExceptions=True):
+    """Waits for all of the awaitable values concurrently, in the manner of
+    {@code asyncio.gather(*values, return_exceptions=True)}.
+
+    @param returnExceptions if {@code false}, the first exception raised by an
+             awaitable is raised once all of them have finished
+    @return a list holding, in the same order as {@code values}, the result of
+            each awaitable or the exception it raised; values that are not
+            awaitable are returned unchanged
+    """
+    values = list(values)
+    indexes = [i for i, value in enumerate(values) if isAwaitable(value)]
+    if not indexes:
+        return values
+
+    awaitables = [values[i] for i in indexes]
+    loop = getEventLoop()
+    if loop is not None and loop.is_running():
+        if _isCurrentLoop(loop):
+            raise RuntimeError('Cannot wait for a coroutine on the thread '
+                    'running its event loop')
+        futures = [_submit(awaitable, loop) for awaitable in awaitables]
+        results = list()
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    else:
+        loop = _getThreadLoop()
+        tasks = [asyncio.ensure_future(awaitable, loop=loop)
+                for awaitable in awaitables]
+        results = loop.run_until_complete(asyncio.gather(*tasks,
+                return_exceptions=True))
+
+    toReturn = list(values)
+    for i, result in zip(indexes, results):
+        if not returnExceptions and isinstance(result, BaseException):
+            raise result
+        toReturn[i] = result
+    return toReturn
+
+
+def _isCurrentLoop(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _getThreadLoop():
+    """Returns the event loop private to the current thread. The loop is kept
+    for the life of the thread so that resources bound to it, such as
+    connection pools, can be reused by later requests.
+    """
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _local.loop = loop
+    return loop
+
+
+def _submit(awaitable, loop):
+    """Schedules an awaitable on an event loop running in another thread.
+
+    @return a {@code concurrent.futures.Future} for its result
+    """
+    if asyncio.iscoroutine(awaitable):
+        return asyncio.run_coroutine_threadsafe(awaitable, loop)
+
+    import concurrent.futures
+    future = concurrent.futures.Future()
+
+    def copyResult(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def schedule():
+        asyncio.ensure_future(awaitable, loop=loop).add_done_callback(copyResult)
+
+    loop.call_soon_threadsafe(schedule)
+    return future
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""A compact, memory-mapped form of a RequestFactory's Deobfuscator tables.
+
+Building a Deobfuscator introspects every proxy and RequestContext type. The
+tables can instead be written to an index file once, at build time, and each
+worker maps the file and looks entries up in place:
+
+    python -m requestfactory.server.deobfuscator_index com.example.MyFactory out.idx
+
+The file starts with a header holding a magic number, a format version, the
+RequestFactory's binary name and the offsets of three tables (operations,
+type tokens and domain types). Each table is a count followed by fixed-size
+records of key and value offsets, sorted by key so that lookups are a binary
+search. All strings are UTF-8 and live in a blob after the tables.
+"""
+
+import os
+import sys
+import mmap
+import struct
+
+from requestfactory.server.deobfuscator_registry import \
+    DeobfuscatorRegistry, getBinaryName
+
+
+MAGIC = b'RFDX'
+VERSION = 1
+
+# Magic, version, name offset, name length and the three table offsets.
+_HEADER = struct.Struct('<4sIIIIII')
+_COUNT = struct.Struct('<I')
+# Key offset, key length, value offset and value length.
+_RECORD = struct.Struct('<IIII')
+
+# Separates the fields of a multi-valued entry.
+_SEPARATOR = b'\0'
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('UTF-8')
+
+
+def _decode(data):
+    return data.decode('UTF-8')
+
+
+def writeIndex(binaryName, deobfuscator, path):
+    """Writes the tables of a Deobfuscator to an index file. The file is written
+    next to {@code path} and renamed into place, so readers never see a partial
+    index.
+
+    @param binaryName the binary name of the RequestFactory
+    @param deobfuscator the RequestFactory's Deobfuscator
+    @param path the file to write
+    """
+    operations = dict()
+    for operation in deobfuscator.getOperations():
+        operations[_encode(operation)] = _SEPARATOR.join(_encode(field) for field in (
+                deobfuscator.getDomainMethodDescriptor(operation),
+                deobfuscator.getRequestContext(operation),
+                deobfuscator.getRequestContextMethodName(operation),
+                deobfuscator.getRequestContextMethodDescriptor(operation)))
+    typeTokens = dict()
+    for typeToken in deobfuscator.getTypeTokens():
+        typeTokens[_encode(typeToken)] = _encode(
+                deobfuscator.getTypeFromToken(typeToken))
+    domainTypes = dict()
+    for domainType in deobfuscator.getDomainTypes():
+        domainTypes[_encode(domainType)] = _SEPARATOR.join(_encode(proxy)
+                for proxy in deobfuscator.getClientProxies(domainType))
+
+    tables = (operations, typeTokens, domainTypes)
+    blob = list()
+    # The blob starts after the header and all of the tables
+    blobOffset = [_HEADER.size + sum(_COUNT.size + _RECORD.size * len(table)
+            for table in tables)]
+
+    def addString(data):
+        offset = blobOffset[0]
+        blob.append(data)
+        blobOffset[0] += len(data)
+        return offset, len(data)
+
+    nameOffset, nameLength = addString(_encode(binaryName))
+    encodedTables = list()
+    tableOffsets = list()
+    tableOffset = _HEADER.size
+    for table in tables:
+        records = [_COUNT.pack(len(table))]
+        for key in sorted(table):
+            keyOffset, keyLength = addString(key)
+            valueOffset, valueLength = addString(table[key])
+            records.append(_RECORD.pack(keyOffset, keyLength, valueOffset,
+                    valueLength))
+        encodedTables.append(b''.join(records))
+        tableOffsets.append(tableOffset)
+        tableOffset += len(encodedTables[-1])
+
+    temp = path + '.tmp'
+    f = open(temp, 'wb')
+    try:
+        f.write(_HEADER.pack(MAGIC, VERSION, nameOffset, nameLength,
+                *tableOffsets))
+        for encoded in encodedTables:
+            f.write(encoded)
+        for data in blob:
+            f.write(data)
+    finally:
+        f.close()
+    os.rename(temp, path)
+
+
+class _Table(object):
+    """A sorted table of records in the mapped file."""
+
+    def __init__(self, data, offset):
+        self._data = data
+        self._count = _COUNT.unpack_from(data, offset)[0]
+        self._recordsOffset = offset + _COUNT.size
+
+
+    def get(self, key):
+        """Returns the raw value for a key, or {@code None}."""
+        data = self._data
+        low, high = 0, self._count - 1
+        while low <= high:
+            mid = (low + high) // 2
+            keyOffset, keyLength, valueOffset, valueLength = _RECORD.unpack_from(
+                    data, self._recordsOffset + mid * _RECORD.size)
+            found = data[keyOffset:keyOffset + keyLength]
+            if found < key:
+                low = mid + 1
+            elif found > key:
+                high = mid - 1
+            else:
+                return data[valueOffset:valueOffset + valueLength]
+        return None
+
+
+    def keys(self):
+        data = self._data
+        for i in range(self._count):
+            keyOffset, keyLength, _, _ = _RECORD.unpack_from(data,
+                    self._recordsOffset + i * _RECORD.size)
+            yield _decode(data[keyOffset:keyOffset + keyLength])
+
+
+class DeobfuscatorIndex(object):
+    """A read-only Deobfuscator backed by a memory-mapped index file written by
+    {@link #writeIndex(String, Deobfuscator, String)}. Entries are decoded
+    only when they are looked up.
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        (magic, version, nameOffset, nameLength, operationsOffset,
+                typeTokensOffset, domainTypesOffset) = _HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d Deobfuscator index'
+                    % (path, VERSION))
+        self._binaryName = _decode(self._data[nameOffset:nameOffset + nameLength])
+        self._operations = _Table(self._data, operationsOffset)
+        self._typeTokens = _Table(self._data, typeTokensOffset)
+        self._domainTypes = _Table(self._data, domainTypesOffset)
+
+
+    def getBinaryName(self):
+        """Returns the binary name of the RequestFactory the index describes."""
+        return self._binaryName
+
+
+    def getClientProxies(self, domainBinaryName):
+        found = self._domainTypes.get(_encode(domainBinaryName))
+        if found is None:
+            return None
+        if len(found) == 0:
+            # A domain type with no client proxies
+            return []
+        return [_decode(proxy) for proxy in found.split(_SEPARATOR)]
+
+
+    def getDomainMethodDescriptor(self, operation):
+        return self._getOperationField(operation, 0)
+
+
+    def getDomainTypes(self):
+        return list(self._domainTypes.keys())
+
+
+    def getOperations(self):
+        return list(self._operations.keys())
+
+
+    def getRequestContext(self, operation):
+        return self._getOperationField(operation, 1)
+
+
+    def getRequestContextMethodName(self, operation):
+        return self._getOperationField(operation, 2)
+
+
+    def getRequestContextMethodDescriptor(self, operation):
+        return self._getOperationField(operation, 3)
+
+
+    def getTypeFromToken(self, typeToken):
+        found = self._typeTokens.get(_encode(typeToken))
+        return None if found is None else _decode(found)
+
+
+    def getTypeTokens(self):
+        return list(self._typeTokens.keys())
+
+
+    def close(self):
+        self._data.close()
+
+
+    def _getOperationField(self, operation, field):
+        found = self._operations.get(_encode(operation))
+        if found is None:
+            return None
+        return _decode(found.split(_SEPARATOR)[field])
+
+
+def main(args):
+    if len(args) != 2:
+        sys.stderr.write('Usage: python -m requestfactory.server.deobfuscator_index'
+                ' <RequestFactory binary name> <index file>\n')
+        return 1
+    binaryName, path = args
+    moduleName, _, className = binaryName.rpartition('.')
+    module = __import__(moduleName, fromlist=[className])
+    requestFactoryClass = getattr(module, className)
+    deobfuscator = DeobfuscatorRegistry().load(requestFactoryClass, None)
+    writeIndex(getBinaryName(requestFactoryClass), deobfuscator, path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
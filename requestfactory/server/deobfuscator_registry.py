@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import threading
+
+from requestfactory.vm.impl.deobfuscator import Builder
+
+
+def getBinaryName(clazz):
+    """Returns the name used to register a RequestFactory type."""
+    return clazz.__module__ + '.' + clazz.__name__
+
+
+class DeobfuscatorRegistry(object):
+    """Holds one immutable Deobfuscator snapshot for each RequestFactory type.
+    <p>
+    A snapshot is loaded exactly once per RequestFactory. Loading and reloading
+    build the new tables on the side and then swap them in with a single
+    assignment, so request threads only ever read complete snapshots and never
+    wait for, or repeat, a load.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Maps binary names to Deobfuscators. Replaced, never mutated.
+        self._snapshots = dict()
+        self._view = _CompositeDeobfuscator(())
+
+
+    def get(self, binaryName):
+        """Returns the snapshot for a RequestFactory, or {@code None} if it has not
+        been loaded.
+        """
+        return self._snapshots.get(binaryName)
+
+
+    def getDeobfuscator(self):
+        """Returns a Deobfuscator answering lookups for every loaded
+        RequestFactory.
+        """
+        return self._view
+
+
+    def load(self, requestFactoryClass, resolveClassesWith):
+        """Returns the snapshot for a RequestFactory, loading it if this is the
+        first time the type has been seen.
+        """
+        binaryName = getBinaryName(requestFactoryClass)
+        snapshot = self._snapshots.get(binaryName)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            snapshot = self._snapshots.get(binaryName)
+            if snapshot is None:
+                snapshot = Builder.load(requestFactoryClass,
+                        resolveClassesWith).build()
+                self._install(binaryName, snapshot)
+        return snapshot
+
+
+    def reload(self, requestFactoryClass, resolveClassesWith):
+        """Rebuilds the snapshot for a RequestFactory, for example after its
+        classes have been reloaded. Requests already in progress keep using the
+        previous snapshot. Values derived from the old snapshot are not
+        discarded, so the {@link ServiceLayerCache#clear()} method of each
+        ServiceLayer should be called afterwards.
+        """
+        with self._lock:
+            snapshot = Builder.load(requestFactoryClass, resolveClassesWith).build()
+            self._install(getBinaryName(requestFactoryClass), snapshot)
+        return snapshot
+
+
+    def register(self, binaryName, deobfuscator):
+        """Installs a prebuilt snapshot for a RequestFactory, replacing any
+        existing one.
+        """
+        with self._lock:
+            self._install(binaryName, deobfuscator)
+
+
+    def _install(self, binaryName, snapshot):
+        snapshots = dict(self._snapshots)
+        snapshots[binaryName] = snapshot
+        if len(snapshots) == 1:
+            view = snapshot
+        else:
+            view = _CompositeDeobfuscator(snapshots.values())
+        self._snapshots = snapshots
+        self._view = view
+
+
+class _CompositeDeobfuscator(object):
+    """Answers Deobfuscator lookups from several snapshots, in the same way a
+    merged Deobfuscator would.
+    """
+
+    def __init__(self, snapshots):
+        self._snapshots = tuple(snapshots)
+
+
+    def getClientProxies(self, domainBinaryName):
+        toReturn = None
+        for snapshot in self._snapshots:
+            found = snapshot.getClientProxies(domainBinaryName)
+            if found is not None:
+                toReturn = list(found) if toReturn is None else toReturn + [
+                        proxy for proxy in found if proxy not in toReturn]
+        return toReturn
+
+
+    def getDomainMethodDescriptor(self, operation):
+        return self._first('getDomainMethodDescriptor', operation)
+
+
+    def getDomainTypes(self):
+        return self._union('getDomainTypes')
+
+
+    def getOperations(self):
+        return self._union('getOperations')
+
+
+    def getRequestContext(self, operation):
+        return self._first('getRequestContext', operation)
+
+
+    def getRequestContextMethodDescriptor(self, operation):
+        return self._first('getRequestContextMethodDescriptor', operation)
+
+
+    def getRequestContextMethodName(self, operation):
+        return self._first('getRequestContextMethodName', operation)
+
+
+    def getTypeFromToken(self, typeToken):
+        return self._first('getTypeFromToken', typeToken)
+
+
+    def getTypeTokens(self):
+        return self._union('getTypeTokens')
+
+
+    def _first(self, method, key):
+        for snapshot in self._snapshots:
+            found = getattr(snapshot, method)(key)
+            if found is not None:
+                return found
+        return None
+
+
+    def _union(self, method):
+        toReturn = set()
+        for snapshot in self._snapshots:
+            toReturn.update(getattr(snapshot, method)())
+        return sorted(toReturn)
@@ -20,6 +20,13 @@ class ReportableException(RuntimeError):
     pass
 
 
+class DeadEntityException(RuntimeError):
+    """Indicates that a proxy sent by the client refers to a domain object that
+    no longer exists.
+    """
+    pass
+
+
 class UnexpectedException(RuntimeError):
     """Encapsulates exceptions that indicate something went wrong in RequestFactory
     code.
@@ -30,9 +30,9 @@ class FindServiceLayer(ServiceLayerDecorator):
         if Constants.FIND_METHOD_OPERATION == operation:
             try:
                 return getattr(FindService, 'find')
-            except self.SecurityException, e:
+            except self.SecurityException as e:
                 ex = e
-            except self.NoSuchMethodException, e:
+            except self.NoSuchMethodException as e:
                 ex = e
             self.die(ex, 'Could not retrieve %s.find() method',
                      FindService.__class__.__name__)
@@ -49,9 +49,9 @@ class FindServiceLayer(ServiceLayerDecorator):
         if Constants.FIND_METHOD_OPERATION == operation:
             try:
                 return getattr(FindRequest, 'find')#, EntityProxyId)
-            except self.SecurityException, e:
+            except self.SecurityException as e:
                 ex = e
-            except self.NoSuchMethodException, e:
+            except self.NoSuchMethodException as e:
                 ex = e
             self.die(ex, 'Could not retrieve %s.find() method',
                      FindRequest.__class__.__name__)
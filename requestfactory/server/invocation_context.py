@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Exposes the property references of an invocation to domain code while its
+service method runs, so that a service can load exactly the object graph the
+client will receive, for example with one JOIN-ed query:
+
+    class EmployeeService(object):
+
+        @staticmethod
+        def findEmployees(department):
+            context = getCurrentInvocation()
+            if context is not None and context.isRequested('supervisor'):
+                ...
+
+A synchronous method can call {@link #getCurrentInvocation()} from any code it
+calls on its thread. The coroutine of an {@code async def} method runs after
+the call has returned, so such a method should instead declare a last
+parameter named {@code invocationContext}, which is then passed the context:
+
+    @staticmethod
+    async def findEmployees(department, invocationContext=None):
+        ...
+
+A keyword-only parameter of that name is passed the context by keyword:
+
+    @staticmethod
+    async def findEmployees(department, *, invocationContext=None):
+        ...
+"""
+
+import inspect
+import threading
+
+from requestfactory.server import property_path_trie
+
+
+# The name of the parameter through which a domain method receives its
+# InvocationContext.
+INVOCATION_CONTEXT_PARAMETER = 'invocationContext'
+
+# How a domain method receives its InvocationContext: as its last positional
+# argument or as a keyword argument.
+POSITIONAL = 'positional'
+KEYWORD = 'keyword'
+
+_local = threading.local()
+
+
+def getCurrentInvocation():
+    """Returns the {@link InvocationContext} of the domain method running on
+    the current thread, or {@code None}.
+    """
+    return getattr(_local, 'context', None)
+
+
+def setCurrentInvocation(context):
+    """Sets the {@link InvocationContext} of the current thread.
+
+    @return the context that was replaced, to be restored once the domain
+            method has returned
+    """
+    previous = getattr(_local, 'context', None)
+    _local.context = context
+    return previous
+
+
+def acceptsInvocationContext(method):
+    """Returns how the domain method receives its InvocationContext:
+    {@code POSITIONAL} if its last positional parameter is named
+    {@code invocationContext}, {@code KEYWORD} if it has a keyword-only
+    parameter of that name, otherwise {@code None}.
+    """
+    method = getattr(method, '__func__', method)
+    try:
+        if hasattr(inspect, 'getfullargspec'):
+            spec = inspect.getfullargspec(method)
+            kwonlyargs = spec.kwonlyargs
+        else:
+            spec = inspect.getargspec(method)
+            kwonlyargs = ()
+    except TypeError:
+        # Builtins and other callables without an inspectable signature
+        return None
+    if len(spec.args) > 0 and spec.args[-1] == INVOCATION_CONTEXT_PARAMETER:
+        return POSITIONAL
+    if INVOCATION_CONTEXT_PARAMETER in kwonlyargs:
+        return KEYWORD
+    return None
+
+
+class InvocationContext(object):
+    """The state of one invocation in a request payload that is of use to its
+    domain method.
+    """
+
+    def __init__(self, operation, propertyRefs):
+        """@param operation the operation name sent by the client
+        @param propertyRefs the property references sent with the invocation,
+                 or {@code None}
+        """
+        self._operation = operation
+        self._propertyRefs = frozenset(propertyRefs or ())
+        self._trie = None
+
+
+    def getOperation(self):
+        """Returns the operation name sent by the client."""
+        return self._operation
+
+
+    def getPropertyRefs(self):
+        """Returns the property references as the client wrote them, e.g.
+        {@code frozenset(['supervisor.department'])}.
+        """
+        return self._propertyRefs
+
+
+    def getExpandedPropertyRefs(self):
+        """Returns the fully-expanded set of properties that will be sent to the
+        client, e.g. {@code frozenset(['supervisor', 'supervisor.department'])}.
+        """
+        return self.getPropertyPaths().getPaths()
+
+
+    def getPropertyPaths(self):
+        """Returns the root {@link PropertyPathNode} of the compiled property
+        references, through which the paths requested relative to a property
+        can be found with {@code descend(name)}.
+        """
+        if self._trie is None:
+            self._trie = property_path_trie.compilePropertyRefs(
+                    self._propertyRefs)
+        return self._trie.getRoot()
+
+
+    def isRequested(self, path):
+        """Returns {@code true} if the dotted property path will be sent to the
+        client, either named directly or matched by a {@code '*'} wildcard.
+        """
+        node = self.getPropertyPaths()
+        names = path.split('.')
+        for name in names[:-1]:
+            if not node.matches(name):
+                return False
+            node = node.descend(name)
+        return node.matches(names[-1])
+
+
+    def __repr__(self):
+        return '<InvocationContext %s %s>' % (self._operation,
+                sorted(self._propertyRefs))
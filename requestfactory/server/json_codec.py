@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Pluggable JSON backends for parsing and serializing RequestFactory payloads.
+
+A codec turns the text of a payload into the Splittable tree that
+{@code AutoBeanCodex} decodes the request envelope, its invocations and
+property maps from, and turns the encoded response envelope into UTF-8 bytes.
+The standard library's {@code json} module is always available; {@code ujson}
+and {@code orjson} are used if installed:
+
+    processor.setJsonCodec(getCodec('orjson'))
+
+The backends can be compared on synthetic payloads shaped like RequestFactory
+traffic:
+
+    python -m requestfactory.server.json_codec [entities] [iterations]
+"""
+
+import sys
+import time
+import json
+
+from autobean.shared.impl.json_splittable import JsonSplittable
+
+
+STDLIB = 'json'
+UJSON = 'ujson'
+ORJSON = 'orjson'
+
+
+def toUtf8(payload):
+    """Returns the UTF-8 bytes of a payload, which may already be bytes."""
+    if isinstance(payload, bytes):
+        return payload
+    return payload.encode('UTF-8')
+
+
+def toSplittable(value):
+    """Wraps a parsed JSON value in the Splittable that AutoBeanCodex reads."""
+    return JsonSplittable(value)
+
+
+def fromSplittable(split):
+    """Returns the JSON value held by a Splittable built by AutoBeanCodex."""
+    return split.obj
+
+
+class JsonCodec(object):
+    """A JSON backend. Subclasses implement {@link #loads(String)} and
+    {@link #dumps(Object)}.
+    """
+
+    name = None
+
+    def loads(self, payload):
+        """Parses JSON text into dicts, lists and scalars."""
+        raise NotImplementedError
+
+
+    def dumps(self, value):
+        """Serializes dicts, lists and scalars into compact JSON, returned as
+        UTF-8 bytes.
+        """
+        raise NotImplementedError
+
+
+    def decode(self, payload):
+        """Parses a payload into a Splittable."""
+        return toSplittable(self.loads(payload))
+
+
+    def encode(self, split):
+        """Serializes a Splittable into a payload of UTF-8 bytes."""
+        return self.dumps(fromSplittable(split))
+
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+
+class StdlibJsonCodec(JsonCodec):
+    """Uses the standard library's {@code json} module."""
+
+    name = STDLIB
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._encoder = json.JSONEncoder(ensure_ascii=False,
+                separators=(',', ':'))
+
+
+    def loads(self, payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode('UTF-8')
+        return self._decoder.decode(payload)
+
+
+    def dumps(self, value):
+        return toUtf8(self._encoder.encode(value))
+
+
+class UjsonCodec(JsonCodec):
+    """Uses the {@code ujson} C extension."""
+
+    name = UJSON
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+
+    def loads(self, payload):
+        return self._ujson.loads(payload)
+
+
+    def dumps(self, value):
+        return toUtf8(self._ujson.dumps(value, ensure_ascii=False))
+
+
+class OrjsonCodec(JsonCodec):
+    """Uses the {@code orjson} extension, which reads and writes UTF-8 bytes."""
+
+    name = ORJSON
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+
+    def loads(self, payload):
+        return self._orjson.loads(payload)
+
+
+    def dumps(self, value):
+        return self._orjson.dumps(value)
+
+
+_CODECS = ((ORJSON, OrjsonCodec), (UJSON, UjsonCodec), (STDLIB, StdlibJsonCodec))
+
+
+def getCodec(name=STDLIB):
+    """Returns a new codec for the named backend.
+
+    @param name one of {@code 'json'}, {@code 'ujson'} or {@code 'orjson'}
+    @throws ImportError if the backend is not installed
+    @throws ValueError if the name is unknown
+    """
+    for codecName, codecType in _CODECS:
+        if codecName == name:
+            return codecType()
+    raise ValueError('Unknown JSON codec %s' % name)
+
+
+def getAvailableCodecs():
+    """Returns a codec for each installed backend, fastest first."""
+    toReturn = list()
+    for _, codecType in _CODECS:
+        try:
+            toReturn.append(codecType())
+        except ImportError:
+            pass
+    return toReturn
+
+
+def getFastestCodec():
+    """Returns a codec for the fastest installed backend."""
+    return getAvailableCodecs()[0]
+
+
+def createSamplePayload(entities):
+    """Builds a request and a response payload of the shape RequestFactory
+    exchanges: repeated type tokens and property names, property maps of
+    strings, numbers and nested references.
+
+    @param entities the number of entity proxies in each payload
+    @return a (request, response) tuple of JSON values
+    """
+    operations = list()
+    for i in range(entities):
+        operations.append({
+            'O': 'PERSIST', 'T': 'Gk9v6YNvXBj1Hqsn2Zft7D9yqwg=', 'S': str(i),
+            'V': 'MQ==', 'P': {
+                'displayName': 'Employee %d' % i, 'userName': 'user%d' % i,
+                'department': 'Engineering', 'salary': 1000 + i,
+                'active': i % 2 == 0, 'supervisor': {'S': str(i // 10),
+                'T': 'Gk9v6YNvXBj1Hqsn2Zft7D9yqwg='}}})
+    request = {'F': 'com.example.shared.ExpensesRequestFactory',
+            'I': [{'O': 'Xdqz7W0WoQKMpjlUWE3wqEx$Pls=', 'P': [str(i)],
+            'R': ['supervisor', 'department']} for i in range(entities // 10 + 1)],
+            'O': operations}
+    response = {'I': [str(i) for i in range(entities // 10 + 1)],
+            'S': [True] * (entities // 10 + 1), 'O': operations}
+    return request, response
+
+
+def benchmark(codecs=None, entities=100, iterations=100):
+    """Times each codec parsing and serializing sample payloads.
+
+    @param codecs the codecs to compare, all installed backends by default
+    @param entities the number of entity proxies in each payload
+    @param iterations the number of times each payload is processed
+    @return a list of (codec name, decode seconds, encode seconds) tuples,
+            giving the time per payload
+    """
+    if codecs is None:
+        codecs = getAvailableCodecs()
+    payloads = [StdlibJsonCodec().dumps(value)
+            for value in createSamplePayload(entities)]
+    toReturn = list()
+    for codec in codecs:
+        values = [codec.loads(payload) for payload in payloads]
+        start = time.time()
+        for _ in range(iterations):
+            for payload in payloads:
+                codec.loads(payload)
+        decodeTime = (time.time() - start) / (iterations * len(payloads))
+        start = time.time()
+        for _ in range(iterations):
+            for value in values:
+                codec.dumps(value)
+        encodeTime = (time.time() - start) / (iterations * len(values))
+        toReturn.append((codec.name, decodeTime, encodeTime))
+    return toReturn
+
+
+def main(args):
+    entities = int(args[0]) if len(args) > 0 else 100
+    iterations = int(args[1]) if len(args) > 1 else 100
+    print('%-8s %12s %12s' % ('codec', 'decode (ms)', 'encode (ms)'))
+    for name, decodeTime, encodeTime in benchmark(None, entities, iterations):
+        print('%-8s %12.3f %12.3f' % (name, decodeTime * 1000,
+                encodeTime * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
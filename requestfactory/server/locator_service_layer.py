@@ -18,15 +18,26 @@
 {@link ServiceLocator} helper objects.
 """
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
 from paste.webkit.wkrequest import HTTPRequest
 
+from requestfactory.server.coroutines import resolve, resolveAll
 from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
-from requestfactory.shared.locator import Locator
+from requestfactory.shared.locator import Locator, _overrides
 
 
 class LocatorServiceLayer(ServiceLayerDecorator):
     """Adds support to the ServiceLayer chain for using {@link Locator} and
     {@link ServiceLocator} helper objects.
+    <p>
+    The retrieval methods of an {@link AsyncLocator} and the
+    {@code getInstance} method of an {@link AsyncServiceLocator} return
+    coroutines, which are awaited here; the ids of a batch passed to a Locator
+    without a {@code findAll} method are looked up concurrently.
     """
 
     def createDomainObject(self, clazz):
@@ -44,7 +55,7 @@ class LocatorServiceLayer(ServiceLayerDecorator):
         locatorType = self.getTop().resolveServiceLocator(requestContext)
         locator = self.getTop().createServiceLocator(locatorType)
         serviceClass = self.getTop().resolveServiceClass(requestContext)
-        return locator.getInstance(serviceClass)
+        return resolve(locator.getInstance(serviceClass))
 
 
     def createServiceLocator(self, serviceLocatorType):
@@ -66,14 +77,36 @@ class LocatorServiceLayer(ServiceLayerDecorator):
         return self.doGetVersion(domainObject)
 
 
+    def getVersions(self, domainObjects):
+        return self.doBatch(domainObjects, 'getVersions', 'getVersion')
+
+
     def isLive(self, domainObject):
         return self.doIsLive(domainObject)
 
 
+    def isLiveBatch(self, domainObjects):
+        return self.doBatch(domainObjects, 'isLiveBatch', 'isLive')
+
+
     def loadDomainObject(self, clazz, domainId):
         return self.doLoadDomainObject(clazz, domainId)
 
 
+    def loadDomainObjectsOfType(self, clazz, domainIds):
+        return self.doLoadDomainObjectsOfType(clazz, domainIds)
+
+
+    def prefetch(self, domainObjects, propertyPaths):
+        if domainObjects:
+            l = self.getLocator(domainObjects[0].__class__)
+            # The default hook does nothing, so the next layer may prefetch
+            if l is not None and _overrides(l, 'prefetch'):
+                resolve(l.prefetch(domainObjects, propertyPaths))
+                return
+        super(LocatorServiceLayer, self).prefetch(domainObjects, propertyPaths)
+
+
     def requiresServiceLocator(self, contextMethod, domainMethod):
         """Returns true if the context method returns a {@link Request} and the domain
         method is non-static.
@@ -100,7 +133,7 @@ class LocatorServiceLayer(ServiceLayerDecorator):
                 found = Class.forName(ln.locator(), False,
                     self.getTop().getDomainClassLoader()).asSubclass(Locator)
                 locatorType = found
-            except ClassNotFoundException, e:
+            except ClassNotFoundException as e:
                 return self.die(e, "Could not find the locator type specified in the @%s annotation %s",
                               ProxyForName.__class__.__name__, ln.value())
         else:
@@ -119,7 +152,7 @@ class LocatorServiceLayer(ServiceLayerDecorator):
             try:
                 locatorType = Class.forName(ln.locator(), False,
                       self.getTop().getDomainClassLoader()).asSubclass(ServiceLocator)
-            except ClassNotFoundException, e:
+            except ClassNotFoundException as e:
                 return self.die(e, "Could not find the locator type specified in the @%s annotation %s",
                            ServiceName.__class__.__name__, ln.value())
         else:
@@ -128,7 +161,7 @@ class LocatorServiceLayer(ServiceLayerDecorator):
 
 
     def doGetId(self, domainObject):
-        clazz = domainObject.getClass()
+        clazz = domainObject.__class__
         l = self.getLocator(clazz)
         if l is None:
             return super(LocatorServiceLayer, self).getId(domainObject)
@@ -136,7 +169,7 @@ class LocatorServiceLayer(ServiceLayerDecorator):
 
 
     def doGetVersion(self, domainObject):
-        clazz = domainObject.getClass()
+        clazz = domainObject.__class__
         l = self.getLocator(clazz)
         if l is None:
             return super(LocatorServiceLayer, self).getVersion(domainObject)
@@ -144,11 +177,11 @@ class LocatorServiceLayer(ServiceLayerDecorator):
 
 
     def doIsLive(self, domainObject):
-        clazz = domainObject.getClass()
+        clazz = domainObject.__class__
         l = self.getLocator(clazz)
-        if l is not None:
+        if l is None:
             return super(LocatorServiceLayer, self).isLive(domainObject)
-        return l.isLive(domainObject)
+        return resolve(l.isLive(domainObject))
 
 
     def doLoadDomainObject(self, clazz, domainId):
@@ -156,7 +189,61 @@ class LocatorServiceLayer(ServiceLayerDecorator):
         if l is None:
             return super(LocatorServiceLayer, self).loadDomainObject(clazz, domainId)
         id_ = l.getIdType().cast(domainId)
-        return l.find(clazz, id_)
+        return resolve(l.find(clazz, id_))
+
+
+    def doLoadDomainObjectsOfType(self, clazz, domainIds):
+        l = self.getLocator(clazz)
+        if l is None:
+            return super(LocatorServiceLayer, self).loadDomainObjectsOfType(clazz,
+                    domainIds)
+        idType = l.getIdType()
+        ids = [idType.cast(domainId) for domainId in domainIds]
+        # Locators that don't extend Locator may not provide the batch method
+        findAll = getattr(l, 'findAll', None)
+        if findAll is None:
+            return resolveAll([l.find(clazz, id_) for id_ in ids], False)
+        toReturn = resolve(findAll(clazz, ids))
+        if toReturn is None or len(toReturn) != len(ids):
+            return self.die(None, "%s.findAll() returned %s objects, expected %d",
+                    l.__class__.__name__,
+                    None if toReturn is None else len(toReturn), len(ids))
+        return toReturn
+
+
+    def doBatch(self, domainObjects, batchName, singleName):
+        """Splits a batch by domain type, sending the objects of types that have a
+        Locator to the Locator's batch method and all other objects to the next
+        layer in a single call.
+        """
+        toReturn = [None] * len(domainObjects)
+        indexesByClass = OrderedDict()
+        for i, domainObject in enumerate(domainObjects):
+            indexesByClass.setdefault(domainObject.__class__, list()).append(i)
+
+        withoutLocator = list()
+        for clazz, indexes in indexesByClass.items():
+            l = self.getLocator(clazz)
+            if l is None:
+                withoutLocator.extend(indexes)
+                continue
+            objects = [domainObjects[i] for i in indexes]
+            batch = getattr(l, batchName, None)
+            if batch is None:
+                # Locators that don't extend Locator may not provide the batch method
+                single = getattr(l, singleName)
+                values = resolveAll([single(o) for o in objects], False)
+            else:
+                values = resolve(batch(objects))
+            for i, value in zip(indexes, values):
+                toReturn[i] = value
+
+        if len(withoutLocator) > 0:
+            batch = getattr(super(LocatorServiceLayer, self), batchName)
+            values = batch([domainObjects[i] for i in withoutLocator])
+            for i, value in zip(withoutLocator, values):
+                toReturn[i] = value
+        return toReturn
 
 
     def getLocator(self, domainType):
@@ -169,6 +256,6 @@ class LocatorServiceLayer(ServiceLayerDecorator):
     def newInstance(self, clazz, base):
         try:
             return clazz()
-        except Exception, ex:
+        except Exception as ex:
             return self.die(ex, "Could not instantiate %s %s. Is it default-instantiable?",
                        base.getSimpleName(), clazz.__name__)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Compiled property references for the {@link Resolver}.
+
+The property references of an invocation, such as {@code with("a.b", "*.c")},
+are expanded into all of their prefixes and compiled into a trie. Each node
+holds the set of paths relative to one object in the returned graph. Moving
+from an object to one of its properties is a memoized lookup of the child
+node, which merges the paths under the property's name with those under the
+{@code '*'} wildcard.
+
+Clients send the same reference lists repeatedly, so compiled tries are kept
+in a bounded cache shared by all requests.
+"""
+
+import re
+import threading
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+# The maximum number of compiled tries retained.
+CACHE_SIZE = 256
+
+WILDCARD = '*'
+
+# List index suffixes, which the Editor framework may slip into paths.
+_INDEX = re.compile(r'\[\d+\]')
+
+_cache = OrderedDict()
+_cacheLock = threading.Lock()
+
+
+def expandPropertyRefs(refs):
+    """Expand property references into a fully-expanded set of properties. For
+    example, <code>[foo.bar.baz]</code> will be converted into
+    <code>[foo, foo.bar, foo.bar.baz]</code>.
+    """
+    toReturn = set()
+    if refs is None:
+        return toReturn
+    for raw in refs:
+        idx = len(raw)
+        while idx > 0:
+            toReturn.add(raw[:idx])
+            idx = raw.rfind('.', 0, idx)
+    return toReturn
+
+
+def snipIndexes(path):
+    """Removes all {@code [n]} index suffixes from a path."""
+    if '[' not in path:
+        return path
+    return _INDEX.sub('', path)
+
+
+def compilePropertyRefs(refs):
+    """Returns the compiled trie for a collection of property references,
+    compiling it only if the same references have not been seen recently.
+
+    @param refs the property references of an invocation, or {@code None}
+    @return a {@link PropertyPathTrie}
+    """
+    key = frozenset(refs or ())
+    with _cacheLock:
+        trie = _cache.pop(key, None)
+        if trie is not None:
+            # Move the entry to the most-recently-used position
+            _cache[key] = trie
+            return trie
+    trie = PropertyPathTrie(key)
+    with _cacheLock:
+        _cache[key] = trie
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return trie
+
+
+class PropertyPathNode(object):
+    """The paths requested relative to one object of the returned graph."""
+
+    __slots__ = ('_trie', '_paths', '_children', '_descended', '_matched',
+            '_wildcard', '_leafPaths')
+
+    def __init__(self, trie, paths):
+        self._trie = trie
+        self._paths = paths
+        self._wildcard = WILDCARD in paths
+        # Maps the first segment of each dotted path to the remainders
+        self._children = dict()
+        for path in paths:
+            head, dot, tail = path.partition('.')
+            if dot:
+                self._children.setdefault(head, set()).add(tail)
+        self._descended = dict()
+        self._matched = dict()
+        self._leafPaths = None
+
+
+    def getPaths(self):
+        """Returns the frozenset of relative paths held by this node."""
+        return self._paths
+
+
+    def getLeafPaths(self):
+        """Returns the sorted paths that are not a prefix of another path in
+        this node, i.e. the paths as the client wrote them.
+        """
+        if self._leafPaths is None:
+            prefixes = set()
+            for path in self._paths:
+                idx = path.rfind('.')
+                while idx > 0:
+                    prefixes.add(path[:idx])
+                    idx = path.rfind('.', 0, idx)
+            self._leafPaths = sorted(self._paths.difference(prefixes))
+        return self._leafPaths
+
+
+    def isEmpty(self):
+        return len(self._paths) == 0
+
+
+    def matches(self, name):
+        """Returns {@code true} if the named property was requested, directly or
+        by a wildcard.
+        """
+        if self._wildcard:
+            return True
+        toReturn = self._matched.get(name)
+        if toReturn is None:
+            toReturn = snipIndexes(name) in self._paths
+            self._matched[name] = toReturn
+        return toReturn
+
+
+    def descend(self, name):
+        """Returns the node holding the paths relative to the named property."""
+        toReturn = self._descended.get(name)
+        if toReturn is None:
+            paths = self._children.get(name)
+            wildcard = self._children.get(WILDCARD)
+            if paths is None:
+                paths = wildcard or ()
+            elif wildcard is not None:
+                paths = paths | wildcard
+            toReturn = self._trie.getNode(frozenset(paths))
+            self._descended[name] = toReturn
+        return toReturn
+
+
+    def union(self, other):
+        """Returns the node holding the paths of both nodes."""
+        if other is self or other.isEmpty():
+            return self
+        if self.isEmpty():
+            return other
+        return self._trie.getNode(self._paths | other._paths)
+
+
+    def difference(self, paths):
+        """Returns the node holding the paths of this node that are not in the
+        given set.
+        """
+        if not paths or self._paths.isdisjoint(paths):
+            return self
+        return self._trie.getNode(self._paths.difference(paths))
+
+
+    def __repr__(self):
+        return '<PropertyPathNode %s>' % sorted(self._paths)
+
+
+class PropertyPathTrie(object):
+    """The compiled form of the property references of an invocation. Nodes
+    with equal path sets are shared, so the memoized lookups of a node serve
+    every object that requests the same paths.
+    """
+
+    def __init__(self, refs):
+        self._nodes = dict()
+        self._empty = self.getNode(frozenset())
+        self._root = self.getNode(frozenset(expandPropertyRefs(refs)))
+
+
+    def getRoot(self):
+        """Returns the node for the object returned by the invocation."""
+        return self._root
+
+
+    def getEmpty(self):
+        return self._empty
+
+
+    def getNode(self, paths):
+        """Returns the node for a frozenset of relative paths."""
+        toReturn = self._nodes.get(paths)
+        if toReturn is None:
+            toReturn = self._nodes.setdefault(paths, PropertyPathNode(self, paths))
+        return toReturn
@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Lightweight server-side AutoBeans for EntityProxy and ValueProxy types.
+
+A response may hold a bean for every entity in the returned graph. Rather than
+having the AutoBeanFactorySource reflect on the proxy interface for each one,
+the properties of a proxy type are read once from a prototype AutoBean and a
+{@link ProxyBean} subclass is generated with a slot per property. The tags the
+request processor sets on every bean are held in fixed slots; any other tags
+go into a dict that is only created when needed.
+
+The client object returned by {@code as_()} is an instance of a shim class
+generated from the proxy interface, whose accessors read and write the slots of
+its bean. {@code AutoBeanUtils} does not know about shims, so use
+{@link #getAutoBean(delegate)} to find the bean of a client object. Values are
+passed through {@link RequestState#toEncodable(clientValue)} before being given
+to {@code EntityCodex.encode()}, which only replaces shims while
+{@code SLOTTED_PROXY_BEANS} is set.
+"""
+
+import threading
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from autobean.shared.auto_bean_visitor import AutoBeanVisitor, CollectionPropertyContext
+from autobean.shared.auto_bean_utils import AutoBeanUtils
+from autobean.vm.auto_bean_factory_source import AutoBeanFactorySource
+
+from requestfactory.shared.impl.constants import Constants
+
+
+# The slots holding the tags set on every bean by the request processor.
+_TAG_SLOTS = {
+    Constants.STABLE_ID: '_stableId',
+    Constants.DOMAIN_OBJECT: '_domainObject',
+    Constants.IN_RESPONSE: '_inResponse',
+    Constants.VERSION_PROPERTY_B64: '_version'
+}
+
+# Maps proxy types to their generated ProxyBean types.
+_beanTypes = dict()
+_beanTypesLock = threading.Lock()
+
+# Maps proxy types to the properties read from their AutoBeans.
+_properties = dict()
+
+
+def createProxyBean(proxyType, isEntity, configuration):
+    """Creates a {@link ProxyBean} for a proxy type. The bean type is generated
+    the first time a proxy type is seen.
+
+    @param proxyType an EntityProxy or ValueProxy type
+    @param isEntity {@code true} if the type is an EntityProxy, whose client
+             objects are equal when their stable ids are equal
+    @param configuration the Configuration of the prototype AutoBean from which
+             the properties of the type are read
+    """
+    beanType = _beanTypes.get(proxyType)
+    if beanType is None:
+        with _beanTypesLock:
+            beanType = _beanTypes.get(proxyType)
+            if beanType is None:
+                beanType = _createBeanType(proxyType, isEntity, configuration)
+                _beanTypes[proxyType] = beanType
+    return beanType()
+
+
+def getAutoBean(delegate):
+    """Returns the AutoBean of a client object, which may be the shim of a
+    {@link ProxyBean}.
+    """
+    if isinstance(delegate, ProxyShim):
+        return delegate._bean
+    return AutoBeanUtils.getAutoBean(delegate)
+
+
+def toEncodable(value):
+    """Replaces the shims in a client value, which may be a list or set of
+    client objects, with their stable ids. {@code EntityCodex.encode()} writes
+    a stable id in the same way as the proxy holding it.
+    """
+    if isinstance(value, ProxyShim):
+        return value._bean._stableId
+    if isinstance(value, (list, set)):
+        if any(isinstance(o, ProxyShim) for o in value):
+            return value.__class__(toEncodable(o) for o in value)
+    return value
+
+
+def getAllProperties(bean):
+    """Returns a map of the property names of a bean to their values."""
+    if isinstance(bean, ProxyBean):
+        return bean.getAllProperties()
+    return AutoBeanUtils.getAllProperties(bean)
+
+
+def getProperties(bean):
+    """Returns the properties of the proxy type of a bean, which may be a
+    {@link ProxyBean} or an AutoBean. The properties of an AutoBean's type are
+    read by visiting the first bean of that type.
+
+    @return a tuple of properties, each with a {@code name}, a {@code type}, the
+            {@code elementType} of a collection property and an {@code isValue}
+            flag
+    """
+    if isinstance(bean, ProxyBean):
+        return bean._properties
+    toReturn = _properties.get(bean.getType())
+    if toReturn is None:
+        schema = _SchemaVisitor()
+        bean.accept(schema)
+        toReturn = tuple(schema.properties)
+        _properties[bean.getType()] = toReturn
+    return toReturn
+
+
+def setProperties(bean, properties, values):
+    """Sets properties of a bean, which may be a {@link ProxyBean} or an
+    AutoBean. An AutoBean can only be written through the contexts passed to an
+    AutoBeanVisitor, so it is visited once.
+
+    @param properties properties returned by {@link #getProperties(bean)}
+    @param values the value of each property, in the same order
+    """
+    if isinstance(bean, ProxyBean):
+        for property_, value in zip(properties, values):
+            bean.setProperty(property_, value)
+    else:
+        bean.accept(_CopyVisitor(dict((property_.name, value)
+                for property_, value in zip(properties, values))))
+
+
+class _Property(object):
+    """A property of a proxy type, as seen by an AutoBeanVisitor."""
+
+    __slots__ = ('name', 'slot', 'type', 'elementType', 'isValue')
+
+    def __init__(self, name, type_, elementType, isValue):
+        self.name = name
+        self.slot = '_p_' + name
+        self.type = type_
+        self.elementType = elementType
+        self.isValue = isValue
+
+
+class _SchemaVisitor(AutoBeanVisitor):
+    """Records the properties of a prototype AutoBean."""
+
+    def __init__(self):
+        self.properties = list()
+
+
+    def visitReferenceProperty(self, propertyName, value, ctx):
+        elementType = ctx.getElementType() if isinstance(ctx, CollectionPropertyContext) else None
+        self.properties.append(_Property(propertyName, ctx.getType(),
+                elementType, False))
+        return False
+
+
+    def visitValueProperty(self, propertyName, value, ctx):
+        self.properties.append(_Property(propertyName, ctx.getType(), None,
+                True))
+        return False
+
+
+class _Context(object):
+    """The traversal context passed to {@code visit()} and {@code endVisit()}.
+    Records the beans already visited so that cycles are traversed once.
+    """
+
+    __slots__ = ('_seen',)
+
+    def __init__(self):
+        self._seen = set()
+
+
+    def enter(self, bean):
+        """Returns {@code false} if the bean has already been visited."""
+        if id(bean) in self._seen:
+            return False
+        self._seen.add(id(bean))
+        return True
+
+
+class _PropertyContext(object):
+    """Lets a visitor read the type of a property of a ProxyBean and set its
+    value. One context is moved from property to property during a traversal,
+    so a visitor must not keep it once the visit method has returned.
+    """
+
+    __slots__ = ('_bean', '_property')
+
+    def __init__(self, bean, property_=None):
+        self._bean = bean
+        self._property = property_
+
+
+    def canSet(self):
+        return True
+
+
+    def getType(self):
+        return self._property.type
+
+
+    def set(self, value):
+        self._bean.setProperty(self._property, value)
+
+
+class _CollectionPropertyContext(_PropertyContext, CollectionPropertyContext):
+
+    __slots__ = ()
+
+    def getElementType(self):
+        return self._property.elementType
+
+
+class ProxyBean(object):
+    """An AutoBean for a proxy type whose properties and common tags are held in
+    slots. Subclasses are generated by {@link #createProxyBean}; each adds a
+    slot for every property of its proxy type.
+    """
+
+    __slots__ = ('_stableId', '_domainObject', '_inResponse', '_version',
+            '_tags', '_frozen', '_shim')
+
+    # Set on each generated subclass
+    _proxyType = None
+    _shimType = None
+    _properties = ()
+    _configuration = None
+
+    def __init__(self):
+        self._stableId = None
+        self._domainObject = None
+        self._inResponse = None
+        self._version = None
+        self._tags = None
+        self._frozen = False
+        self._shim = None
+
+
+    def accept(self, visitor, context=None):
+        """Traverses the bean as an AutoBean would. The visitor's
+        {@code visit} method is called first; if it returns {@code true}, each
+        property is passed to {@code visitValueProperty},
+        {@code visitCollectionProperty} or {@code visitReferenceProperty} and
+        the matching {@code endVisit} method, descending into referenced beans
+        when the visit method returns {@code true}. {@code endVisit} is called
+        last.
+        """
+        if context is None:
+            context = _Context()
+        if not context.enter(self):
+            return
+        # Visitors written against older AutoBeanVisitors may lack the
+        # collection and endVisit methods
+        visitReference = visitor.visitReferenceProperty
+        visitCollection = getattr(visitor, 'visitCollectionProperty',
+                visitReference)
+        endVisitValue = getattr(visitor, 'endVisitValueProperty', _ignore)
+        endVisitReference = getattr(visitor, 'endVisitReferenceProperty', _ignore)
+        endVisitCollection = getattr(visitor, 'endVisitCollectionProperty',
+                endVisitReference)
+
+        if getattr(visitor, 'visit', _accept)(self, context):
+            ctx = _PropertyContext(self)
+            collectionCtx = _CollectionPropertyContext(self)
+            for property_ in self._properties:
+                name = property_.name
+                value = getattr(self, property_.slot, None)
+                if property_.isValue:
+                    ctx._property = property_
+                    visitor.visitValueProperty(name, value, ctx)
+                    endVisitValue(name, value, ctx)
+                elif property_.elementType is not None:
+                    collectionCtx._property = property_
+                    if visitCollection(name, value, collectionCtx) and value is not None:
+                        for element in value:
+                            _traverse(element, visitor, context)
+                    endVisitCollection(name, value, collectionCtx)
+                else:
+                    ctx._property = property_
+                    if visitReference(name, value, ctx) and value is not None:
+                        _traverse(value, visitor, context)
+                    endVisitReference(name, value, ctx)
+        getattr(visitor, 'endVisit', _ignore)(self, context)
+
+
+    def as_(self):
+        """Returns the client object, an instance of the proxy type."""
+        shim = self._shim
+        if shim is None:
+            shim = self._shimType.__new__(self._shimType)
+            shim._bean = self
+            self._shim = shim
+        return shim
+
+
+    def asAutoBean(self):
+        """Returns an AutoBean created by the AutoBeanFactorySource holding
+        the same property values and tags, for code that needs the full AutoBean
+        implementation.
+        """
+        toReturn = AutoBeanFactorySource.createBean(self._proxyType,
+                self._configuration)
+        for name, slot in _TAG_SLOTS.items():
+            value = getattr(self, slot)
+            if value is not None:
+                toReturn.setTag(name, value)
+        if self._tags is not None:
+            for name, value in self._tags.items():
+                toReturn.setTag(name, value)
+        toReturn.accept(_CopyVisitor(self.getAllProperties()))
+        if self._frozen:
+            toReturn.setFrozen()
+        return toReturn
+
+
+    def clone(self, deep):
+        return self.asAutoBean().clone(deep)
+
+
+    def getAllProperties(self):
+        toReturn = OrderedDict()
+        for property_ in self._properties:
+            toReturn[property_.name] = getattr(self, property_.slot, None)
+        return toReturn
+
+
+    def getFactory(self):
+        return None
+
+
+    def getTag(self, tagName):
+        slot = _TAG_SLOTS.get(tagName)
+        if slot is not None:
+            return getattr(self, slot)
+        if self._tags is None:
+            return None
+        return self._tags.get(tagName)
+
+
+    def getType(self):
+        return self._proxyType
+
+
+    def isFrozen(self):
+        return self._frozen
+
+
+    def isWrapper(self):
+        return False
+
+
+    def setFrozen(self, frozen=True):
+        self._frozen = frozen
+
+
+    def setTag(self, tagName, value):
+        slot = _TAG_SLOTS.get(tagName)
+        if slot is not None:
+            setattr(self, slot, value)
+        else:
+            if self._tags is None:
+                self._tags = dict()
+            self._tags[tagName] = value
+
+
+    def getProperty(self, property_):
+        return getattr(self, property_.slot, None)
+
+
+    def setProperty(self, property_, value):
+        if self._frozen:
+            raise RuntimeError('The AutoBean has been frozen')
+        setattr(self, property_.slot, value)
+
+
+class _CopyVisitor(AutoBeanVisitor):
+    """Sets the properties of an AutoBean that appear in a map."""
+
+    def __init__(self, values):
+        self._values = values
+
+
+    def visitReferenceProperty(self, propertyName, value, ctx):
+        if propertyName in self._values:
+            ctx.set(self._values[propertyName])
+        return False
+
+
+    def visitValueProperty(self, propertyName, value, ctx):
+        if propertyName in self._values:
+            ctx.set(self._values[propertyName])
+        return False
+
+
+class ProxyShim(object):
+    """The base of the generated client object types of ProxyBeans."""
+
+    __slots__ = ('_bean',)
+
+    def stableId(self):
+        return self._bean._stableId
+
+
+class _EntityProxyShim(ProxyShim):
+    """EntityProxies are equal if they have the same stable id."""
+
+    __slots__ = ()
+
+    def equals(self, o):
+        if not isinstance(o, _EntityProxyShim):
+            return False
+        return self._bean._stableId == o._bean._stableId
+
+
+    def hashCode(self):
+        return hash(self._bean._stableId)
+
+
+    def __eq__(self, o):
+        return self.equals(o)
+
+
+    def __ne__(self, o):
+        return not self.equals(o)
+
+
+    def __hash__(self):
+        return self.hashCode()
+
+
+class _ValueProxyShim(ProxyShim):
+    """ValueProxies are equal if they are of the same type and have equal
+    property values.
+    """
+
+    __slots__ = ()
+
+    def equals(self, o):
+        if not isinstance(o, _ValueProxyShim):
+            return False
+        if self._bean.getType() is not o._bean.getType():
+            return False
+        return self._bean.getAllProperties() == o._bean.getAllProperties()
+
+
+    def hashCode(self):
+        return hash((self._bean.getType(),
+                tuple(self._bean.getAllProperties().values())))
+
+
+    def __eq__(self, o):
+        return self.equals(o)
+
+
+    def __ne__(self, o):
+        return not self.equals(o)
+
+
+    def __hash__(self):
+        return self.hashCode()
+
+
+def _accept(*args):
+    return True
+
+
+def _ignore(*args):
+    pass
+
+
+def _traverse(value, visitor, context):
+    """Visits the bean of a client object referenced by a ProxyBean."""
+    if isinstance(value, ProxyShim):
+        value._bean.accept(visitor, context)
+    elif value is not None:
+        bean = AutoBeanUtils.getAutoBean(value)
+        if bean is not None and context.enter(bean):
+            bean.accept(visitor)
+
+
+def _createBeanType(proxyType, isEntity, configuration):
+    """Reads the properties of a proxy type from a prototype AutoBean and
+    generates its ProxyBean and shim types.
+    """
+    prototype = AutoBeanFactorySource.createBean(proxyType, configuration)
+    schema = _SchemaVisitor()
+    prototype.accept(schema)
+    return _defineBeanType(proxyType, isEntity, tuple(schema.properties),
+            configuration)
+
+
+def _defineBeanType(proxyType, isEntity, properties, configuration):
+    """Generates the ProxyBean and shim types of a proxy type with the given
+    properties.
+    """
+    shimBase = _EntityProxyShim if isEntity else _ValueProxyShim
+    attrs = {'__slots__': ()}
+    for property_ in properties:
+        capitalized = property_.name[:1].upper() + property_.name[1:]
+        getter = 'get' + capitalized
+        for prefix in ('is', 'has'):
+            if hasattr(proxyType, prefix + capitalized):
+                getter = prefix + capitalized
+        attrs[getter] = _createGetter(property_)
+        attrs['set' + capitalized] = _createSetter(property_)
+    shimType = type(proxyType.__name__, (shimBase, proxyType), attrs)
+
+    return type(proxyType.__name__ + 'Bean', (ProxyBean,), {
+        '__slots__': tuple(property_.slot for property_ in properties),
+        '_proxyType': proxyType,
+        '_shimType': shimType,
+        '_properties': properties,
+        '_configuration': configuration
+    })
+
+
+def _createGetter(property_):
+    def getter(self):
+        return self._bean.getProperty(property_)
+    return getter
+
+
+def _createSetter(property_):
+    def setter(self, value):
+        self._bean.setProperty(property_, value)
+    return setter
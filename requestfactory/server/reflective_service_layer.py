@@ -14,14 +14,33 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import inspect
 import logging
+import operator
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from requestfactory.server.accessor_plan import AccessorPlan
+from requestfactory.server.coroutines import resolve
 from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+class BeanMethod(object):
+    """The kinds of accessor located by
+    {@link ReflectiveServiceLayer#getBeanMethod(BeanMethod, Class, String)},
+    with the method name prefixes searched for each.
+    """
+
+    GET = ('get', 'is', 'has')
+    SET = ('set',)
+
+
 class ReflectiveServiceLayer(ServiceLayerDecorator):
     """Implements all methods that interact with domain objects."""
 
@@ -33,18 +52,49 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
     def getBeanMethod(self, methodType, domainType, property_):
         """Linear search, but we want to handle getFoo, isFoo, and hasFoo. The
         result of this method will be cached by the ServiceLayerCache.
+        <p>
+        Domain types without bean methods for a property are accessed through
+        the attribute of the same name, if the type declares it or its instances
+        can hold arbitrary attributes.
+
+        @return a callable taking the domain object, and the new value when
+                setting, or {@code None} if the property has no accessor
         """
-        pass
+        capitalized = property_[:1].upper() + property_[1:]
+        for prefix in methodType:
+            name = prefix + capitalized
+            for searchIn in domainType.__mro__:
+                if name in searchIn.__dict__:
+                    method = searchIn.__dict__[name]
+                    if (inspect.isroutine(method)
+                            and not isinstance(method, (staticmethod, classmethod))):
+                        return getattr(domainType, name)
+                    break
+
+        declared = getattr(domainType, property_, None)
+        if methodType is BeanMethod.GET:
+            if declared is not None or _hasInstanceDict(domainType):
+                return operator.attrgetter(property_)
+        elif isinstance(declared, property):
+            if declared.fset is not None:
+                return _attrsetter(property_)
+        elif declared is not None or _hasInstanceDict(domainType):
+            return _attrsetter(property_)
+        return None
 
 
     def createDomainObject(self, clazz):
         try:
             return clazz()
-        except Exception, ex:
+        except Exception as ex:
             return self.die(ex, "Could not create a new instance of domain type %s",
                     clazz.__name__)
 
 
+    def getAccessorPlan(self, domainType):
+        return AccessorPlan(self, domainType)
+
+
     def getGetter(self, domainType, property_):
         return self.getBeanMethod(BeanMethod.GET, domainType, property_)
 
@@ -58,15 +108,8 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
 
 
     def getProperty(self, domainObject, property_):
-        try:
-            getter = self.getTop().getGetter(domainObject.getClass(), property_)
-            if getter is None:
-                self.die(None, "Could not determine getter for property %s on type %s",
-                        property_, domainObject.__class__.__name__)
-            value = getter(domainObject)
-            return value
-        except Exception, e:
-            return self.die(e, "Could not retrieve property %s", property_)
+        plan = self.getTop().getAccessorPlan(domainObject.__class__)
+        return plan.getValue(domainObject, property_)
 
 
     def getRequestReturnType(self, contextMethod):
@@ -86,16 +129,26 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
 
 
     def getSetter(self, domainType, property_):
-        setter = self.getBeanMethod(BeanMethod.SET, domainType, property_)
-        if setter is None:
-            setter = self.getBeanMethod(BeanMethod.SET_BUILDER, domainType, property_)
-        return setter
+        return self.getBeanMethod(BeanMethod.SET, domainType, property_)
+
+
+    def getStaticMethod(self, clazz, prefix):
+        for searchIn in clazz.__mro__:
+            searchFor = prefix + searchIn.__name__
+            method = searchIn.__dict__.get(searchFor)
+            if isinstance(method, (staticmethod, classmethod)):
+                return getattr(clazz, searchFor)
+        return None
 
 
     def getVersion(self, domainObject):
         return self.getTop().getProperty(domainObject, "version")
 
 
+    def getVersions(self, domainObjects):
+        return [self.getTop().getVersion(o) for o in domainObjects]
+
+
     def invoke(self, domainMethod, *args):
         try:
             if Modifier.isStatic(domainMethod.getModifiers()):
@@ -104,7 +157,7 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
                 realArgs = list()
                 System.arraycopy(args, 1, realArgs, 0, realArgs.length)
                 return domainMethod(args[0], realArgs)
-        except Exception, ex:
+        except Exception as ex:
             return self.die(ex, "Could not invoke method %s", domainMethod.getName())
 
 
@@ -113,35 +166,77 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
         store.
         """
         id_ = self.getTop().getId(domainObject)
-        return self.getTop().invoke(self.getFind(domainObject.getClass()), id_) != None
+        return resolve(self.getTop().invoke(self.getFind(domainObject.__class__),
+                id_)) != None
+
+
+    def isLiveBatch(self, domainObjects):
+        """This implementation re-loads the objects from the backing store, using
+        one batch per domain type.
+        """
+        toReturn = [False] * len(domainObjects)
+        idsByClass = OrderedDict()
+        for i, domainObject in enumerate(domainObjects):
+            # As in isLive(), objects without an id are still looked up
+            id_ = self.getTop().getId(domainObject)
+            idsByClass.setdefault(domainObject.__class__, list()).append((i, id_))
+        for clazz, entries in idsByClass.items():
+            found = self.getTop().loadDomainObjectsOfType(clazz,
+                    [id_ for _, id_ in entries])
+            for (i, _), domain in zip(entries, found):
+                toReturn[i] = domain is not None
+        return toReturn
 
 
     def loadDomainObject(self, clazz, id_):
         if id_ is None:
             self.die(None, "Cannot invoke find method with a None id")
-        return clazz.cast(self.getTop().invoke(self.getFind(clazz), id_))
+        return clazz.cast(resolve(self.getTop().invoke(self.getFind(clazz), id_)))
 
 
     def loadDomainObjects(self, classes, domainIds):
         if len(classes) != len(domainIds):
             self.die(None, "Size mismatch in paramaters. classes.size() = %d domainIds.size=%d",
                     len(classes), len(domainIds))
-        toReturn = list()
+        # Group the ids by type so that each type can be loaded in one batch
+        idsByClass = OrderedDict()
         for i, clazz in enumerate(classes):
-            toReturn.append(self.getTop().loadDomainObject(clazz, domainIds[i]))
+            idsByClass.setdefault(clazz, list()).append(i)
+        toReturn = [None] * len(classes)
+        for clazz, indexes in idsByClass.items():
+            loaded = self.getTop().loadDomainObjectsOfType(clazz,
+                    [domainIds[i] for i in indexes])
+            for i, domain in zip(indexes, loaded):
+                toReturn[i] = domain
         return toReturn
 
 
-    def setProperty(self, domainObject, property_, expectedType, value):
-        try:
-            setter = self.getTop().getSetter(domainObject.getClass(), property_)
-            if setter is None:
-                self.die(None, "Could not locate setter for property %s in type %s",
-                        property_, domainObject.__class__.__name__)
-            setter.invoke(domainObject, value)
+    def loadDomainObjectsOfType(self, clazz, domainIds):
+        if None in domainIds:
+            self.die(None, "Cannot invoke find method with a None id")
+        findAll = self.getFindAll(clazz)
+        if findAll is None:
+            return [self.getTop().loadDomainObject(clazz, id_) for id_ in domainIds]
+        toReturn = resolve(self.getTop().invoke(findAll, list(domainIds)))
+        if toReturn is None or len(toReturn) != len(domainIds):
+            return self.die(None, "%s() returned %s objects, expected %d",
+                    findAll.__name__,
+                    None if toReturn is None else len(toReturn), len(domainIds))
+        return list(toReturn)
+
+
+    def prefetch(self, domainObjects, propertyPaths):
+        if not domainObjects:
             return
-        except Exception, e:
-            self.die(e, "Could not set property %s", property_)
+        method = self.getTop().getStaticMethod(domainObjects[0].__class__,
+                "prefetch")
+        if method is not None:
+            resolve(method(list(domainObjects), list(propertyPaths)))
+
+
+    def setProperty(self, domainObject, property_, expectedType, value):
+        plan = self.getTop().getAccessorPlan(domainObject.__class__)
+        plan.setValue(domainObject, property_, value)
 
 
     def validate(self, domainObject):
@@ -166,6 +261,14 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
         return self.getFind(clazz.getSuperclass())
 
 
+    def getFindAll(self, clazz):
+        """Returns the optional static {@code findAllFoo(List)} batch method declared
+        by the domain type or one of its supertypes, or {@code None} if the type
+        only provides a single-id {@code findFoo()} method.
+        """
+        return self.getTop().getStaticMethod(clazz, "findAll")
+
+
     def isKeyType(self, domainClass):
         """Returns <code>true</code> if the given class can be used as an id or
         version key.
@@ -175,3 +278,14 @@ class ReflectiveServiceLayer(ServiceLayerDecorator):
 
         return issubclass(self.getTop().resolveClientType(domainClass,
                 BaseProxy.__class__, True), BaseProxy)
+
+
+def _hasInstanceDict(domainType):
+    """Returns {@code true} if instances of the type have a {@code __dict__}."""
+    return any('__dict__' in searchIn.__dict__ for searchIn in domainType.__mro__)
+
+
+def _attrsetter(name):
+    def setter(domainObject, value):
+        setattr(domainObject, name, value)
+    return setter
@@ -21,7 +21,8 @@ from requestfactory.shared.request_factory import RequestFactory
 from requestfactory.server.service_layer import ServiceLayer
 from requestfactory.server.simple_request_processor import SimpleRequestProcessor
 
-from requestfactory.utils import readContent
+from requestfactory.utils import readContentBytes, writeResponse, \
+    UNCOMPRESSED_BYTE_SIZE_LIMIT, COMPRESSION_LEVEL
 
 from paste.webkit.wkservlet import HTTPServlet
 
@@ -30,6 +31,9 @@ SC_OK = 200
 SC_INTERNAL_SERVER_ERROR = 500
 
 DUMP_PAYLOAD = False
+# Responses shorter than this many bytes are sent uncompressed; None disables
+# compression.
+COMPRESSION_THRESHOLD = UNCOMPRESSED_BYTE_SIZE_LIMIT
 JSON_CHARSET = 'UTF-8'
 JSON_CONTENT_TYPE = 'application/json'
 
@@ -53,8 +57,24 @@ class RequestFactoryServlet(HTTPServlet):
             exceptionHandler = DefaultExceptionHandler()
 
         self._processor = SimpleRequestProcessor(ServiceLayer.create(
-                serviceDecorators))
+                *serviceDecorators))
         self._processor.setExceptionHandler(exceptionHandler)
+        self._compressionThreshold = COMPRESSION_THRESHOLD
+        self._compressionLevel = COMPRESSION_LEVEL
+
+
+    def setCompressionThreshold(self, threshold):
+        """Sets the size, in bytes, below which responses are sent uncompressed,
+        or {@code None} to never compress responses.
+        """
+        self._compressionThreshold = threshold
+
+
+    def setCompressionLevel(self, level):
+        """Sets the zlib level, from 1 (fastest) to 9 (smallest), at which
+        responses are compressed.
+        """
+        self._compressionLevel = level
 
 
     def respondToPost(self, transaction):
@@ -66,18 +86,22 @@ class RequestFactoryServlet(HTTPServlet):
         """
         request, response = transaction.request(), transaction.response()
 
-        jsonRequestString = readContent(request, JSON_CONTENT_TYPE, JSON_CHARSET)
+        # The UTF-8 body is passed to the processor without being decoded
+        jsonRequestString = readContentBytes(request, JSON_CONTENT_TYPE,
+                JSON_CHARSET)
         if DUMP_PAYLOAD:
-            print '>>> ' + jsonRequestString
+            print('>>> ' + jsonRequestString.decode(JSON_CHARSET))
         try:
-            payload = self._processor.process(jsonRequestString)
+            payload = self._processor.processPayload(jsonRequestString)
             if DUMP_PAYLOAD:
-                print '<<< ' + payload
+                print('<<< ' + payload.decode(JSON_CHARSET))
             response.setStatus(SC_OK)
             response.setContentType(RequestFactory.JSON_CONTENT_TYPE_UTF8)
-            # Write after setting the content type
-            response.write(payload)
+            # Write after setting the content type, compressing the payload if
+            # the client accepts gzip or deflate
+            writeResponse(request, response, payload,
+                    self._compressionThreshold, self._compressionLevel)
             response.flush()
-        except RuntimeError, e:
+        except RuntimeError as e:
             response.sendError(SC_INTERNAL_SERVER_ERROR)
             LOGGER.log(logging.CRITICAL, 'Unexpected error', e)
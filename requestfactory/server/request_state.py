@@ -14,6 +14,11 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
 from requestfactory.shared.value_proxy import ValueProxy
 from requestfactory.shared.entity_proxy import EntityProxy
 from requestfactory.shared.impl.id_factory import IdFactory
@@ -25,14 +30,17 @@ from requestfactory.shared.messages.id_message import IdMessage, Strength
 from requestfactory.server.exceptions import UnexpectedException
 from requestfactory.server.service_layer import ServiceLayer
 from requestfactory.server.resolver import Resolver
+from requestfactory.server.proxy_bean import createProxyBean, toEncodable
 
 from autobean.shared.value_codex import ValueCodex
 from autobean.shared.impl.string_quoter import StringQuoter
 from autobean.shared.auto_bean_codex import AutoBeanCodex
 from autobean.vm.auto_bean_factory_source import AutoBeanFactorySource
 
-from requestfactory.server.simple_request_processor \
-    import SimpleRequestProcessor, IdToEntityMap, fromBase64, toBase64
+
+# Create proxy beans with slots for their properties and tags, instead of
+# having the AutoBeanFactorySource build a full AutoBean for every id.
+SLOTTED_PROXY_BEANS = False
 
 
 class _IdFactory(IdFactory):
@@ -41,10 +49,10 @@ class _IdFactory(IdFactory):
         self._service = service
 
     def isEntityType(self, clazz):
-        return EntityProxy.isAssignableFrom(clazz)
+        return issubclass(clazz, EntityProxy)
 
     def isValueType(self, clazz):
-        return ValueProxy.isAssignableFrom(clazz)
+        return issubclass(clazz, ValueProxy)
 
     def getTypeFromToken(self, typeToken):
         return self._service.resolveClass(typeToken)
@@ -63,20 +71,27 @@ class RequestState(EntityCodex.EntitySource):
 
         if isinstance(parentOrService, RequestState):
             parent = parentOrService
-            self._idFactory = parent.idFactory
-            self._domainObjectsToId = parent.domainObjectsToId
-            self._service = parent.service
+            self._idFactory = parent._idFactory
+            self._domainObjectsToId = parent._domainObjectsToId
+            self._domainVersions = parent._domainVersions
+            self._base64 = parent._base64
+            self._service = parent._service
             self._resolver = Resolver(self)
         else:
             self._service = parentOrService
             self._idFactory = _IdFactory(self._service)
-            self._domainObjectsToId = IdentityHashMap()
+            # Maps id(domainObject) to (domainObject, id)
+            self._domainObjectsToId = dict()
+            # Maps id(domainObject) to (domainObject, version)
+            self._domainVersions = dict()
+            # Maps server id and version payloads to their base64 encoding
+            self._base64 = dict()
             self._resolver = Resolver(self)
 
 
     def flatten(self, domainValue):
         """Turn a domain value into a wire format message."""
-        if ValueCodex.canDecode(domainValue.getClass()):
+        if ValueCodex.canDecode(domainValue.__class__):
             flatValue = ValueCodex.encode(domainValue)
         else:
             flatValue = SimpleRequestProcessor(self._service).createOobMessage([domainValue])
@@ -112,6 +127,27 @@ class RequestState(EntityCodex.EntitySource):
         return self.getBeansForIds(ids)
 
 
+    def getDomainVersions(self, domainObjects):
+        """Returns the versions of the given domain objects. Versions already
+        computed while resolving the response are reused, the remaining ones are
+        retrieved with a single call to {@link ServiceLayer#getVersions(List)}.
+        """
+        toReturn = [None] * len(domainObjects)
+        missing = list()
+        for i, domainObject in enumerate(domainObjects):
+            known = self._domainVersions.get(id(domainObject))
+            if known is None:
+                missing.append(i)
+            else:
+                toReturn[i] = known[1]
+        if len(missing) > 0:
+            versions = self._service.getVersions([domainObjects[i] for i in missing])
+            for i, version in zip(missing, versions):
+                self.setDomainVersion(domainObjects[i], version)
+                toReturn[i] = version
+        return toReturn
+
+
     def getIdFactory(self):
         return self._idFactory
 
@@ -137,7 +173,7 @@ class RequestState(EntityCodex.EntitySource):
             ref.setStrength(Strength.EPHEMERAL)
             ref.setClientId(stableId.getClientId())
         else:
-            ref.setServerId(toBase64(stableId.getServerId()))
+            ref.setServerId(self.toBase64(stableId.getServerId()))
         return AutoBeanCodex.encode(bean)
 
 
@@ -145,11 +181,40 @@ class RequestState(EntityCodex.EntitySource):
         return self._service
 
 
+    def setDomainVersion(self, domain, version):
+        """Records the version of a domain object computed while processing this
+        request so that it need not be retrieved again.
+        """
+        self._domainVersions[id(domain)] = (domain, version)
+
+
     def getStableId(self, domain):
         """If the given domain object has been previously associated with an
         id, return it.
         """
-        return self._domainObjectsToId.get(domain)
+        known = self._domainObjectsToId.get(id(domain))
+        return None if known is None else known[1]
+
+
+    def toBase64(self, data):
+        """Returns the base64 encoding of a server id or version payload. Each
+        distinct payload is encoded once per request.
+        """
+        toReturn = self._base64.get(data)
+        if toReturn is None:
+            toReturn = toBase64(data)
+            self._base64[data] = toReturn
+        return toReturn
+
+
+    def toEncodable(self, clientValue):
+        """Returns a client value that {@code EntityCodex.encode()} can write.
+        Slotted proxy beans are replaced by their stable ids, other values are
+        returned as they are.
+        """
+        if SLOTTED_PROXY_BEANS:
+            return toEncodable(clientValue)
+        return clientValue
 
 
     def isEntityType(self, clazz):
@@ -164,8 +229,13 @@ class RequestState(EntityCodex.EntitySource):
 
     def createProxyBean(self, id_, domainObject):
         """Creates an AutoBean for the given id, tracking a domain object."""
-        toReturn = AutoBeanFactorySource.createBean(id_.getProxyClass(),
-                SimpleRequestProcessor.CONFIGURATION)
+        if SLOTTED_PROXY_BEANS:
+            toReturn = createProxyBean(id_.getProxyClass(),
+                    self.isEntityType(id_.getProxyClass()),
+                    SimpleRequestProcessor.CONFIGURATION)
+        else:
+            toReturn = AutoBeanFactorySource.createBean(id_.getProxyClass(),
+                    SimpleRequestProcessor.CONFIGURATION)
         toReturn.setTag(Constants.STABLE_ID, id_)
         toReturn.setTag(Constants.DOMAIN_OBJECT, domainObject)
         self.beans[id_] = toReturn
@@ -176,9 +246,8 @@ class RequestState(EntityCodex.EntitySource):
         """Returns the AutoBeans corresponding to the given ids, or creates
         them if they do not yet exist.
         """
-        domainClasses = list()
-        domainIds = list()
-        idsToLoad = list()
+        # Ids to load, grouped by domain type so that each type is loaded in one batch
+        idsByClass = OrderedDict()
 
         # Create proxies for ephemeral or synthetic ids that we haven't seen. Queue
         # up the domain ids for entities that need to be loaded.
@@ -195,7 +264,7 @@ class RequestState(EntityCodex.EntitySource):
                             + domainClass.getCanonicalName(), None)
                 bean = self.createProxyBean(id_, domain)
                 self.beans[id_] = bean
-                self._domainObjectsToId[domain] = id_
+                self._domainObjectsToId[id(domain)] = (domain, id_)
             else:
                 # Decode the domain parameter
                 split = StringQuoter.split(id_.getServerId())
@@ -206,22 +275,20 @@ class RequestState(EntityCodex.EntitySource):
                     domainParam = SimpleRequestProcessor(self._service).decodeOobMessage(param, split).get(0)
 
                 # Enqueue
-                domainClasses.append(self._service.resolveDomainClass(id_.getProxyClass()))
+                domainIds, idsToLoad = idsByClass.setdefault(domainClass,
+                        (list(), list()))
                 domainIds.append(domainParam)
                 idsToLoad.append(id_)
 
-        # Actually load the data
-        if len(domainClasses) > 0:
-            assert (len(domainClasses) == len(domainIds)
-                    and len(domainClasses) == len(idsToLoad))
-            loaded = self._service.loadDomainObjects(domainClasses, domainIds)
+        # Actually load the data, one batch per domain type
+        for domainClass, (domainIds, idsToLoad) in idsByClass.items():
+            assert len(domainIds) == len(idsToLoad)
+            loaded = self._service.loadDomainObjectsOfType(domainClass, domainIds)
             if len(idsToLoad) != len(loaded):
-                raise UnexpectedException('Expected ' + len(idsToLoad)
-                        + ' objects to be loaded, got ' + len(loaded), None)
-            itLoaded = iter(loaded)
-            for id_ in idsToLoad:
-                domain = itLoaded.next()
-                self._domainObjectsToId[domain] = id_
+                raise UnexpectedException('Expected %d objects to be loaded, got %d'
+                        % (len(idsToLoad), len(loaded)), None)
+            for id_, domain in zip(idsToLoad, loaded):
+                self._domainObjectsToId[id(domain)] = (domain, id_)
                 bean = self.createProxyBean(id_, domain)
                 self.beans[id_] = bean
 
@@ -232,3 +299,8 @@ class RequestState(EntityCodex.EntitySource):
 
         return toReturn
 
+
+# The processor and RequestState depend on each other, so each is imported
+# after the other's module has defined its names.
+from requestfactory.server.simple_request_processor \
+    import SimpleRequestProcessor, IdToEntityMap, fromBase64, toBase64
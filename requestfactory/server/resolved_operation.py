@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+
+class ResolvedOperation(object):
+    """Everything the {@link SimpleRequestProcessor} needs to know to invoke an
+    operation, resolved once by {@link ServiceLayer#resolveOperation(String)}.
+    """
+
+    def __init__(self, operation, requestContext, contextMethod, domainMethod,
+                isStatic, requiresServiceLocator, returnType, contextArgs,
+                genericArgs, argumentDecoders, isIndependent=False,
+                acceptsInvocationContext=None):
+        self._operation = operation
+        self._requestContext = requestContext
+        self._contextMethod = contextMethod
+        self._domainMethod = domainMethod
+        self._isStatic = isStatic
+        self._requiresServiceLocator = requiresServiceLocator
+        self._returnType = returnType
+        self._contextArgs = contextArgs
+        self._genericArgs = genericArgs
+        self._argumentDecoders = argumentDecoders
+        self._isIndependent = isIndependent
+        self._acceptsInvocationContext = acceptsInvocationContext
+
+
+    def getOperation(self):
+        return self._operation
+
+
+    def getRequestContext(self):
+        """Returns the RequestContext that declares the operation."""
+        return self._requestContext
+
+
+    def getContextMethod(self):
+        """Returns the RequestContext method declaration."""
+        return self._contextMethod
+
+
+    def getDomainMethod(self):
+        """Returns the domain service method to invoke."""
+        return self._domainMethod
+
+
+    def isStatic(self):
+        """Returns {@code true} if the operation is not an InstanceRequest."""
+        return self._isStatic
+
+
+    def requiresServiceLocator(self):
+        """Returns {@code true} if a service instance must be passed as the 0th
+        argument of the domain method.
+        """
+        return self._requiresServiceLocator
+
+
+    def getReturnType(self):
+        """Returns the client type of the value returned by the operation."""
+        return self._returnType
+
+
+    def getContextArgs(self):
+        """Returns the raw client types of the arguments, including the instance
+        object in the 0th position for InstanceRequests.
+        """
+        return self._contextArgs
+
+
+    def getGenericArgs(self):
+        """Returns the generic client types of the arguments, including the
+        instance object in the 0th position for InstanceRequests.
+        """
+        return self._genericArgs
+
+
+    def getArgumentDecoders(self):
+        """Returns the decoders for the arguments, in the same order as
+        {@link #getContextArgs()}.
+        """
+        return self._argumentDecoders
+
+
+    def isIndependent(self):
+        """Returns {@code true} if the domain method may run concurrently with
+        neighbouring independent invocations.
+        """
+        return self._isIndependent
+
+
+    def acceptsInvocationContext(self):
+        """Returns {@code POSITIONAL} if the domain method takes the
+        InvocationContext of the invocation as its last argument, {@code KEYWORD}
+        if it takes it as a keyword-only argument, otherwise {@code None}.
+        """
+        return self._acceptsInvocationContext
@@ -14,17 +14,21 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
-from autobean.shared.auto_bean_visitor import AutoBeanVisitor, CollectionPropertyContext
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
 from autobean.shared.value_codex import ValueCodex
 from autobean.vm.impl.type_utils import TypeUtils
-from autobean.shared.auto_bean_utils import AutoBeanUtils
 
 from requestfactory.server.exceptions import ReportableException, DeadEntityException
 from requestfactory.shared.base_proxy import BaseProxy
 from requestfactory.shared.entity_proxy_id import EntityProxyId
 from requestfactory.shared.impl.constants import Constants
 
-from requestfactory.server.simple_request_processor import toBase64
+from requestfactory.server import property_path_trie
+from requestfactory.server.proxy_bean import getAutoBean, getProperties, setProperties
 
 
 class CollectionType(object):
@@ -34,12 +38,15 @@ class CollectionType(object):
         self._rawType = rawType
         self._elementType = elementType
 
-    def equals(self, o):
+    def __eq__(self, o):
         if not isinstance(o, CollectionType):
             return False
         other = o
-        return (self._rawType == other.rawType
-                and self._elementType == other.elementType)
+        return (self._rawType == other._rawType
+                and self._elementType == other._elementType)
+
+    def __ne__(self, o):
+        return not self.__eq__(o)
 
     def getActualTypeArguments(self):
         return [self._elementType]
@@ -50,63 +57,96 @@ class CollectionType(object):
     def getRawType(self):
         return self._rawType
 
-    def hashCode(self):
-        return ((self._rawType.hashCode() * 13)
-                + (self._elementType.hashCode() * 7))
+    def __hash__(self):
+        return (hash(self._rawType) * 13) + (hash(self._elementType) * 7)
 
 
-class PropertyResolver(AutoBeanVisitor):
-    """Copies values and references from a domain object to a client object.
-    This type does not descend into referenced objects.
+class PropertyResolver(object):
+    """Copies values and references from domain objects to client objects. One
+    instance serves a group of Resolutions that share a domain type, a requested
+    type and the paths still to resolve, so the properties to send are
+    enumerated once per group. This type does not descend into referenced
+    objects.
     """
 
-    def __init__(self, resolution, resolver):
-        key = resolution.getResolutionKey()
-        self._domainEntity = key.getDomainObject()
-        self._isOwnerValueProxy = self._resolver._state.isValueType(TypeUtils.ensureBaseType(key.requestedType))
-        self._needsSimpleValues = resolution.needsSimpleValues()
-        self._propertyRefs = resolution.takeWork()
-
+    def __init__(self, resolver, domainType, requestedType, needsSimpleValues,
+                propertyRefs):
         self._resolver = resolver
+        self._service = resolver.getServiceLayer()
 
-    def visitReferenceProperty(self, propertyName, value, ctx):
-        # Send the property if the enclosing type is a ValueProxy, if the owner
-        # requested the property, or if the property is a list of values.
-
-        elementType = ctx.getElementType() if isinstance(ctx, CollectionPropertyContext) else None
-        shouldSend = (self._isOwnerValueProxy or self._resolver.matchesPropertyRef(self._propertyRefs, propertyName)) or (elementType is not None and ValueCodex.canDecode(elementType))
-        if not shouldSend:
-            return False
-        # Call the getter
-        domainValue = self._resolver._service.getProperty(self._domainEntity, propertyName)
-        if domainValue is None:
-            return False
-        # Turn the domain object into something usable on the client side
-        if elementType is None:
-            type_ = ctx.getType()
-        else:
-            type_ = CollectionType(ctx.getType(), elementType)
-        resolution = self._resolver.resolveClientValue(domainValue, type_)
-        self._resolver.addPathsToResolution(resolution, propertyName, self._propertyRefs)
-        ctx.set(resolution.getClientObject())
-        return False
+        self._isOwnerValueProxy = resolver.getRequestState().isValueType(TypeUtils.ensureBaseType(requestedType))
+        self._needsSimpleValues = needsSimpleValues
+        self._propertyRefs = propertyRefs
+        # Property values are read through the plan without a ServiceLayer hop
+        self._plan = self._service.getAccessorPlan(domainType)
 
-    def visitValueProperty(self, propertyName, value, ctx):
-        # Only call the getter for simple values once since they're not
-        # explicitly enumerated.
+    def resolve(self, resolutions):
+        """Copies the properties of the domain object of each Resolution in the
+        group to its client object.
 
-        if self._needsSimpleValues:
-            # Limit unrequested value properties?
-            value = self._resolver._service.getProperty(self._domainEntity, propertyName)
-            ctx.set(value)
-        return False
+        @param resolutions Resolutions whose work has been taken
+        """
+        domainObjects = [resolution.getResolutionKey().getDomainObject()
+                for resolution in resolutions]
+        if not self._propertyRefs.isEmpty():
+            # Let the domain load the requested relations of the whole group
+            self._service.prefetch(domainObjects,
+                    self._propertyRefs.getLeafPaths())
+        beans = [getAutoBean(resolution.getClientObject())
+                for resolution in resolutions]
+
+        # Enumerate the properties to send once for the whole group
+        values = list()
+        references = list()
+        for property_ in getProperties(beans[0]):
+            if property_.isValue:
+                # Only call the getter for simple values once since they're not
+                # explicitly enumerated.
+                if self._needsSimpleValues:
+                    # Limit unrequested value properties?
+                    values.append(property_)
+            elif self.shouldSend(property_):
+                references.append(property_)
+
+        # Maps each bean to the properties it is sent and their values
+        sent = [(list(values), [self._plan.getProperty(domainObject, property_.name)
+                for property_ in values]) for domainObject in domainObjects]
+
+        # Resolve each reference property for the whole group
+        for property_ in references:
+            if property_.elementType is None:
+                type_ = property_.type
+            else:
+                type_ = CollectionType(property_.type, property_.elementType)
+            paths = self._propertyRefs.descend(property_.name)
+            for domainObject, (properties, propertyValues) in zip(domainObjects, sent):
+                # Call the getter
+                domainValue = self._plan.getProperty(domainObject, property_.name)
+                if domainValue is None:
+                    continue
+                # Turn the domain object into something usable on the client side
+                resolution = self._resolver.resolveClientValue(domainValue, type_)
+                self._resolver.addPathsToResolution(resolution, paths)
+                properties.append(property_)
+                propertyValues.append(resolution.getClientObject())
+
+        for bean, (properties, propertyValues) in zip(beans, sent):
+            if len(properties) > 0:
+                setProperties(bean, properties, propertyValues)
+
+    def shouldSend(self, property_):
+        """Send a reference property if the enclosing type is a ValueProxy, if the
+        owner requested the property, or if the property is a list of values.
+        """
+        return (self._isOwnerValueProxy
+                or self._propertyRefs.matches(property_.name)
+                or (property_.elementType is not None
+                    and ValueCodex.canDecode(property_.elementType)))
 
 
 class Resolution(object):
     """Tracks the state of resolving a single client object."""
 
-    _EMPTY = TreeSet()
-
     def __init__(self, simpleValueOrKey, clientObject=None):
 
         # The client object.
@@ -115,8 +155,9 @@ class Resolution(object):
         # A one-shot flag for {@link #hasWork()} to ensure that simple properties
         # will be resolved, even when there's no requested property set.
         self._needsSimpleValues = None
-        self._toResolve = self._EMPTY
-        self._resolved = TreeSet()
+        # The PropertyPathNode of the paths waiting to be resolved
+        self._toResolve = None
+        self._resolved = frozenset()
         self._key = None
 
         if clientObject is None:
@@ -131,26 +172,21 @@ class Resolution(object):
             self._needsSimpleValues = True
 
 
-    def addPaths(self, prefix, requestedPaths):
-        """Removes the prefix from each requested path and enqueues paths that
-        have not been previously resolved for the next batch of work.
+    def addPaths(self, requestedPaths):
+        """Enqueues the paths of a {@link PropertyPathNode}, relative to this
+        object, that have not been previously resolved for the next batch of
+        work.
         """
         if self._clientObject is None:
             # No point trying to follow paths past a null value
             return
-        # Identity comparison intentional
-        if self._toResolve == self._EMPTY:
-            self._toResolve = TreeSet()
-        prefix = prefix if len(prefix) == 0 else prefix + '.'
-        prefixLength = len(prefix)
-        for path in requestedPaths:
-            if path.startswith(prefix):
-                self._toResolve.add(path[prefixLength:])
-            elif path.startswith('*.'):
-                self._toResolve.add(path[len('*.'):])
-        self._toResolve = self._toResolve.difference(self._resolved)
-        if len(self._toResolve) == 0:
-            self._toResolve = self._EMPTY
+        requestedPaths = requestedPaths.difference(self._resolved)
+        if self._toResolve is None:
+            self._toResolve = requestedPaths
+        else:
+            self._toResolve = self._toResolve.union(requestedPaths)
+        if self._toResolve.isEmpty():
+            self._toResolve = None
 
 
     def getClientObject(self):
@@ -162,21 +198,24 @@ class Resolution(object):
 
 
     def hasWork(self):
-        return self._needsSimpleValues or (not self._toResolve.isEmpty())
+        return self._needsSimpleValues or self._toResolve is not None
 
 
     def needsSimpleValues(self):
         return self._needsSimpleValues
 
 
-    def takeWork(self):
-        """Returns client-object-relative reference paths that should be further
-        resolved.
+    def takeWork(self, empty):
+        """Returns the {@link PropertyPathNode} of client-object-relative
+        reference paths that should be further resolved, or {@code empty} if
+        only the simple values are needed.
         """
         self._needsSimpleValues = False
         toReturn = self._toResolve
-        self._resolved.update(toReturn)
-        self._toResolve = self._EMPTY
+        if toReturn is None:
+            return empty
+        self._resolved = self._resolved | toReturn.getPaths()
+        self._toResolve = None
         return toReturn
 
 
@@ -189,8 +228,7 @@ class ResolutionKey(object):
     def __init__(self, domainObject, requestedType):
         self._domainObject = domainObject
         self._requestedType = requestedType
-        self._hashCode = ((System.identityHashCode(domainObject) * 13)
-                + (requestedType.hashCode() * 7))
+        self._hashCode = (id(domainObject) * 13) + (hash(requestedType) * 7)
 
 
     def __eq__(self, o):
@@ -198,9 +236,9 @@ class ResolutionKey(object):
             return False
         other = o
         # Object identity comparison intentional
-        if self._domainObject != other.domainObject:
+        if self._domainObject is not other._domainObject:
             return False
-        if not (self._requestedType == other.requestedType):
+        if not (self._requestedType == other._requestedType):
             return False
         return True
 
@@ -209,6 +247,10 @@ class ResolutionKey(object):
         return self._domainObject
 
 
+    def getRequestedType(self):
+        return self._requestedType
+
+
     def __hash__(self):
         return self._hashCode
 
@@ -245,7 +287,7 @@ class Resolver(object):
         # Also, remove list index suffixes. Not actually used, was in anticipation
         # of OGNL type schemes. That said, Editor will slip in such things.
         return (('*' in propertyRefs)
-                or (newPrefix.replaceAll('\\[\\d+\\]', '') in propertyRefs))
+                or (property_path_trie.snipIndexes(newPrefix) in propertyRefs))
 
 
     @classmethod
@@ -269,32 +311,36 @@ class Resolver(object):
         # IdentityHashMap, but still feels weird. We should try to find a way to
         # put immutable objects as keys in this map.
 
-        if refs is None:
-            return set()
-        toReturn = TreeSet()
-        for raw in refs:
-            idx = len(raw)
-            while idx >= 0:
-                toReturn.add(raw[:idx])
-                idx = raw.rfind('.', idx - 1)
-        return toReturn
+        return property_path_trie.expandPropertyRefs(refs)
 
 
     def __init__(self, state):
         """Should only be called from {@link RequestState}."""
 
-        self._clientObjectsToResolutions = IdentityHashMap()
+        # Maps id(clientObject) to the Resolution holding it
+        self._clientObjectsToResolutions = dict()
         # Maps domain values to client values. This map prevents cycles in the object
         # graph from causing infinite recursion.
         self._resolved = dict()
         # Contains Resolutions with path references that have not yet been resolved.
-        self._toProcess = OrderedSet()
-        self._syntheticId = None
+        # Resolutions are compared by identity, the values are unused.
+        self._toProcess = OrderedDict()
+        self._syntheticId = 0
+        # The empty PropertyPathNode of the trie being resolved
+        self._emptyPaths = None
 
         self._state = state
         self._service = state.getServiceLayer()
 
 
+    def getRequestState(self):
+        return self._state
+
+
+    def getServiceLayer(self):
+        return self._service
+
+
     def resolveClientValue(self, domainValue, clientTypeOrAssignableTo, propertyRefs=None):
         """Given a domain object, return a value that can be encoded by the client.
 
@@ -315,16 +361,16 @@ class Resolver(object):
                 return Resolution(None)
             anyType = clientType is None
             if anyType:
-                clientType = object()
+                clientType = object
             assignableTo = TypeUtils.ensureBaseType(clientType)
             key = ResolutionKey(domainValue, clientType)
-            previous = self._resolved[key]
+            previous = self._resolved.get(key)
 
             if (previous is not None
-                    and assignableTo.isInstance(previous.getClientObject())):
+                    and isinstance(previous.getClientObject(), assignableTo)):
                 return previous
 
-            returnClass = self._service.resolveClientType(domainValue.getClass(),
+            returnClass = self._service.resolveClientType(domainValue.__class__,
                     assignableTo, True)
             if anyType:
                 assignableTo = returnClass
@@ -334,42 +380,70 @@ class Resolver(object):
                 return self.makeResolution(domainValue)
 
             # Convert entities to EntityProxies or EntityProxyIds
-            isProxy = BaseProxy.isAssignableFrom(returnClass)
+            isProxy = issubclass(returnClass, BaseProxy)
             isId = issubclass(returnClass, EntityProxyId)
             if isProxy or isId:
-                proxyClass = returnClass.asSubclass(BaseProxy)
-                return self.resolveClientProxy(domainValue, proxyClass, key)
+                return self.resolveClientProxy(domainValue, returnClass, key)
             # Convert collections
-            if issubclass(returnClass, Collection):
+            if issubclass(returnClass, (list, set)):
                 if issubclass(returnClass, list):
                     accumulator = list()
                 elif issubclass(returnClass, set):
                     accumulator = set()
                 else:
-                    raise ReportableException('Unsupported collection type'
-                            + returnClass.getName())
-                elementType = TypeUtils.getSingleParameterization(Collection, clientType)
+                    raise ReportableException('Unsupported collection type '
+                            + returnClass.__name__)
+                if isinstance(clientType, CollectionType):
+                    elementType = clientType.getActualTypeArguments()[0]
+                else:
+                    elementType = None
                 for o in domainValue:
-                    accumulator.add(self.resolveClientValue(o, elementType).getClientObject())
+                    clientObject = self.resolveClientValue(o, elementType).getClientObject()
+                    if isinstance(accumulator, list):
+                        accumulator.append(clientObject)
+                    else:
+                        accumulator.add(clientObject)
                 return self.makeResolution(accumulator)
-            raise ReportableException('Unsupported domain type ' + returnClass.getCanonicalName())
+            raise ReportableException('Unsupported domain type ' + returnClass.__name__)
         else:
             assignableTo = clientTypeOrAssignableTo
             toReturn = self.resolveClientValue(domainValue, assignableTo)
             if toReturn is None:
                 return None
-            self.addPathsToResolution(toReturn, '',
-                    self.expandPropertyRefs(propertyRefs))
+            trie = property_path_trie.compilePropertyRefs(propertyRefs)
+            self._emptyPaths = trie.getEmpty()
+            self.addPathsToResolution(toReturn, trie.getRoot())
             while len(self._toProcess) > 0:
-                working = list(self._toProcess)
+                working = list(self._toProcess.keys())
                 self._toProcess.clear()
-                for resolution in working:
-                    if resolution.hasWork():
-                        bean = AutoBeanUtils.getAutoBean(resolution.getClientObject())
-                        bean.accept(self.PropertyResolver(resolution))
+                for group, resolutions in self.groupWork(working).items():
+                    domainType, requestedType, needsSimpleValues, work = group
+                    PropertyResolver(self, domainType, requestedType,
+                            needsSimpleValues, work).resolve(resolutions)
             return toReturn.getClientObject()
 
 
+    def groupWork(self, working):
+        """Takes the work of each Resolution that has any and groups the
+        Resolutions by domain type, requested type and remaining paths. Equal
+        path sets share a PropertyPathNode, so they group by identity.
+
+        @return an OrderedDict mapping (domain type, requested type, needs simple
+                values, PropertyPathNode) tuples to lists of Resolutions
+        """
+        groups = OrderedDict()
+        for resolution in working:
+            if not resolution.hasWork():
+                continue
+            key = resolution.getResolutionKey()
+            needsSimpleValues = resolution.needsSimpleValues()
+            work = resolution.takeWork(self._emptyPaths)
+            group = (key.getDomainObject().__class__, key.getRequestedType(),
+                    needsSimpleValues, work)
+            groups.setdefault(group, list()).append(resolution)
+        return groups
+
+
     def resolveDomainValue(self, maybeEntityProxy, detectDeadEntities):
         """Convert a client-side value into a domain value.
 
@@ -379,7 +453,7 @@ class Resolver(object):
                  if an EntityProxy cannot be resolved
         """
         if isinstance(maybeEntityProxy, BaseProxy):
-            bean = AutoBeanUtils.getAutoBean(maybeEntityProxy)
+            bean = getAutoBean(maybeEntityProxy)
             domain = bean.getTag(Constants.DOMAIN_OBJECT)
             if domain is None and detectDeadEntities:
                 raise ReportableException(DeadEntityException(
@@ -399,12 +473,12 @@ class Resolver(object):
         return maybeEntityProxy
 
 
-    def addPathsToResolution(self, resolution, prefix, propertyRefs):
-        """Calls {@link Resolution#addPaths(String, Collection)}, enqueuing
+    def addPathsToResolution(self, resolution, propertyRefs):
+        """Calls {@link Resolution#addPaths(PropertyPathNode)}, enqueuing
         {@code key} if {@link Resolution#hasWork()} returns {@code true}. This
         method will also expand paths on the members of Collections.
         """
-        if len(propertyRefs) == 0:
+        if propertyRefs.isEmpty():
             # No work to do
             return
 
@@ -413,19 +487,19 @@ class Resolver(object):
             assert isinstance(resolution.getClientObject(), BaseProxy), \
                     'Expecting BaseProxy, found ' \
                     + resolution.getClientObject().__class__.__name__
-            resolution.addPaths(prefix, propertyRefs)
+            resolution.addPaths(propertyRefs)
             if resolution.hasWork():
-                self._toProcess.add(resolution)
+                self._toProcess[resolution] = None
             return
 
-        if isinstance(resolution.getClientObject(), Collection):
+        if isinstance(resolution.getClientObject(), (list, set)):
             # Pass the paths onto the Resolutions for the contained elements
             collection = resolution.getClientObject()
             for obj in collection:
-                subResolution = self._clientObjectsToResolutions.get(obj)
+                subResolution = self._clientObjectsToResolutions.get(id(obj))
                 # subResolution will be null for List<Integer>, etc.
                 if subResolution is not None:
-                    self.addPathsToResolution(subResolution, prefix, propertyRefs)
+                    self.addPathsToResolution(subResolution, propertyRefs)
             return
 
         assert False, 'Should not add paths to client type ' \
@@ -439,17 +513,17 @@ class Resolver(object):
         """
         if clientObject is None:
             domainValue = domainValueOrKey
-            assert (not self._state.isEntityType(domainValue.getClass())
-                    and not self._state.isValueType(domainValue.getClass()),
-                    'Not a simple value type')
+            assert (not self._state.isEntityType(domainValue.__class__)
+                    and not self._state.isValueType(domainValue.__class__)), \
+                    'Not a simple value type'
             return Resolution(domainValue)
         else:
             key = domainValueOrKey
-            resolution = self._resolved[key]
+            resolution = self._resolved.get(key)
             if resolution is None:
                 resolution = Resolution(key, clientObject)
-                self._clientObjectsToResolutions[clientObject] = resolution
-                self._toProcess.add(resolution)
+                self._clientObjectsToResolutions[id(clientObject)] = resolution
+                self._toProcess[resolution] = None
                 self._resolved[key] = resolution
             return resolution
 
@@ -498,11 +572,15 @@ class Resolver(object):
             # The version of a value object is always null
             domainVersion = None
 
+        if isEntityProxy:
+            self._state.setDomainVersion(domainEntity, domainVersion)
+
         bean = self._state.getBeanForPayload(id_, domainEntity)
         bean.setTag(Constants.IN_RESPONSE, True)
         if domainVersion is not None:
             flatVersion = self._state.flatten(domainVersion)
-            bean.setTag(Constants.VERSION_PROPERTY_B64, toBase64(flatVersion.getPayload()))
+            bean.setTag(Constants.VERSION_PROPERTY_B64,
+                    self._state.toBase64(flatVersion.getPayload()))
 
         clientObject = bean.as_()
         return self.makeResolution(key, clientObject)
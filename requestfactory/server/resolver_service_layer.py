@@ -14,22 +14,67 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+from requestfactory.shared.request import Request
+from requestfactory.shared.base_proxy import BaseProxy
+from requestfactory.shared.instance_request import InstanceRequest
+from requestfactory.server.annotations import isIndependent
+from requestfactory.server.argument_decoders import compileArgumentDecoders
+from requestfactory.server.deobfuscator_index import DeobfuscatorIndex
+from requestfactory.server.deobfuscator_registry import DeobfuscatorRegistry
+from requestfactory.server.invocation_context import acceptsInvocationContext
+from requestfactory.server.resolved_operation import ResolvedOperation
 from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
+from requestfactory.server.warm_up_report import WarmUpReport
 
-from requestfactory.vm.impl.deobfuscator import Deobfuscator, Builder
+from autobean.vm.impl.type_utils import TypeUtils
+
+
+# The Deobfuscators of all the RequestFactory types seen by this process.
+REGISTRY = DeobfuscatorRegistry()
 
 
 class ResolverServiceLayer(ServiceLayerDecorator):
     """Implements all of the resolution methods in ServiceLayer."""
 
-    deobfuscator = None
+    registry = REGISTRY
 
     @classmethod
     def updateDeobfuscator(cls, clazz, resolveClassesWith):
-        builder = Builder.load(clazz, resolveClassesWith)
-        if cls.deobfuscator is None:
-            builder.merge(cls.deobfuscator)
-        cls.deobfuscator = builder.build()
+        """Loads the Deobfuscator for a RequestFactory type unless it has already
+        been loaded.
+
+        @return the Deobfuscator for the RequestFactory type
+        """
+        return cls.registry.load(clazz, resolveClassesWith)
+
+
+    @classmethod
+    def reloadDeobfuscator(cls, clazz, resolveClassesWith):
+        """Replaces the Deobfuscator for a RequestFactory type.
+
+        @see DeobfuscatorRegistry#reload(Class, ClassLoader)
+        """
+        cls.registry.reload(clazz, resolveClassesWith)
+
+
+    @classmethod
+    def loadDeobfuscatorIndex(cls, path):
+        """Memory-maps an index written by
+        {@link deobfuscator_index#writeIndex(String, Deobfuscator, String)} and
+        uses it as the Deobfuscator for its RequestFactory type, avoiding the
+        introspection done when the Deobfuscator is built.
+
+        @param path the index file
+        @return the loaded {@link DeobfuscatorIndex}
+        """
+        index = DeobfuscatorIndex(path)
+        cls.registry.register(index.getBinaryName(), index)
+        return index
+
+
+    @property
+    def deobfuscator(self):
+        return self.registry.getDeobfuscator()
 
 
     def resolveClass(self, typeToken):
@@ -105,9 +150,9 @@ class ResolverServiceLayer(ServiceLayerDecorator):
         ex = None
         try:
             return serviceImplementation.getMethod(requestContextMethod.getName(), domainArgs)
-        except SecurityException, e:
+        except SecurityException as e:
             ex = e
-        except NoSuchMethodException, e:
+        except NoSuchMethodException as e:
             ex = e
 
         return self.die(ex,
@@ -115,6 +160,36 @@ class ResolverServiceLayer(ServiceLayerDecorator):
                 serviceImplementation.getCanonicalName(), domainDescriptor, operation)
 
 
+    def resolveOperation(self, operation):
+        top = self.getTop()
+        contextMethod = top.resolveRequestContextMethod(operation)
+        if contextMethod is None:
+            return self.die(None, "Cannot resolve operation %s", operation)
+        domainMethod = top.resolveDomainMethod(operation)
+        if domainMethod is None:
+            return self.die(None, "Cannot resolve domain method %s", operation)
+        requestContext = top.resolveRequestContext(operation)
+
+        # Compute the argument types. If the domain method is not static, the
+        # instance object will be in the 0th position.
+        isStatic = Request.isAssignableFrom(contextMethod.getReturnType())
+        contextArgs = list(contextMethod.getParameterTypes())
+        genericArgs = list(contextMethod.getGenericParameterTypes())
+        if not isStatic:
+            instanceType = TypeUtils.getSingleParameterization(InstanceRequest,
+                    contextMethod.getGenericReturnType())
+            contextArgs.insert(0, TypeUtils.ensureBaseType(instanceType))
+            genericArgs.insert(0, instanceType)
+
+        return ResolvedOperation(operation, requestContext, contextMethod,
+                domainMethod, isStatic,
+                top.requiresServiceLocator(contextMethod, domainMethod),
+                top.getRequestReturnType(contextMethod), contextArgs, genericArgs,
+                compileArgumentDecoders(contextArgs, genericArgs),
+                isIndependent(domainMethod),
+                acceptsInvocationContext(domainMethod))
+
+
     def resolveRequestContext(self, operation):
         requestContextClass = self.deobfuscator.getRequestContext(operation)
         if requestContextClass is None:
@@ -129,7 +204,7 @@ class ResolverServiceLayer(ServiceLayerDecorator):
         params = self.getArgumentTypes(descriptor)
         try:
             return searchIn.getMethod(methodName, params)
-        except NoSuchMethodException, ex:
+        except NoSuchMethodException as ex:
             return self.report("Could not locate %s operation %s",
                     RequestContext.__class__.__name__, operation)
 
@@ -159,13 +234,41 @@ class ResolverServiceLayer(ServiceLayerDecorator):
         return OperationKey.hash(clazz.getName())
 
 
+    def warmUp(self, requestFactoryClass):
+        """Resolves, through the top of the ServiceLayer chain, every operation and
+        type token known to the deobfuscator of the given RequestFactory.
+        """
+        report = WarmUpReport(requestFactoryClass)
+        top = self.getTop()
+        deobfuscator = self.updateDeobfuscator(requestFactoryClass,
+                top.getDomainClassLoader())
+
+        for operation in deobfuscator.getOperations():
+            def resolveOperation(operation=operation):
+                top.resolveOperation(operation)
+            report.resolveOperation(operation, resolveOperation)
+
+        for typeToken in deobfuscator.getTypeTokens():
+            def resolveType(typeToken=typeToken):
+                proxyType = top.resolveClass(typeToken)
+                top.resolveTypeToken(proxyType)
+                domainClass = top.resolveDomainClass(proxyType)
+                # Looked up with BaseProxy when returning domain objects
+                top.resolveClientType(domainClass, BaseProxy, True)
+                top.resolveLocator(domainClass)
+            report.resolveType(typeToken, resolveType)
+
+        report.finish()
+        return report
+
+
     def forName(self, name):
         """Call {@link Class#forName(String)} and report any errors through
         {@link #die()}.
         """
         try:
             return Class.forName(name, False, self.getTop().getDomainClassLoader())
-        except ClassNotFoundException, e:
+        except ClassNotFoundException as e:
             return self.die(e, "Could not locate class %s", name)
 
 
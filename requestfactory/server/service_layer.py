@@ -14,17 +14,24 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
-from requestfactory.server.locator_service_layer import LocatorServiceLayer
-from requestfactory.server.service_layer_cache import ServiceLayerCache
-from requestfactory.server.find_service_layer import FindServiceLayer
-from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
-from requestfactory.server.resolver_service_layer import ResolverServiceLayer
-from requestfactory.server.reflective_service_layer import ReflectiveServiceLayer
+import inspect
 
 
 # Provides a flag to disable the ServiceLayerCache for debugging purposes.
 ENABLE_CACHE = True
 
+# When set, each layer created by ServiceLayer.create() dispatches the methods
+# it does not override straight to the next layer that does, instead of
+# passing through every intermediate ServiceLayerDecorator.
+FLATTEN_DISPATCH = False
+
+# The maximum number of entries the ServiceLayerCache retains for each cached
+# method, or None for an unbounded cache.
+CACHE_SIZE = 1000
+
+# Maps batched ServiceLayer methods to their single-object forms.
+BATCHED_METHODS = {'getVersions': 'getVersion', 'isLiveBatch': 'isLive'}
+
 
 class ServiceLayer(object):
     """The ServiceLayer mediates all interactions between the
@@ -47,9 +54,17 @@ class ServiceLayer(object):
                  service layer implementation
         @return a ServiceLayer instance
         """
+        # The layers extend ServiceLayer, so they are imported once it exists
+        from requestfactory.server.locator_service_layer import LocatorServiceLayer
+        from requestfactory.server.service_layer_cache import ServiceLayerCache
+        from requestfactory.server.find_service_layer import FindServiceLayer
+        from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
+        from requestfactory.server.resolver_service_layer import ResolverServiceLayer
+        from requestfactory.server.reflective_service_layer import ReflectiveServiceLayer
+
         layers = list()
         # Always hit the cache first
-        cache = ServiceLayerCache() if ENABLE_CACHE else ServiceLayerDecorator()
+        cache = ServiceLayerCache(CACHE_SIZE) if ENABLE_CACHE else ServiceLayerDecorator()
         layers.append(cache)
         # The the user-provided decorators
         if decorators is not None:
@@ -68,12 +83,55 @@ class ServiceLayer(object):
         i = len(layers) - 2
         while i >= 0:
             layer = layers[i]
-            layer.next = layers[i + 1]
+            layer._next = layers[i + 1]
             layer.top = cache
             i -= 1
+        if FLATTEN_DISPATCH:
+            cls.flatten(layers)
         return cache
 
 
+    @classmethod
+    def flatten(cls, layers):
+        """Binds each ServiceLayer method of every layer that does not override it
+        to the first layer further down the chain that does. Calls made through
+        {@code getTop()} then reach the implementing layer without a frame for
+        each pass-through decorator. The chain itself is unchanged, so
+        {@code getNext()} and {@code super()} calls behave as before.
+
+        @param layers the linked layers, starting with the top-most
+        """
+        for name in cls.getMethodNames():
+            target = None
+            single = BATCHED_METHODS.get(name)
+            for layer in reversed(layers):
+                # A layer overriding only the single-object form of a batched
+                # method keeps the batched method that calls it
+                if cls.overrides(layer, name) or (single is not None
+                        and cls.overrides(layer, single)):
+                    target = getattr(layer, name)
+                elif target is not None:
+                    setattr(layer, name, target)
+
+
+    @classmethod
+    def getMethodNames(cls):
+        """Returns the names of the methods that make up the ServiceLayer API."""
+        return [name for name, value in vars(ServiceLayer).items()
+                if inspect.isfunction(value) and not name.startswith('_')]
+
+
+    @classmethod
+    def overrides(cls, layer, name):
+        """Returns {@code true} if the layer's type provides its own implementation
+        of the named method instead of the ServiceLayerDecorator pass-through.
+        """
+        from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
+        method = getattr(layer.__class__, name)
+        return (getattr(method, '__func__', method)
+                is not ServiceLayerDecorator.__dict__[name])
+
+
     def __init__(self):
         """Not generally-extensible."""
         #: A pointer to the top-most ServiceLayer instance/
@@ -121,6 +179,20 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def getAccessorPlan(self, domainType):
+        """Returns the table of property accessors used to read and write the
+        properties of instances of the given domain type. The plan is built from
+        {@link #getGetter(Class, String)} and {@link #getSetter(Class, String)}
+        and is used by the request processor in place of
+        {@link #getProperty(Object, String)} and
+        {@link #setProperty(Object, String, Class, Object)}.
+
+        @param domainType a domain entity type
+        @return an {@link AccessorPlan} for the domain type
+        """
+        raise NotImplementedError
+
+
     def getDomainClassLoader(self):
         """Returns the ClassLoader that should be used when attempting to access
         domain classes or resources.
@@ -198,6 +270,19 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def getStaticMethod(self, domainType, prefix):
+        """Returns the optional static or class method of a domain type that is
+        named after a prefix and the type, or one of its supertypes, such as
+        {@code findAllFoo} or {@code prefetchFoo}. The lookup is made once for
+        each batch of objects, so it is cached by {@link ServiceLayerCache}.
+
+        @param domainType a domain entity type
+        @param prefix the prefix of the method name, e.g. {@code 'findAll'}
+        @return the method, or {@code null} if the type does not declare one
+        """
+        raise NotImplementedError
+
+
     def getVersion(self, domainObject):
         """May return {@code null} to indicate that the domain object has not been
         persisted. The value returned from this method must be a simple type (e.g.
@@ -211,6 +296,18 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def getVersions(self, domainObjects):
+        """Batched form of {@link #getVersion(Object)} used when constructing the
+        operations returned to the client. A decorator that overrides
+        {@link #getVersion(Object)} but not this method has
+        {@link #getVersion(Object)} called for each domain object.
+
+        @param domainObjects a list of domain objects
+        @return the versions of the domain objects, in the same order
+        """
+        raise NotImplementedError
+
+
     def invoke(self, domainMethod, *args):
         """Invoke a domain service method. The underlying eventually calls
         {@link Method#invoke(Object, Object...)}.
@@ -233,6 +330,19 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def isLiveBatch(self, domainObjects):
+        """Batched form of {@link #isLive(Object)}. The liveness of every persistent
+        entity referenced by a response is checked with a single call to this
+        method. A decorator that overrides {@link #isLive(Object)} but not this
+        method has {@link #isLive(Object)} called for each domain object.
+
+        @param domainObjects a list of domain entities
+        @return a list containing {@code true} for each domain object that could
+                be retrieved at a later point in time
+        """
+        raise NotImplementedError
+
+
     def loadDomainObject(self, clazz, domainId):
         """Load an object from the backing store. This method may return {@code null}
         to indicate that the requested object is no longer available.
@@ -261,6 +371,43 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def loadDomainObjectsOfType(self, clazz, domainIds):
+        """Load several objects of the same type from the backing store in a single
+        batch. {@link SimpleRequestProcessor} groups the ids referenced by a payload
+        by domain type and calls this method once per type.
+        <p>
+        The default implementation uses {@link Locator#findAll(Class, List)} or a
+        static {@code findAllFoo(List)} method on the domain type, and falls back
+        to {@link #loadDomainObject(Class, Object)} for each id.
+
+        @param clazz the type of objects to load
+        @param domainIds the ids previously returned from {@link #getId(Object)}
+        @return the requested objects in the same order as {@code domainIds},
+                elements of which may be {@code null} if the requested objects
+                were irretrievable
+        """
+        raise NotImplementedError
+
+
+    def prefetch(self, domainObjects, propertyPaths):
+        """Called once for each batch of domain objects of the same type that
+        the {@link Resolver} is about to read, before any of their getters are
+        called. Implementations may load the objects reachable through the
+        requested paths in bulk, to avoid one query per object per path when
+        the getters load relations lazily.
+        <p>
+        The default implementation calls {@link Locator#prefetch(List, List)} or
+        a static {@code prefetchFoo(List, List)} method on the domain type, if
+        there is one, and otherwise does nothing.
+
+        @param domainObjects a list of domain objects of the same type
+        @param propertyPaths the dotted property paths, relative to the
+                 objects, that the client requested and that have not yet been
+                 resolved; {@code '*'} matches any property
+        """
+        raise NotImplementedError
+
+
     def requiresServiceLocator(self, contextMethod, domainMethod):
         """Determines if the invocation of a domain method requires a
         {@link ServiceLocator} as the 0th parameter when passed into
@@ -334,6 +481,18 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def resolveOperation(self, operation):
+        """Resolve everything required to invoke an operation: the RequestContext,
+        its method declaration, the domain method, the return type and the
+        argument types. This method is called once per invocation in place of
+        the individual resolution methods.
+
+        @param operation the operation's name
+        @return a {@link ResolvedOperation}
+        """
+        raise NotImplementedError
+
+
     def resolveRequestContext(self, operation):
         """Find a RequestContext that should be used to fulfill the requested
         operation.
@@ -411,6 +570,19 @@ class ServiceLayer(object):
         raise NotImplementedError
 
 
+    def warmUp(self, requestFactoryClass):
+        """Eagerly resolves every operation and proxy type reachable from a
+        RequestFactory so that the {@link ServiceLayerCache} is populated before
+        the first request is served. Resolution errors are recorded in the
+        returned report instead of being thrown.
+
+        @param requestFactoryClass a RequestFactory interface
+        @return a {@link WarmUpReport} describing the time spent and any
+                resolution errors
+        """
+        raise NotImplementedError
+
+
     def validate(self, domainObject):
         """Invoke a JSR 303 validator on the given domain object. If no validator is
         available, this method is a no-op.
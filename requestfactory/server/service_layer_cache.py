@@ -14,158 +14,302 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import time
+import threading
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
 from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
 
 
-def getMethod(name):
-    return getattr(ServiceLayerCache, name)
+# The default maximum number of entries retained for each cached method.
+DEFAULT_MAX_SIZE = 1000
+
+
+class CacheStatistics(object):
+    """Usage counters for a single method cached by {@link ServiceLayerCache}."""
+
+    def __init__(self, method, hits=0, misses=0, evictions=0, computeTime=0.0):
+        self._method = method
+        self._hits = hits
+        self._misses = misses
+        self._evictions = evictions
+        self._computeTime = computeTime
+
+
+    def getMethod(self):
+        """Returns the name of the cached ServiceLayer method."""
+        return self._method
+
+
+    def getHits(self):
+        """Returns the number of calls answered from the cache, including calls
+        that waited for another thread to compute the value.
+        """
+        return self._hits
+
+
+    def getMisses(self):
+        """Returns the number of calls that computed a value."""
+        return self._misses
+
+
+    def getEvictions(self):
+        """Returns the number of entries discarded to respect the size bound."""
+        return self._evictions
+
+
+    def getComputeTime(self):
+        """Returns the total time, in seconds, spent computing values."""
+        return self._computeTime
+
+
+    def __str__(self):
+        return '%s: %d hits, %d misses, %d evictions, %.3fs' % (self._method,
+                self._hits, self._misses, self._evictions, self._computeTime)
+
+
+class _PendingValue(object):
+    """A value being computed by one thread that other threads may wait for."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._exception = None
+
+
+    def get(self):
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+
+    def set(self, value):
+        self._value = value
+        self._done.set()
+
+
+    def fail(self, exception):
+        self._exception = exception
+        self._done.set()
+
+
+class _MethodCache(object):
+    """A bounded, least-recently-used map of the values returned by one method."""
+
+    def __init__(self, method, maxSize):
+        self.method = method
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # Maps keys to the _PendingValue of a computation in progress
+        self.pending = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.computeTime = 0.0
 
 
 class ServiceLayerCache(ServiceLayerDecorator):
     """A cache for idempotent methods in {@link ServiceLayer}. The caching is
     separate from {@link ReflectiveServiceLayer} so that the cache can be applied
     to any decorators injected by the user.
+    <p>
+    Each instance owns its cache. The values of each method are kept in a
+    least-recently-used map holding at most {@code maxSize} entries, and each
+    value is computed by a single thread even when several threads request it
+    at the same time.
     """
 
-    methodCache = {}
-
-    createLocator = getMethod("createLocator")
-    createServiceInstance = getMethod("createServiceInstance")
-    getDomainClassLoader = getMethod("getDomainClassLoader")
-    getGetter = getMethod("getGetter")
-    getIdType = getMethod("getIdType");
-    getRequestReturnType = getMethod("getRequestReturnType")
-    getSetter = getMethod("getSetter")
-    requiresServiceLocator = getMethod("requiresServiceLocator")
-    resolveClass = getMethod("resolveClass")
-    resolveClientType = getMethod("resolveClientType")
-    resolveDomainClass = getMethod("resolveDomainClass")
-    resolveDomainMethod = getMethod("resolveDomainMethod")
-    resolveLocator = getMethod("resolveLocator")
-    resolveRequestContext = getMethod("resolveRequestContext")
-    resolveRequestContextMethod = getMethod("resolveRequestContextMethod")
-    resolveRequestFactory = getMethod("resolveRequestFactory")
-    resolveServiceClass = getMethod("resolveServiceClass")
-    resolveServiceLocator = getMethod("resolveServiceLocator")
-    resolveTypeToken = getMethod("resolveTypeToken")
-
-    def __init__(self):
-        self.methodMap = ServiceLayerCache.methodCache
+    # The ServiceLayer methods whose results are cached.
+    CACHED_METHODS = ('createLocator', 'createServiceInstance',
+            'getAccessorPlan', 'getDomainClassLoader', 'getGetter', 'getIdType',
+            'getRequestReturnType', 'getSetter', 'getStaticMethod',
+            'requiresServiceLocator',
+            'resolveClass', 'resolveClientType', 'resolveDomainClass',
+            'resolveDomainMethod', 'resolveLocator', 'resolveOperation',
+            'resolveRequestContext',
+            'resolveRequestContextMethod', 'resolveRequestFactory',
+            'resolveServiceClass', 'resolveServiceLocator', 'resolveTypeToken')
+
+    def __init__(self, maxSize=DEFAULT_MAX_SIZE):
+        """@param maxSize the maximum number of entries retained for each cached
+                 method, or {@code None} for an unbounded cache
+        """
+        super(ServiceLayerCache, self).__init__()
+        self._maxSize = maxSize
+        self._methodMap = dict()
+        for method in self.CACHED_METHODS:
+            self._methodMap[method] = _MethodCache(method, maxSize)
 
 
     def createLocator(self, clazz):
-        return getOrCache(createLocator, clazz, clazz, clazz)
+        return self.getOrCache('createLocator', clazz, clazz)
 
 
     def createServiceInstance(self, requestContext):
-        return getOrCache(createServiceInstance, requestContext, Object.__class__, requestContext)
+        return self.getOrCache('createServiceInstance', requestContext,
+                requestContext)
+
+
+    def getAccessorPlan(self, domainType):
+        return self.getOrCache('getAccessorPlan', domainType, domainType)
 
 
     def getDomainClassLoader(self):
-        return getOrCache(getDomainClassLoader, NULL_MARKER, ClassLoader.__class__)
+        return self.getOrCache('getDomainClassLoader', None)
 
 
-    def getGetter(self, domainType, property):
-        return getOrCache(getGetter, (domainType, property), Method.__class__,
-        domainType, property)
+    def getGetter(self, domainType, property_):
+        return self.getOrCache('getGetter', (domainType, property_), domainType,
+                property_)
 
 
     def getIdType(self, domainType):
-        return getOrCache(getIdType, domainType, Class.__class__, domainType)
+        return self.getOrCache('getIdType', domainType, domainType)
 
 
     def getRequestReturnType(self, contextMethod):
-        return getOrCache(getRequestReturnType, contextMethod, Type.__class__, contextMethod)
+        return self.getOrCache('getRequestReturnType', contextMethod,
+                contextMethod)
+
 
+    def getSetter(self, domainType, property_):
+        return self.getOrCache('getSetter', (domainType, property_), domainType,
+                property_)
 
-    def getSetter(self, domainType, property):
-        return getOrCache(getSetter, (domainType, property), Method.__class__,
-        domainType, property)
+
+    def getStaticMethod(self, domainType, prefix):
+        return self.getOrCache('getStaticMethod', (domainType, prefix),
+                domainType, prefix)
 
 
     def requiresServiceLocator(self, contextMethod, domainMethod):
-        return getOrCache(requiresServiceLocator,
-                (contextMethod, domainMethod), Boolean.__class__, contextMethod,
-                domainMethod)
+        return self.getOrCache('requiresServiceLocator',
+                (contextMethod, domainMethod), contextMethod, domainMethod)
 
 
     def resolveClass(self, typeToken):
-        found = getOrCache(resolveClass, typeToken, Class.__class__, typeToken)
-        return found.asSubclass(BaseProxy.__class__)
+        return self.getOrCache('resolveClass', typeToken, typeToken)
 
 
     def resolveClientType(self, domainClass, clientType, required):
-        clazz = getOrCache(resolveClientType, (domainClass, clientType),
-            Class.__class__, domainClass, clientType, required)
-        return None if clazz is None else clazz.asSubclass(clientType)
+        return self.getOrCache('resolveClientType',
+                (domainClass, clientType, required), domainClass, clientType,
+                required)
 
 
     def resolveDomainClass(self, clazz):
-        return getOrCache(resolveDomainClass, clazz, Class.__class__, clazz)
+        return self.getOrCache('resolveDomainClass', clazz, clazz)
 
 
     def resolveDomainMethod(self, operation):
-        return getOrCache(resolveDomainMethod, operation, Method.__class__, operation)
+        return self.getOrCache('resolveDomainMethod', operation, operation)
 
 
     def resolveLocator(self, domainType):
-        return getOrCache(resolveLocator, domainType, Class.__class__, domainType)
+        return self.getOrCache('resolveLocator', domainType, domainType)
+
+
+    def resolveOperation(self, operation):
+        return self.getOrCache('resolveOperation', operation, operation)
 
 
     def resolveRequestContext(self, operation):
-        clazz = getOrCache(resolveRequestContext, operation, Class.__class__, operation)
-        return clazz.asSubclass(RequestContext.__class__)
+        return self.getOrCache('resolveRequestContext', operation, operation)
 
 
     def resolveRequestContextMethod(self, operation):
-        return getOrCache(resolveRequestContextMethod, operation, Method.__class__, operation)
+        return self.getOrCache('resolveRequestContextMethod', operation,
+                operation)
 
 
-    def resolveRequestFactory(binaryName):
-        clazz = getOrCache(resolveRequestFactory, binaryName, Class.__class__, binaryName)
-        return clazz.asSubclass(RequestFactory.__class__)
+    def resolveRequestFactory(self, binaryName):
+        return self.getOrCache('resolveRequestFactory', binaryName, binaryName)
 
 
     def resolveServiceClass(self, requestContextClass):
-        return getOrCache(resolveServiceClass, requestContextClass, Class.__class__, requestContextClass)
+        return self.getOrCache('resolveServiceClass', requestContextClass,
+                requestContextClass)
 
 
     def resolveServiceLocator(self, requestContext):
-        clazz = getOrCache(resolveServiceLocator, requestContext, Class.__class__, requestContext)
-        return None if clazz is None else clazz.asSubclass(ServiceLocator.__class__)
+        return self.getOrCache('resolveServiceLocator', requestContext,
+                requestContext)
 
 
     def resolveTypeToken(self, domainClass):
-        return getOrCache(resolveTypeToken, domainClass, String.__class__, domainClass)
-
-
-    def getOrCache(self, method, key, valueType, *args):
-        map = methodMap.get(method)
-        if map is None:
-            map = {}
-            methodMap[method] = map
-
-        raw = map.get(key)
-        if raw is None:
-            return None
-
-        toReturn = valueType.cast(raw)
-        if toReturn is None:
-            ex = None
-            try:
-                toReturn = valueType.cast(method(getNext(), args))
-                map[key] = toReturn
-            except InvocationTargetException, e:
-                # The next layer threw an exception
-                cause = e.getCause()
-                if isinstance(cause, RuntimeException):
-                    # Re-throw RuntimeExceptions, which likely originate from die()
-                    raise cause
-                die(cause, "Unexpected checked exception")
-            except IllegalArgumentException e:
-                ex = e
-            except IllegalAccessException, e:
-                ex = e
-            if ex != None:
-                die(ex, "Bad method invocation")
+        return self.getOrCache('resolveTypeToken', domainClass, domainClass)
+
+
+    def clear(self):
+        """Discards all cached values. The statistics are retained."""
+        for cache in self._methodMap.values():
+            with cache.lock:
+                cache.entries.clear()
+
+
+    def getStatistics(self):
+        """Returns a snapshot of the usage of the cache.
+
+        @return a dict mapping the name of each cached method to its
+                {@link CacheStatistics}
+        """
+        toReturn = dict()
+        for method, cache in self._methodMap.items():
+            with cache.lock:
+                toReturn[method] = CacheStatistics(method, cache.hits,
+                        cache.misses, cache.evictions, cache.computeTime)
+        return toReturn
+
+
+    def getOrCache(self, method, key, *args):
+        """Returns the cached value of a method for the given key, calling the
+        method on the next layer to compute it if necessary.
+        """
+        cache = self._methodMap[method]
+        owner = False
+        with cache.lock:
+            if key in cache.entries:
+                # Move the entry to the most-recently-used position
+                toReturn = cache.entries.pop(key)
+                cache.entries[key] = toReturn
+                cache.hits += 1
+                return toReturn
+            pending = cache.pending.get(key)
+            if pending is not None:
+                # Another thread is computing the value
+                cache.hits += 1
+            else:
+                pending = _PendingValue()
+                cache.pending[key] = pending
+                cache.misses += 1
+                owner = True
+        if not owner:
+            return pending.get()
+
+        start = time.time()
+        try:
+            toReturn = getattr(self.getNext(), method)(*args)
+        except Exception as e:
+            # The next layer threw an exception, likely from die() or report()
+            with cache.lock:
+                del cache.pending[key]
+            pending.fail(e)
+            raise
+        elapsed = time.time() - start
+
+        with cache.lock:
+            del cache.pending[key]
+            cache.entries[key] = toReturn
+            cache.computeTime += elapsed
+            if cache.maxSize is not None:
+                while len(cache.entries) > cache.maxSize:
+                    cache.entries.popitem(last=False)
+                    cache.evictions += 1
+        pending.set(toReturn)
         return toReturn
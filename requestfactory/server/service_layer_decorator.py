@@ -17,7 +17,7 @@
 import logging
 
 from requestfactory.server.exceptions import UnexpectedException, ReportableException
-from requestfactory.server.service_layer import ServiceLayer
+from requestfactory.server.service_layer import ServiceLayer, BATCHED_METHODS
 
 
 LOGGER = logging.getLogger(ServiceLayer.__class__.__name__)
@@ -47,6 +47,9 @@ class ServiceLayerDecorator(ServiceLayer):
     def createServiceLocator(self, clazz):
         return self.getNext().createServiceLocator(clazz)
 
+    def getAccessorPlan(self, domainType):
+        return self.getNext().getAccessorPlan(domainType)
+
     def getDomainClassLoader(self):
         return self.getNext().getDomainClassLoader()
 
@@ -68,21 +71,40 @@ class ServiceLayerDecorator(ServiceLayer):
     def getSetter(self, domainType, property_):
         return self.getNext().getSetter(domainType, property_)
 
+    def getStaticMethod(self, domainType, prefix):
+        return self.getNext().getStaticMethod(domainType, prefix)
+
     def getVersion(self, domainObject):
         return self.getNext().getVersion(domainObject)
 
+    def getVersions(self, domainObjects):
+        if self.overridesSingle('getVersions'):
+            return [self.getTop().getVersion(o) for o in domainObjects]
+        return self.getNext().getVersions(domainObjects)
+
     def invoke(self, domainMethod, *args):
-        return self.getNext().invoke(domainMethod, args)
+        return self.getNext().invoke(domainMethod, *args)
 
     def isLive(self, domainObject):
         return self.getNext().isLive(domainObject)
 
+    def isLiveBatch(self, domainObjects):
+        if self.overridesSingle('isLiveBatch'):
+            return [self.getTop().isLive(o) for o in domainObjects]
+        return self.getNext().isLiveBatch(domainObjects)
+
     def loadDomainObject(self, clazz, domainId):
         return self.getNext().loadDomainObject(clazz, domainId)
 
     def loadDomainObjects(self, classes, domainIds):
         return self.getNext().loadDomainObjects(classes, domainIds)
 
+    def loadDomainObjectsOfType(self, clazz, domainIds):
+        return self.getNext().loadDomainObjectsOfType(clazz, domainIds)
+
+    def prefetch(self, domainObjects, propertyPaths):
+        return self.getNext().prefetch(domainObjects, propertyPaths)
+
     def requiresServiceLocator(self, contextMethod, domainMethod):
         return self.getNext().requiresServiceLocator(contextMethod, domainMethod)
 
@@ -101,6 +123,9 @@ class ServiceLayerDecorator(ServiceLayer):
     def resolveLocator(self, domainType):
         return self.getNext().resolveLocator(domainType)
 
+    def resolveOperation(self, operation):
+        return self.getNext().resolveOperation(operation)
+
     def resolveRequestContext(self, operation):
         return self.getNext().resolveRequestContext(operation)
 
@@ -125,6 +150,9 @@ class ServiceLayerDecorator(ServiceLayer):
     def validate(self, domainObject):
         return self.getNext().validate(domainObject)
 
+    def warmUp(self, requestFactoryClass):
+        return self.getNext().warmUp(requestFactoryClass)
+
     def die(self, e, message, *args):
         """Throw a fatal error up into the top-level processing code. This method
         should be used to provide diagnostic information that will help the
@@ -174,6 +202,16 @@ class ServiceLayerDecorator(ServiceLayer):
             raise ReportableException(msgOrUserGeneratedException % args)
 
 
+    def overridesSingle(self, batchName):
+        """Returns {@code true} if this decorator overrides the single-object
+        form of a batched ServiceLayer method but not the batched method itself.
+        The default batched method then calls the single-object method through
+        {@code getTop()} for each object, so that the override is not bypassed.
+        """
+        return (ServiceLayer.overrides(self, BATCHED_METHODS[batchName])
+                and not ServiceLayer.overrides(self, batchName))
+
+
     def getNext(self):
         """Retrieves the next service layer. Used only by the server-package code and
         accessed by used code via {@code super.doSomething()}.
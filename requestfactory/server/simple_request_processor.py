@@ -14,14 +14,22 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+from functools import partial
+
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
 
 from requestfactory.server.exceptions import UnexpectedException, ReportableException
-from requestfactory.server.request_state import RequestState
 from requestfactory.server.default_exception_handler import DefaultExceptionHandler
+from requestfactory.server import base64_utils
+from requestfactory.server.argument_decoders import compileArgumentDecoders
+from requestfactory.server.coroutines import isAwaitable, resolveAll
+from requestfactory.server.proxy_bean import getAllProperties
+from requestfactory.server.json_codec import toUtf8
+from requestfactory.server.invocation_context import InvocationContext, \
+    setCurrentInvocation, INVOCATION_CONTEXT_PARAMETER, POSITIONAL, KEYWORD
 
 from requestfactory.shared.messages.message_factory import MessageFactory
 from requestfactory.shared.entity_proxy_id import EntityProxyId
@@ -41,12 +49,9 @@ from autobean.shared.value_codex import ValueCodex
 from autobean.vm.impl.type_utils import TypeUtils
 from autobean.shared.auto_bean_visitor import AutoBeanVisitor, CollectionPropertyContext
 from autobean.vm.auto_bean_factory_source import AutoBeanFactorySource
-from autobean.shared.auto_bean_utils import AutoBeanUtils
 from autobean.shared.auto_bean_codex import AutoBeanCodex
 from autobean.vm.configuration import Configuration
 
-from com.google.gwt.user.server.base64_utils import Base64Utils
-
 
 # Vends message objects.
 FACTORY = AutoBeanFactorySource.create(MessageFactory)
@@ -62,27 +67,39 @@ class SimpleRequestProcessor(object):
     CONFIGURATION = Configuration.Builder().setCategories(EntityProxyCategory,
         ValueProxyCategory, BaseProxyCategory).setNoWrap(EntityProxyId).build()
 
-    def __init__(self, serviceLayer):
+    def __init__(self, serviceLayer, executor=None):
+        """@param serviceLayer the ServiceLayer that interacts with domain objects
+        @param executor an optional {@code concurrent.futures} executor in which
+                 the domain methods of independent invocations are run in
+                 parallel
+        """
         self._service = serviceLayer
         self._exceptionHandler = DefaultExceptionHandler()
+        self._executor = executor
+        self._jsonCodec = None
 
 
     def processPayload(self, payload):
         """Process a payload sent by a RequestFactory client.
 
-        @param payload the payload sent by the client
-        @return a payload to return to the client
+        @param payload the payload sent by the client, as text or as UTF-8
+                 bytes
+        @return the UTF-8 bytes of the payload to return to the client
         """
+        if self._jsonCodec is not None:
+            payload = self._jsonCodec.decode(payload)
         req = AutoBeanCodex.decode(FACTORY, RequestMessage, payload).as_()
         responseBean = FACTORY.response()
         # Create a new response envelope, since the state is unknown
         # Return a JSON-formatted payload
         try:
             self.process(req, responseBean.as_())
-        except ReportableException, e:
+        except ReportableException as e:
             responseBean = FACTORY.response()
             responseBean.as_().setGeneralFailure(self.createFailureMessage(e).as_())
-        return AutoBeanCodex.encode(responseBean).getPayload()
+        if self._jsonCodec is not None:
+            return self._jsonCodec.encode(AutoBeanCodex.encode(responseBean))
+        return toUtf8(AutoBeanCodex.encode(responseBean).getPayload())
 
 
     def process(self, req, resp):
@@ -133,6 +150,26 @@ class SimpleRequestProcessor(object):
         self._exceptionHandler = exceptionHandler
 
 
+    def setJsonCodec(self, jsonCodec):
+        """Sets the {@link JsonCodec} that parses request payloads and serializes
+        response payloads, or {@code None} to let AutoBeanCodex parse and
+        serialize them itself. The property maps and arguments of a request are
+        read from the tree parsed by the codec.
+        """
+        self._jsonCodec = jsonCodec
+
+
+    def setExecutor(self, executor):
+        """Sets the {@code concurrent.futures} executor in which the domain
+        methods of consecutive independent invocations are run in parallel, or
+        {@code None} to run them in the calling thread. Only
+        {@link ServiceLayer#invoke(Method, Object...)} is called from the
+        executor's threads; the RequestState and Resolver are only used by the
+        calling thread.
+        """
+        self._executor = executor
+
+
     def createOobMessage(self, domainValues):
         """Encode a list of objects into a self-contained message that can be used for
         out-of-band communication.
@@ -148,7 +185,8 @@ class SimpleRequestProcessor(object):
                         domainValue.__class__, BaseProxy, True)
                 clientValue = state.getResolver().resolveClientValue(
                         domainValue, clientType, set())
-            encodedValues.append(EntityCodex.encode(state, clientValue))
+            encodedValues.append(EntityCodex.encode(state,
+                    state.toEncodable(clientValue)))
 
         map_ = IdToEntityMap()
         map_.update(state.beans)
@@ -189,17 +227,34 @@ class SimpleRequestProcessor(object):
 
 
     def createReturnOperations(self, operations, returnState, toProcess):
-        for id_, bean in toProcess.iteritems():
+        persistent = list()
+        for id_, bean in toProcess.items():
             domainObject = bean.getTag(Constants.DOMAIN_OBJECT)
             if id_.isEphemeral() and returnState.isEntityType(id_.getProxyClass()):
                 # See if the entity has been persisted in the meantime
                 returnState.getResolver().resolveClientValue(domainObject,
                         id_.getProxyClass(), set())
-
+            if not (id_.isEphemeral() or id_.isSynthetic()) and domainObject is not None:
+                persistent.append(domainObject)
+
+        # Check liveness and retrieve versions for all persistent objects at once
+        live = dict()
+        if len(persistent) > 0:
+            for domainObject, isLive in zip(persistent,
+                    self._service.isLiveBatch(persistent)):
+                live[id(domainObject)] = isLive
+        liveObjects = [o for o in persistent if live[id(o)]]
+        versions = dict()
+        for domainObject, domainVersion in zip(liveObjects,
+                returnState.getDomainVersions(liveObjects)):
+            versions[id(domainObject)] = domainVersion
+
+        for id_, bean in toProcess.items():
+            domainObject = bean.getTag(Constants.DOMAIN_OBJECT)
             if (id_.isEphemeral() or id_.isSynthetic()) or (domainObject is None):
                 # If the object isn't persistent, there's no reason to send an update
                 writeOperation = None
-            elif not self._service.isLive(domainObject):
+            elif not live[id(domainObject)]:
                 writeOperation = WriteOperation.DELETE
             elif id_.wasEphemeral():
                 writeOperation = WriteOperation.PERSIST
@@ -211,7 +266,7 @@ class SimpleRequestProcessor(object):
                     or (writeOperation == WriteOperation.UPDATE)):
                 # If we're sending an operation, the domain object must be persistent.
                 # This means that it must also have a non-null version.
-                domainVersion = self._service.getVersion(domainObject)
+                domainVersion = versions[id(domainObject)]
                 if domainVersion is None:
                     raise UnexpectedException('The persisted entity with id '
                             + self._service.getId(domainObject)
@@ -242,16 +297,17 @@ class SimpleRequestProcessor(object):
             if inResponse:
                 propertyMap = OrderedDict()
                 # Add all non-null properties to the serialized form
-                diff = AutoBeanUtils.getAllProperties(bean)
-                for d in diff.iteritems():
+                diff = getAllProperties(bean)
+                for d in diff.items():
                     value = d[1]
                     if value is not None:
-                        propertyMap[d[0]] = EntityCodex.encode(returnState, value)
+                        propertyMap[d[0]] = EntityCodex.encode(returnState,
+                                returnState.toEncodable(value))
                 op.setPropertyMap(propertyMap)
 
             if not id_.isEphemeral() and not id_.isSynthetic():
                 # Send the server address only for persistent objects
-                op.setServerId(toBase64(id_.getServerId()))
+                op.setServerId(returnState.toBase64(id_.getServerId()))
 
             if id_.isSynthetic():
                 op.setStrength(Strength.SYNTHETIC)
@@ -262,55 +318,37 @@ class SimpleRequestProcessor(object):
             op.setTypeToken(self._service.resolveTypeToken(id_.getProxyClass()))
 
             if version is not None:
-                op.setVersion(toBase64(version.getPayload()))
+                op.setVersion(returnState.toBase64(version.getPayload()))
 
-            operations.add(op)
+            operations.append(op)
 
 
-    def decodeInvocationArguments_(self, source, invocation, contextMethod):
+    def decodeInvocationArguments_(self, source, invocation, resolved):
         """Decode the arguments to pass into the domain method. If the domain method
         is not static, the instance object will be in the 0th position.
         """
-        isStatic = Request.isAssignableFrom(contextMethod.getReturnType())
-        baseLength = contextMethod.getParameterTypes().length
-        length = baseLength + (0 if isStatic else 1)
-        offset = 0 if isStatic else 1
-        contextArgs = [None] * length
-        genericArgs = [None] * length
-
-        if not isStatic:
-            genericArgs[0] = TypeUtils.getSingleParameterization(InstanceRequest, contextMethod.getGenericReturnType())
-            contextArgs[0] = TypeUtils.ensureBaseType(genericArgs[0])
-
-        System.arraycopy(contextMethod.getParameterTypes(), 0, contextArgs, offset, baseLength)
-        System.arraycopy(contextMethod.getGenericParameterTypes(), 0, genericArgs, offset, baseLength)
-
-        args = self.decodeInvocationArguments(source, invocation.getParameters(), contextArgs, genericArgs)
-        return args
+        return self.decodeArguments(source, invocation.getParameters(),
+                resolved.getArgumentDecoders())
 
 
     def decodeInvocationArguments(self, source, parameters, contextArgs,
             genericArgs):
         """Handles instance invocations as the instance at the 0th parameter.
         """
+        return self.decodeArguments(source, parameters,
+                compileArgumentDecoders(contextArgs, genericArgs))
+
+
+    def decodeArguments(self, source, parameters, decoders):
+        """Applies the precompiled argument decoders to the invocation
+        parameters.
+        """
         if parameters is None:
             # Can't return Collections.emptyList() because this must be mutable
             return list()
 
-        assert len(parameters) == contextArgs.length
-        args = list()
-        for i in range(contextArgs.length):
-            type_ = contextArgs[i]
-            elementType = None
-            if Collection.isAssignableFrom(type_):
-                elementType = TypeUtils.ensureBaseType(TypeUtils.getSingleParameterization(Collection, genericArgs[i]))
-                split = parameters.get(i)
-            else:
-                split = parameters.get(i)
-            arg = EntityCodex.decode(source, type_, elementType, split)
-            arg = source.getResolver().resolveDomainValue(arg, not (EntityProxyId == contextArgs[i]))
-            args.add(arg)
-        return args
+        assert len(parameters) == len(decoders)
+        return [decode(source, split) for decode, split in zip(decoders, parameters)]
 
 
     def processInvocationMessages(self, state, req, results, successes, returnState):
@@ -318,61 +356,137 @@ class SimpleRequestProcessor(object):
         if invocations is None:
             # No method invocations which can happen via RequestContext.fire()
             return
-        contextMethods = list()
-        invocationResults = list()
-        allPropertyRefs = dict()
-        for invocation in invocations:
+        resolvedOperations = [None] * len(invocations)
+        invocationResults = [None] * len(invocations)
+        oks = [False] * len(invocations)
+        # Independent invocations waiting to be run together
+        batch = list()
+        for i, invocation in enumerate(invocations):
             # Find the Method
             try:
-                operation = invocation.getOperation()
-                contextMethod = self._service.resolveRequestContextMethod(operation)
-                if contextMethod is None:
-                    raise UnexpectedException('Cannot resolve operation '
-                            + invocation.getOperation(), None)
-                contextMethods.append(contextMethod)
-                domainMethod = self._service.resolveDomainMethod(operation)
-                if domainMethod is None:
-                    raise UnexpectedException('Cannot resolve domain method '
-                            + invocation.getOperation(), None)
+                resolved = self._service.resolveOperation(invocation.getOperation())
+                resolvedOperations[i] = resolved
                 # Compute the arguments
-                args = self.decodeInvocationArguments_(state, invocation, contextMethod)
+                args = self.decodeInvocationArguments_(state, invocation, resolved)
                 # Possibly use a ServiceLocator
-                if self._service.requiresServiceLocator(contextMethod, domainMethod):
-                    requestContext = self._service.resolveRequestContext(operation)
-                    serviceInstance = self._service.createServiceInstance(requestContext)
-                    args.add(0, serviceInstance)
-                # Invoke it
-                domainReturnValue = self._service.invoke(domainMethod, list(args))
-                if invocation.getPropertyRefs() is not None:
-                    paths = allPropertyRefs[domainReturnValue]
-                    if paths is None:
-                        paths = set()#TreeSet()
-                        allPropertyRefs[domainReturnValue] = paths
-                    paths.update(invocation.getPropertyRefs())
-                ok = True
-            except ReportableException, e:
-                domainReturnValue = AutoBeanCodex.encode(self.createFailureMessage(e))
-                ok = False
-            invocationResults.append(domainReturnValue)
-            successes.append(ok)
-        contextMethodIt = contextMethods
-        objects = invocationResults
-        for i, success in enumerate(successes):
-            assert len(contextMethodIt) > i
-            assert len(objects) > i
-            contextMethod = contextMethodIt[i]
-            returnValue = objects[i]
+                if resolved.requiresServiceLocator():
+                    serviceInstance = self._service.createServiceInstance(
+                            resolved.getRequestContext())
+                    args.insert(0, serviceInstance)
+                # Expose the requested property paths to the domain method
+                context = InvocationContext(invocation.getOperation(),
+                        invocation.getPropertyRefs())
+                if resolved.acceptsInvocationContext() == POSITIONAL:
+                    args.append(context)
+            except ReportableException as e:
+                invocationResults[i] = AutoBeanCodex.encode(
+                        self.createFailureMessage(e))
+                continue
+            if resolved.isIndependent():
+                batch.append((i, resolved, args, context))
+                continue
+            # Run earlier independent invocations before this one can observe
+            # their absence
+            self.invokeBatch(batch, invocationResults, oks)
+            batch = list()
+            self.invokeBatch([(i, resolved, args, context)], invocationResults,
+                    oks)
+        self.invokeBatch(batch, invocationResults, oks)
+
+        allPropertyRefs = dict()
+        for i, invocation in enumerate(invocations):
+            if oks[i] and invocation.getPropertyRefs() is not None:
+                paths = allPropertyRefs.setdefault(id(invocationResults[i]),
+                        set())
+                paths.update(invocation.getPropertyRefs())
+
+        successes.extend(oks)
+        for i, success in enumerate(oks):
+            returnValue = invocationResults[i]
             if success:
                 # Convert domain object to client object
-                requestReturnType = self._service.getRequestReturnType(contextMethod)
+                requestReturnType = resolvedOperations[i].getReturnType()
                 returnValue = state.getResolver().resolveClientValue(returnValue,
-                        requestReturnType, allPropertyRefs[returnValue])
+                        requestReturnType, allPropertyRefs.get(id(returnValue),
+                        set()))
                 # Convert the client object to a string
-                results.append(EntityCodex.encode(returnState, returnValue))
+                results.append(EntityCodex.encode(returnState,
+                        returnState.toEncodable(returnValue)))
             else:
                 results.append(returnValue)
 
 
+    def invokeBatch(self, batch, invocationResults, oks):
+        """Invokes the domain methods of a batch of invocations. If an executor
+        has been set, the methods of a batch of several invocations are run in
+        parallel in it. The coroutines returned by {@code async def} methods are
+        awaited concurrently.
+
+        @param batch a list of (index, ResolvedOperation, arguments,
+                 InvocationContext) tuples
+        @param invocationResults receives the domain return value, or the encoded
+                 failure message, of each invocation at its index
+        @param oks receives the success of each invocation at its index
+        """
+        futures = dict()
+        if self._executor is not None and len(batch) > 1:
+            for i, resolved, args, context in batch:
+                futures[i] = self._executor.submit(self.invokeInContext,
+                        resolved, args, context)
+            # Let every invocation finish before any failure is raised
+            for future in futures.values():
+                future.exception()
+
+        pending = list()
+        for i, resolved, args, context in batch:
+            try:
+                if i in futures:
+                    invocationResults[i] = futures[i].result()
+                else:
+                    invocationResults[i] = self.invokeInContext(resolved, args,
+                            context)
+                # An invocation only succeeds once its coroutine has returned
+                if isAwaitable(invocationResults[i]):
+                    pending.append(i)
+                else:
+                    oks[i] = True
+            except ReportableException as e:
+                invocationResults[i] = AutoBeanCodex.encode(
+                        self.createFailureMessage(e))
+        if not pending:
+            return
+
+        awaited = resolveAll([invocationResults[i] for i in pending])
+        domainMethods = dict((i, resolved.getDomainMethod())
+                for i, resolved, _, _ in batch)
+        for i, result in zip(pending, awaited):
+            if isinstance(result, ReportableException):
+                invocationResults[i] = AutoBeanCodex.encode(
+                        self.createFailureMessage(result))
+            elif isinstance(result, BaseException):
+                self._service.die(result, "Could not invoke method %s",
+                        domainMethods[i].__name__)
+            else:
+                invocationResults[i] = result
+                oks[i] = True
+
+
+    def invokeInContext(self, resolved, args, context):
+        """Invokes a domain method with the InvocationContext of its invocation
+        set for the current thread.
+        """
+        domainMethod = resolved.getDomainMethod()
+        if resolved.acceptsInvocationContext() == KEYWORD:
+            # A keyword-only parameter can't be passed through the argument list
+            domainMethod = partial(domainMethod,
+                    **{INVOCATION_CONTEXT_PARAMETER: context})
+        previous = setCurrentInvocation(context)
+        try:
+            return self._service.invoke(domainMethod, list(args))
+        finally:
+            setCurrentInvocation(previous)
+
+
     def processOperationMessages(self, state, req):
         operations = req.getOperations()
         if operations is None:
@@ -381,9 +495,7 @@ class SimpleRequestProcessor(object):
         beans = state.getBeansForPayload(operations)
         assert len(operations) == len(beans)
 
-        itOp = operations
-        for bean in beans:
-            operation = itOp.next()
+        for bean, operation in zip(beans, operations):
             # Save the client's version information to reduce payload size later
             bean.setTag(Constants.VERSION_PROPERTY_B64, operation.getVersion())
 
@@ -400,7 +512,7 @@ class SimpleRequestProcessor(object):
     def validateEntities(self, source):
         """Validate all of the entities referenced in a RequestState."""
         errorMessages = list()
-        for id_, bean in source.beans.iteritems():
+        for id_, bean in source.beans.items():
             domainObject = bean.getTag(Constants.DOMAIN_OBJECT)
             # The object could have been deleted
             if domainObject is not None:
@@ -414,7 +526,7 @@ class SimpleRequestProcessor(object):
                         if id_.isEphemeral():
                             rootId.setStrength(Strength.EPHEMERAL)
                         else:
-                            rootId.setServerId(toBase64(id_.getServerId()))
+                            rootId.setServerId(source.toBase64(id_.getServerId()))
                         # If possible, also include the id of the leaf bean
                         leafId = None
                         if error.getLeafBean() is not None:
@@ -426,7 +538,8 @@ class SimpleRequestProcessor(object):
                                 if stableId.isEphemeral():
                                     leafId.setStrength(Strength.EPHEMERAL)
                                 else:
-                                    leafId.setServerId(toBase64(stableId.getServerId()))
+                                    leafId.setServerId(source.toBase64(
+                                            stableId.getServerId()))
                         message = FACTORY.violation().as_()
                         message.setLeafBeanId(leafId)
                         message.setMessage(error.getMessage())
@@ -439,15 +552,15 @@ class SimpleRequestProcessor(object):
 
 def fromBase64(encoded):
     try:
-        return str(Base64Utils.fromBase64(encoded)).encode('UTF-8')
-    except Exception, e:
+        return base64_utils.fromBase64(encoded)
+    except Exception as e:
         raise UnexpectedException(e)
 
 
 def toBase64(data):
     try:
-        return Base64Utils.toBase64(data.getBytes('UTF-8'))
-    except Exception, e:
+        return base64_utils.toBase64(data)
+    except Exception as e:
         raise UnexpectedException(e)
 
 
@@ -473,6 +586,7 @@ class _AutoBeanVisitor(AutoBeanVisitor):
         self._state = state
         self._domain = domain
         self._flatValueMap = flatValueMap
+        self._plan = procesor._service.getAccessorPlan(domain.__class__)
 
 
     def visitReferenceProperty(self, propertyName, value, ctx):
@@ -482,8 +596,8 @@ class _AutoBeanVisitor(AutoBeanVisitor):
             newValue = EntityCodex.decode(self._state, ctx.getType(),
                     elementType, self._flatValueMap[propertyName])
             resolved = self._state.getResolver().resolveDomainValue(newValue, False)
-            self._procesor._service.setProperty(self._domain, propertyName,
-                    self._procesor._service.resolveDomainClass(ctx.getType()), resolved)
+            self._plan.setProperty(self._domain, propertyName,
+                    ctx.getType(), resolved)
         return False
 
 
@@ -492,6 +606,10 @@ class _AutoBeanVisitor(AutoBeanVisitor):
             split = self._flatValueMap[propertyName]
             newValue = ValueCodex.decode(ctx.getType(), split)
             resolved = self._state.getResolver().resolveDomainValue(newValue, False)
-            self._procesor._service.setProperty(self._domain, propertyName,
+            self._plan.setProperty(self._domain, propertyName,
                     ctx.getType(), resolved)
         return False
+
+
+# Imported last, as RequestState imports this module
+from requestfactory.server.request_state import RequestState
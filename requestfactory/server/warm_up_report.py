@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+import time
+
+
+class WarmUpReport(object):
+    """Describes the work done by {@link ServiceLayer#warmUp(Class)}."""
+
+    def __init__(self, requestFactoryClass):
+        self._requestFactoryClass = requestFactoryClass
+        self._start = time.time()
+        self._elapsed = None
+        self._operationCount = 0
+        self._typeCount = 0
+        # (description, exception) pairs
+        self._errors = list()
+
+
+    def getRequestFactoryClass(self):
+        return self._requestFactoryClass
+
+
+    def getElapsed(self):
+        """Returns the time, in seconds, spent warming up the ServiceLayer."""
+        if self._elapsed is None:
+            return time.time() - self._start
+        return self._elapsed
+
+
+    def getOperationCount(self):
+        """Returns the number of operations that were resolved."""
+        return self._operationCount
+
+
+    def getTypeCount(self):
+        """Returns the number of proxy types that were resolved."""
+        return self._typeCount
+
+
+    def getErrors(self):
+        """Returns a list of {@code (description, exception)} pairs for each
+        operation or type that could not be resolved.
+        """
+        return list(self._errors)
+
+
+    def isSuccessful(self):
+        return len(self._errors) == 0
+
+
+    def resolveOperation(self, operation, resolve):
+        """Calls {@code resolve()}, recording any resolution error against the
+        operation.
+        """
+        self._operationCount += 1
+        self._run('operation ' + operation, resolve)
+
+
+    def resolveType(self, typeToken, resolve):
+        """Calls {@code resolve()}, recording any resolution error against the
+        type token.
+        """
+        self._typeCount += 1
+        self._run('type ' + typeToken, resolve)
+
+
+    def finish(self):
+        self._elapsed = time.time() - self._start
+
+
+    def _run(self, description, resolve):
+        try:
+            resolve()
+        except Exception as e:
+            self._errors.append((description, e))
+
+
+    def __str__(self):
+        return ('Resolved %d operations and %d types for %s in %.3fs with %d errors'
+                % (self._operationCount, self._typeCount,
+                   self._requestFactoryClass.__name__, self.getElapsed(),
+                   len(self._errors)))
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""A WSGI application serving RequestFactory JSON requests that does not depend
+on any web framework.
+"""
+
+import logging
+import threading
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+from requestfactory.server.default_exception_handler import DefaultExceptionHandler
+from requestfactory.server.service_layer import ServiceLayer
+from requestfactory.server.simple_request_processor import SimpleRequestProcessor
+from requestfactory.shared.request_factory import RequestFactory
+
+
+STATUS_OK = '200 OK'
+STATUS_BAD_REQUEST = '400 Bad Request'
+STATUS_METHOD_NOT_ALLOWED = '405 Method Not Allowed'
+STATUS_LENGTH_REQUIRED = '411 Length Required'
+STATUS_REQUEST_ENTITY_TOO_LARGE = '413 Request Entity Too Large'
+STATUS_INTERNAL_SERVER_ERROR = '500 Internal Server Error'
+STATUS_SERVICE_UNAVAILABLE = '503 Service Unavailable'
+
+JSON_CHARSET = 'UTF-8'
+JSON_CONTENT_TYPE = 'application/json'
+
+# The default number of threads processing payloads.
+DEFAULT_MAX_WORKERS = 8
+
+# The default number of requests that may wait for a free worker.
+DEFAULT_MAX_QUEUED = 64
+
+# The default limit on the size of a request body, in bytes.
+DEFAULT_MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+# The size of the blocks in which request bodies are read.
+READ_CHUNK_SIZE = 64 * 1024
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _BadRequest(Exception):
+    """Describes a request that is rejected before being processed."""
+
+    def __init__(self, status, message=''):
+        super(_BadRequest, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class RequestFactoryApplication(object):
+    """Handles GWT RequestFactory JSON requests as a WSGI application. It can be
+    served by any threaded or pre-forking WSGI server.
+    <p>
+    Payloads are processed in a bounded pool of worker threads. Requests that
+    arrive while all workers are busy wait in a queue of limited length;
+    requests beyond that limit are refused with a 503 status so that the
+    server sheds load instead of accumulating threads.
+    """
+
+    def __init__(self, exceptionHandler=None, serviceDecorators=(),
+                maxWorkers=DEFAULT_MAX_WORKERS, maxQueued=DEFAULT_MAX_QUEUED,
+                maxContentLength=DEFAULT_MAX_CONTENT_LENGTH):
+        """Constructs a new {@link RequestFactoryApplication} with a
+        {@code DefaultExceptionHandler} unless provided.
+
+        @param exceptionHandler an {@link ExceptionHandler} instance
+        @param serviceDecorators a sequence of ServiceLayerDecorators that change
+                 how the RequestFactory request processor interact with the
+                 domain objects
+        @param maxWorkers the number of worker threads, or {@code 0} to process
+                 payloads in the server's request thread
+        @param maxQueued the number of requests that may wait for a worker
+        @param maxContentLength the largest accepted request body, in bytes, or
+                 {@code None} for no limit
+        """
+        if exceptionHandler is None:
+            exceptionHandler = DefaultExceptionHandler()
+
+        self._processor = SimpleRequestProcessor(ServiceLayer.create(
+                *serviceDecorators))
+        self._processor.setExceptionHandler(exceptionHandler)
+        self._maxContentLength = maxContentLength
+
+        if maxWorkers > 0:
+            if ThreadPoolExecutor is None:
+                raise ImportError('A worker pool requires concurrent.futures '
+                        '(install the futures package on Python 2)')
+            self._executor = ThreadPoolExecutor(maxWorkers)
+            # Bounds the number of requests running or waiting in the pool
+            self._slots = threading.BoundedSemaphore(maxWorkers + maxQueued)
+        else:
+            self._executor = None
+            self._slots = None
+
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] != 'POST':
+            return self._respond(start_response, STATUS_METHOD_NOT_ALLOWED, '',
+                    [('Allow', 'POST')])
+        try:
+            jsonRequestString = self.readContent(environ)
+        except _BadRequest as e:
+            return self._respond(start_response, e.status, e.message)
+
+        if self._slots is not None and not self._slots.acquire(False):
+            return self._respond(start_response, STATUS_SERVICE_UNAVAILABLE, '',
+                    [('Retry-After', '1')])
+        try:
+            if self._executor is None:
+                payload = self._processor.processPayload(jsonRequestString)
+            else:
+                payload = self._executor.submit(self._processor.processPayload,
+                        jsonRequestString).result()
+        except Exception:
+            LOGGER.critical('Unexpected error', exc_info=True)
+            return self._respond(start_response, STATUS_INTERNAL_SERVER_ERROR, '')
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+        return self._respond(start_response, STATUS_OK, payload,
+                [('Content-Type', RequestFactory.JSON_CONTENT_TYPE_UTF8)])
+
+
+    def readContent(self, environ):
+        """Reads the request body, honouring {@code CONTENT_LENGTH} and the
+        configured size limit. The UTF-8 body is returned as bytes, read with a
+        single call when its length is known.
+        """
+        contentType = environ.get('CONTENT_TYPE') or ''
+        if not contentType.lower().startswith(JSON_CONTENT_TYPE):
+            raise _BadRequest(STATUS_BAD_REQUEST, 'Content-Type was \'%s\'. '
+                    'Expected \'%s\'.' % (contentType, JSON_CONTENT_TYPE))
+
+        stream = environ['wsgi.input']
+        contentLength = environ.get('CONTENT_LENGTH')
+        if contentLength:
+            try:
+                remaining = int(contentLength)
+            except ValueError:
+                raise _BadRequest(STATUS_BAD_REQUEST, 'Invalid Content-Length')
+            if (self._maxContentLength is not None
+                    and remaining > self._maxContentLength):
+                raise _BadRequest(STATUS_REQUEST_ENTITY_TOO_LARGE)
+        elif environ.get('wsgi.input_terminated'):
+            # The server signals the end of a chunked body with EOF
+            remaining = None
+        else:
+            raise _BadRequest(STATUS_LENGTH_REQUIRED)
+
+        if remaining is not None:
+            content = stream.read(remaining)
+            if len(content) != remaining:
+                raise _BadRequest(STATUS_BAD_REQUEST, 'Request body was truncated')
+            return content
+
+        chunks = list()
+        length = 0
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+            if (self._maxContentLength is not None
+                    and length > self._maxContentLength):
+                raise _BadRequest(STATUS_REQUEST_ENTITY_TOO_LARGE)
+        return b''.join(chunks)
+
+
+    def shutdown(self, wait=True):
+        """Stops the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait)
+
+
+    def _respond(self, start_response, status, body, headers=()):
+        if not isinstance(body, bytes):
+            body = body.encode(JSON_CHARSET)
+        headers = list(headers)
+        headers.append(('Content-Length', str(len(body))))
+        start_response(status, headers)
+        return [body]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""A Locator whose retrieval methods are coroutines.
+
+This module requires Python 3.5 or later and is not imported by the rest of
+the package.
+"""
+
+import asyncio
+
+from requestfactory.shared.locator import Locator, _overrides
+
+
+class AsyncLocator(Locator):
+    """A {@link Locator} for domain types stored behind an asyncio driver. The
+    retrieval methods {@code find}, {@code findAll}, {@code isLive} and
+    {@code isLiveBatch} are coroutines; {@code create}, {@code getId} and
+    {@code getVersion} remain plain methods because they only inspect the
+    domain object.
+    <p>
+    The RequestFactory service layer awaits the coroutines on the event loop
+    serving the request under {@code RequestFactoryASGIApp}, on the loop
+    registered with {@code requestfactory.server.coroutines.setEventLoop()},
+    or on a private event loop of the worker thread.
+    """
+
+    async def find(self, clazz, id):
+        """Retrieve an object. May return {@code null} to indicate that the requested
+        object could not be found.
+
+        @param clazz the type of object to retrieve
+        @param id an id previously returned from {@link #getId(Object)}
+        @return the requested object or {@code null} if it could not be found
+        """
+        raise NotImplementedError
+
+
+    async def findAll(self, clazz, ids):
+        """Retrieve several objects of the same type in a single batch.
+        <p>
+        The default implementation of this method awaits
+        {@link #find(Class, Object)} concurrently for each id.
+
+        @param clazz the type of objects to retrieve
+        @param ids a list of ids previously returned from {@link #getId(Object)}
+        @return a list of the requested objects in the same order as {@code ids}
+        """
+        return list(await asyncio.gather(*[self.find(clazz, id_) for id_ in ids]))
+
+
+    async def isLive(self, domainObject):
+        """The default implementation of this method uses {@link #getId(Object)}
+        and {@link #find(Class, Object)} to determine if an object can be
+        retrieved.
+        """
+        clazz = domainObject.__class__
+        return (await self.find(clazz, self.getId(domainObject))) is not None
+
+
+    async def isLiveBatch(self, domainObjects):
+        """The default implementation of this method retrieves all of the objects
+        with a single call to {@link #findAll(Class, List)}, unless
+        {@link #isLive(Object)} has been overridden.
+        """
+        if not domainObjects:
+            return []
+        if _overrides(self, 'isLive', AsyncLocator):
+            return list(await asyncio.gather(*[self.isLive(domainObject)
+                    for domainObject in domainObjects]))
+        clazz = domainObjects[0].__class__
+        found = await self.findAll(clazz,
+                [self.getId(domainObject) for domainObject in domainObjects])
+        return [o is not None for o in found]
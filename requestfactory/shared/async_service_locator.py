@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""A ServiceLocator that provides service instances from a coroutine.
+
+This module requires Python 3.5 or later and is not imported by the rest of
+the package.
+"""
+
+from requestfactory.shared.service_locator import ServiceLocator
+
+
+class AsyncServiceLocator(ServiceLocator):
+    """A {@link ServiceLocator} whose {@code getInstance} is a coroutine, for
+    service objects that must be obtained from an asyncio resource such as a
+    connection pool.
+    """
+
+    async def getInstance(self, clazz):
+        """Returns an instance of the service object.
+
+        @param clazz the requested type of service object
+        @return an instance of the service object
+        """
+        raise NotImplementedError
@@ -55,6 +55,23 @@ class Locator(object):
         raise NotImplementedError
 
 
+    def findAll(self, clazz, ids):
+        """Retrieve several objects of the same type in a single batch. Locators
+        backed by a datastore should override this method to issue one query for
+        all of the ids instead of one query per id.
+        <p>
+        The default implementation of this method calls
+        {@link #find(Class, Object)} for each id.
+
+        @param clazz the type of objects to retrieve
+        @param ids a list of ids previously returned from {@link #getId(Object)}
+        @return a list of the requested objects in the same order as {@code ids},
+                elements of which may be {@code null} if an object could not be
+                found
+        """
+        return [self.find(clazz, id_) for id_ in ids]
+
+
     def getDomainType(self):
         """Returns the domain type."""
         raise NotImplementedError
@@ -76,6 +93,21 @@ class Locator(object):
         raise NotImplementedError
 
 
+    def prefetch(self, domainObjects, propertyPaths):
+        """Called before the RequestFactory reads the requested properties of a
+        batch of domain objects. Locators for types with lazily-loaded relations
+        should override this method to load the objects reachable through the
+        paths with one query per path rather than one per object.
+        <p>
+        The default implementation of this method does nothing.
+
+        @param domainObjects a list of domain objects of the same type
+        @param propertyPaths the dotted property paths, relative to the
+                 objects, that will be read; {@code '*'} matches any property
+        """
+        pass
+
+
     def getVersion(self, domainObject):
         """Returns a domain object to be used as the version for the given object.
         This method may return {@code null} if the object has not been persisted or
@@ -87,6 +119,18 @@ class Locator(object):
         raise NotImplementedError
 
 
+    def getVersions(self, domainObjects):
+        """Batched form of {@link #getVersion(Object)}.
+        <p>
+        The default implementation of this method calls
+        {@link #getVersion(Object)} for each domain object.
+
+        @param domainObjects a list of objects to obtain versions for
+        @return a list of the objects' versions, in the same order
+        """
+        return [self.getVersion(domainObject) for domainObject in domainObjects]
+
+
     def isLive(self, domainObject):
         """Returns a value indicating if the domain object should no longer be
         considered accessible. This method might return false if the record
@@ -98,3 +142,35 @@ class Locator(object):
         """
         clazz = domainObject.__class__
         return self.find(clazz, self.getId(domainObject)) != None
+
+
+    def isLiveBatch(self, domainObjects):
+        """Batched form of {@link #isLive(Object)}.
+        <p>
+        The default implementation of this method retrieves all of the objects
+        with a single call to {@link #findAll(Class, List)}, unless
+        {@link #isLive(Object)} has been overridden, in which case it is called
+        for each domain object.
+
+        @param domainObjects a list of objects of the same type
+        @return a list containing {@code true} for each live object
+        """
+        if not domainObjects:
+            return []
+        if _overrides(self, 'isLive'):
+            return [self.isLive(domainObject) for domainObject in domainObjects]
+        clazz = domainObjects[0].__class__
+        found = self.findAll(clazz,
+                [self.getId(domainObject) for domainObject in domainObjects])
+        return [o is not None for o in found]
+
+
+def _overrides(locator, name, base=Locator):
+    """Returns {@code true} if the locator's type overrides the named method of
+    {@code base}. Locators that don't extend {@code base} and lack the method
+    do not override it.
+    """
+    method = getattr(locator.__class__, name, None)
+    if method is None:
+        return False
+    return getattr(method, '__func__', method) is not base.__dict__[name]
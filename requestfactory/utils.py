@@ -13,18 +13,40 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import zlib
+
 from paste.httpheaders import \
     ACCEPT_ENCODING, CONTENT_ENCODING, CONTENT_TYPE
 
 
+# Content-Encoding values understood by the compression helpers.
+GZIP_ENCODING = 'gzip'
+DEFLATE_ENCODING = 'deflate'
+
+# Responses smaller than this many bytes are not worth compressing.
+UNCOMPRESSED_BYTE_SIZE_LIMIT = 256
+
+# The default zlib compression level, from 1 (fastest) to 9 (smallest).
+COMPRESSION_LEVEL = 6
+
+# The default limit on the size of a request body, in bytes, after any
+# Content-Encoding has been removed.
+CONTENT_LENGTH_LIMIT = 16 * 1024 * 1024
+
+# The size of the blocks in which request bodies are read and decompressed.
+READ_CHUNK_SIZE = 64 * 1024
+
+
 class ServletException(Exception):
     pass
 
 
-def readContent(request, expectedContentType, expectedCharSet=None):
+def readContent(request, expectedContentType, expectedCharSet=None,
+            limit=CONTENT_LENGTH_LIMIT):
     """Returns the content of an {@link HTTPRequest} by decoding it using
     <code>expectedCharSet</code>, or <code>UTF-8</code> if
-    <code>expectedCharSet</code> is <code>null</null>.
+    <code>expectedCharSet</code> is <code>null</null>. Bodies sent with a
+    gzip or deflate Content-Encoding are decompressed incrementally.
 
     @param request the servlet request whose content we want to read
     @param expectedContentType the expected content (i.e. 'type/subtype' only)
@@ -34,6 +56,8 @@ def readContent(request, expectedContentType, expectedCharSet=None):
     @param expectedCharSet the expected request charset, or <code>null</code>
              if no charset validation is to be performed and <code>UTF-8</code>
              should be assumed
+    @param limit the largest accepted content, in bytes, after decompression,
+             or <code>null</code> for no limit
     @return the content of an {@link HTTPRequest} by decoding it using
             <code>expectedCharSet</code>, or <code>UTF-8</code> if
             <code>expectedCharSet</code> is <code>null</code>
@@ -41,17 +65,126 @@ def readContent(request, expectedContentType, expectedCharSet=None):
             from or closed
     @throws ServletException if the request's content type does not
             equal the supplied <code>expectedContentType</code> or
-            <code>expectedCharSet</code>
+            <code>expectedCharSet</code>, if the content encoding is not
+            supported or if the content exceeds the limit
+    """
+    content = readContentBytes(request, expectedContentType, expectedCharSet,
+            limit)
+    return content.decode(expectedCharSet or "UTF-8")
+
+
+def readContentBytes(request, expectedContentType, expectedCharSet=None,
+            limit=CONTENT_LENGTH_LIMIT):
+    """Returns the content of an {@link HTTPRequest} without decoding it, so
+    that it can be handed to a JSON parser that reads UTF-8 bytes directly.
+    The headers are validated as by
+    {@link #readContent(HTTPRequest, String, String, int)}.
     """
     if expectedContentType is not None:
         checkContentTypeIgnoreCase(request, expectedContentType)
     if expectedCharSet is not None:
         checkCharacterEncodingIgnoreCase(request, expectedCharSet)
-    else:
-        expectedCharSet = "UTF-8"
 
+    environ = request.environ()
+    contentLength = environ.get('CONTENT_LENGTH')
+    try:
+        contentLength = int(contentLength) if contentLength else None
+    except ValueError:
+        raise ServletException('Invalid Content-Length \'' + contentLength
+                + '\'')
     in_ = request.rawInput(rewind=True)
-    return in_.encode(expectedCharSet)
+    return readBody(in_, CONTENT_ENCODING(environ), limit, contentLength)
+
+
+def readBody(stream, contentEncoding=None, limit=CONTENT_LENGTH_LIMIT,
+            contentLength=None):
+    """Reads a request body, removing a gzip or deflate Content-Encoding.
+    <p>
+    An uncompressed body of known length is read with a single call, so the
+    only copy made is the returned byte string. Any other body is read with
+    {@link #iterBody(file, String, int)}.
+
+    @param stream the request's input stream
+    @param contentEncoding the value of the Content-Encoding header, or
+             <code>null</code>
+    @param limit the largest accepted content, in bytes, after decompression,
+             or <code>null</code> for no limit
+    @param contentLength the value of the Content-Length header, or
+             <code>null</code> if unknown
+    @return the decoded content as a byte string
+    @throws ServletException if the content encoding is not supported, the
+            compressed content is corrupt, the content exceeds the limit or
+            the stream ends before Content-Length bytes
+    """
+    encoding = (contentEncoding or '').strip().lower()
+    if encoding in ('', 'identity') and contentLength is not None:
+        if limit is not None and contentLength > limit:
+            raise _exceedsLimit(limit)
+        content = stream.read(contentLength)
+        if len(content) != contentLength:
+            raise ServletException('Request content ended after '
+                    + str(len(content)) + ' of ' + str(contentLength) + ' bytes')
+        return content
+    return b''.join(iterBody(stream, contentEncoding, limit))
+
+
+def iterBody(stream, contentEncoding=None, limit=CONTENT_LENGTH_LIMIT):
+    """Reads a request body one block at a time, removing a gzip or deflate
+    Content-Encoding. No more than <code>limit</code> bytes are ever held or
+    inflated, so a small malicious body cannot exhaust memory.
+
+    @param stream the request's input stream
+    @param contentEncoding the value of the Content-Encoding header, or
+             <code>null</code>
+    @param limit the largest accepted content, in bytes, after decompression,
+             or <code>null</code> for no limit
+    @return an iterator over the blocks of decoded content
+    @throws ServletException if the content encoding is not supported, the
+            compressed content is corrupt or the content exceeds the limit
+    """
+    encoding = (contentEncoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        decompressor = None
+    elif encoding in (GZIP_ENCODING, 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == DEFLATE_ENCODING:
+        decompressor = zlib.decompressobj()
+    else:
+        raise ServletException('Content-Encoding \'' + contentEncoding
+                + '\' is not supported')
+
+    size = 0
+    try:
+        while True:
+            data = stream.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            while data:
+                if decompressor is None:
+                    chunk, data = data, None
+                elif limit is None:
+                    chunk, data = decompressor.decompress(data), None
+                else:
+                    # Inflate at most one byte more than the limit allows
+                    chunk = decompressor.decompress(data, limit - size + 1)
+                    data = decompressor.unconsumed_tail
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    raise _exceedsLimit(limit)
+                yield chunk
+        if decompressor is not None:
+            chunk = decompressor.flush()
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise _exceedsLimit(limit)
+            yield chunk
+    except zlib.error as e:
+        raise ServletException('Could not decompress the request content: '
+                + str(e))
+
+
+def _exceedsLimit(limit):
+    return ServletException('Request content exceeds ' + str(limit) + ' bytes')
 
 
 def checkCharacterEncodingIgnoreCase(request, expectedCharSet):
@@ -64,7 +197,7 @@ def checkCharacterEncodingIgnoreCase(request, expectedCharSet):
     """
     assert expectedCharSet is not None
     encodingOkay = False
-    characterEncoding = CONTENT_ENCODING(request.environ())
+    characterEncoding = getCharacterEncoding(request)
     if characterEncoding is not None:
         # TODO: It would seem that we should be able to use equalsIgnoreCase here
         # instead of indexOf. Need to be sure that servlet engines return a
@@ -78,6 +211,22 @@ def checkCharacterEncodingIgnoreCase(request, expectedCharSet):
                 + '\'. Expected \'' + expectedCharSet + '\'')
 
 
+def getCharacterEncoding(request):
+    """Returns the charset parameter of the request's Content-Type, or
+    <code>null</code> if the request does not specify one.
+
+    @param request the incoming request
+    """
+    contentType = CONTENT_TYPE(request.environ())
+    if not contentType:
+        return None
+    for param in contentType.split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return value.strip().strip('"')
+    return None
+
+
 def checkContentTypeIgnoreCase(request, expectedContentType):
     """Performs Content-Type validation of the incoming request, ignoring case
     and any <code>charset</code> parameter.
@@ -103,3 +252,106 @@ def checkContentTypeIgnoreCase(request, expectedContentType):
         raise ServletException('Content-Type was \''
                 + ('(null)' if contentType is None else contentType)
                 + '\'. Expected \'' + expectedContentType + '\'.')
+
+
+def getAcceptedEncoding(request):
+    """Chooses the Content-Encoding of a response from the Accept-Encoding
+    header of the request. gzip is preferred over deflate when the client
+    accepts both with the same quality.
+
+    @param request the incoming request
+    @return {@link #GZIP_ENCODING}, {@link #DEFLATE_ENCODING} or
+            <code>null</code> if the response should not be compressed
+    """
+    return negotiateEncoding(ACCEPT_ENCODING(request.environ()))
+
+
+def negotiateEncoding(acceptEncoding):
+    """Chooses a supported Content-Encoding from the value of an
+    Accept-Encoding header.
+
+    @see #getAcceptedEncoding(HTTPRequest)
+    """
+    if not acceptEncoding:
+        return None
+    qualities = dict()
+    for coding in acceptEncoding.split(','):
+        params = coding.split(';')
+        name = params[0].strip().lower()
+        quality = 1.0
+        for param in params[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    best, bestQuality = None, 0.0
+    for encoding in (GZIP_ENCODING, DEFLATE_ENCODING):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > bestQuality:
+            best, bestQuality = encoding, quality
+    return best
+
+
+def acceptsGzipEncoding(request):
+    """Returns <code>true</code> if the request accepts gzip encoding.
+
+    @param request the request to check
+    """
+    return getAcceptedEncoding(request) == GZIP_ENCODING
+
+
+def exceedsUncompressedContentLengthLimit(content,
+            limit=UNCOMPRESSED_BYTE_SIZE_LIMIT):
+    """Returns <code>true</code> if the response content is long enough to be
+    worth compressing.
+
+    @param content the encoded response content
+    @param limit the size, in bytes, below which content is sent uncompressed
+    """
+    return len(content) > limit
+
+
+def compressContent(content, encoding, level=COMPRESSION_LEVEL):
+    """Compresses response content.
+
+    @param content the encoded response content
+    @param encoding {@link #GZIP_ENCODING} or {@link #DEFLATE_ENCODING}
+    @param level the zlib compression level
+    @return the compressed content
+    """
+    if encoding == GZIP_ENCODING:
+        # A window size offset by 16 selects the gzip container format
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif encoding == DEFLATE_ENCODING:
+        compressor = zlib.compressobj(level)
+    else:
+        raise ValueError('Unsupported Content-Encoding %s' % encoding)
+    return compressor.compress(content) + compressor.flush()
+
+
+def writeResponse(request, response, responseContent, threshold=
+            UNCOMPRESSED_BYTE_SIZE_LIMIT, level=COMPRESSION_LEVEL):
+    """Writes the response content, compressing it if the request accepts a
+    supported encoding and the content exceeds the threshold.
+
+    @param request the request being answered
+    @param response the response to write to; its content type must already be
+             set
+    @param responseContent the encoded response content
+    @param threshold the size, in bytes, below which content is sent
+             uncompressed, or <code>null</code> to never compress
+    @param level the zlib compression level
+    """
+    response.setHeader('Vary', 'Accept-Encoding')
+    encoding = None
+    if threshold is not None:
+        encoding = getAcceptedEncoding(request)
+    if (encoding is not None
+            and exceedsUncompressedContentLengthLimit(responseContent, threshold)):
+        responseContent = compressContent(responseContent, encoding, level)
+        response.setHeader('Content-Encoding', encoding)
+    response.setHeader('Content-Length', str(len(responseContent)))
+    response.write(responseContent)
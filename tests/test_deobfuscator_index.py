@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests writing a Deobfuscator to an index file and mapping it back."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from requestfactory.server.deobfuscator_index import DeobfuscatorIndex, \
+    writeIndex
+
+
+class _Deobfuscator(object):
+    """An in-memory Deobfuscator holding fixed tables."""
+
+    def __init__(self, operations, typeTokens, clientProxies):
+        # Maps operations to (domain method descriptor, request context,
+        # request context method name, request context method descriptor)
+        self._operations = operations
+        self._typeTokens = typeTokens
+        self._clientProxies = clientProxies
+
+    def getClientProxies(self, domainBinaryName):
+        return self._clientProxies.get(domainBinaryName)
+
+    def getDomainMethodDescriptor(self, operation):
+        return self._getField(operation, 0)
+
+    def getDomainTypes(self):
+        return sorted(self._clientProxies)
+
+    def getOperations(self):
+        return sorted(self._operations)
+
+    def getRequestContext(self, operation):
+        return self._getField(operation, 1)
+
+    def getRequestContextMethodName(self, operation):
+        return self._getField(operation, 2)
+
+    def getRequestContextMethodDescriptor(self, operation):
+        return self._getField(operation, 3)
+
+    def getTypeFromToken(self, typeToken):
+        return self._typeTokens.get(typeToken)
+
+    def getTypeTokens(self):
+        return sorted(self._typeTokens)
+
+    def _getField(self, operation, field):
+        fields = self._operations.get(operation)
+        return None if fields is None else fields[field]
+
+
+SOURCE = _Deobfuscator({
+    'Xdqz7W0WoQKMpjlUWE3wqEx$Pls=': ('(Ljava/lang/Long;)Lcom/example/Employee;',
+            'com.example.shared.EmployeeRequest', 'findEmployee',
+            '(Ljava/lang/Long;)Lcom/google/web/bindery/requestfactory/shared/Request;'),
+    'Gk9v6YNvXBj1Hqsn2Zft7D9yqwg=': ('()Ljava/util/List;',
+            'com.example.shared.EmployeeRequest', 'findAllEmployees',
+            '()Lcom/google/web/bindery/requestfactory/shared/Request;')
+}, {
+    'Gk9v6YNvXBj1Hqsn2Zft7D9yqwg=': 'com.example.shared.EmployeeProxy',
+    'MQ==': u'com.example.shared.DépartementProxy'
+}, {
+    'com.example.Employee': ['com.example.shared.EmployeeProxy',
+            'com.example.shared.EmployeeSummaryProxy'],
+    'com.example.Department': [u'com.example.shared.DépartementProxy'],
+    'com.example.Unmapped': []
+})
+
+
+class DeobfuscatorIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'factory.idx')
+        writeIndex('com.example.shared.ExpensesRequestFactory', SOURCE,
+                self.path)
+        self.index = DeobfuscatorIndex(self.path)
+
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+
+    def testBinaryName(self):
+        self.assertEqual('com.example.shared.ExpensesRequestFactory',
+                self.index.getBinaryName())
+
+
+    def testOperations(self):
+        self.assertEqual(SOURCE.getOperations(), self.index.getOperations())
+        for operation in SOURCE.getOperations():
+            self.assertEqual(SOURCE.getDomainMethodDescriptor(operation),
+                    self.index.getDomainMethodDescriptor(operation))
+            self.assertEqual(SOURCE.getRequestContext(operation),
+                    self.index.getRequestContext(operation))
+            self.assertEqual(SOURCE.getRequestContextMethodName(operation),
+                    self.index.getRequestContextMethodName(operation))
+            self.assertEqual(SOURCE.getRequestContextMethodDescriptor(operation),
+                    self.index.getRequestContextMethodDescriptor(operation))
+
+
+    def testTypeTokens(self):
+        self.assertEqual(SOURCE.getTypeTokens(), self.index.getTypeTokens())
+        for typeToken in SOURCE.getTypeTokens():
+            self.assertEqual(SOURCE.getTypeFromToken(typeToken),
+                    self.index.getTypeFromToken(typeToken))
+
+
+    def testClientProxies(self):
+        self.assertEqual(SOURCE.getDomainTypes(), self.index.getDomainTypes())
+        for domainType in SOURCE.getDomainTypes():
+            self.assertEqual(SOURCE.getClientProxies(domainType),
+                    self.index.getClientProxies(domainType))
+
+
+    def testNoClientProxies(self):
+        self.assertEqual([], self.index.getClientProxies('com.example.Unmapped'))
+
+
+    def testMissingEntries(self):
+        self.assertEqual(None, self.index.getClientProxies('com.example.Other'))
+        self.assertEqual(None, self.index.getTypeFromToken('missing'))
+        self.assertEqual(None, self.index.getRequestContext('missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
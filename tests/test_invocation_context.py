@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests how domain methods receive their InvocationContext."""
+
+import sys
+import unittest
+
+from requestfactory.server.invocation_context import InvocationContext, \
+    acceptsInvocationContext, POSITIONAL, KEYWORD
+
+
+class EmployeeService(object):
+
+    @staticmethod
+    def findEmployees(department, invocationContext=None):
+        pass
+
+    @staticmethod
+    def countEmployees(department):
+        pass
+
+    def findSupervisor(self, employee, invocationContext):
+        pass
+
+    @classmethod
+    def findAll(cls, invocationContext=None):
+        pass
+
+
+class InvocationContextTest(unittest.TestCase):
+
+    def testPositional(self):
+        self.assertEqual(POSITIONAL,
+                acceptsInvocationContext(EmployeeService.findEmployees))
+        self.assertEqual(POSITIONAL,
+                acceptsInvocationContext(EmployeeService.findSupervisor))
+        self.assertEqual(POSITIONAL,
+                acceptsInvocationContext(EmployeeService.findAll))
+
+
+    @unittest.skipIf(sys.version_info[0] < 3, 'keyword-only parameters')
+    def testKeyword(self):
+        namespace = dict()
+        exec('def findEmployees(department, *, invocationContext=None):\n'
+                '    return invocationContext\n'
+                'def findAll(*departments, invocationContext=None):\n'
+                '    return invocationContext\n', namespace)
+        self.assertEqual(KEYWORD,
+                acceptsInvocationContext(namespace['findEmployees']))
+        self.assertEqual(KEYWORD, acceptsInvocationContext(namespace['findAll']))
+
+
+    def testNone(self):
+        self.assertEqual(None,
+                acceptsInvocationContext(EmployeeService.countEmployees))
+        self.assertEqual(None, acceptsInvocationContext(len))
+
+
+    def testIsRequested(self):
+        context = InvocationContext('op', ['supervisor.department', '*.name'])
+        self.assertTrue(context.isRequested('supervisor'))
+        self.assertTrue(context.isRequested('supervisor.department'))
+        self.assertTrue(context.isRequested('anything'))
+        self.assertTrue(context.isRequested('anything.name'))
+        self.assertFalse(context.isRequested('anything.department'))
+        self.assertEqual(frozenset(['*', '*.name', 'supervisor',
+                'supervisor.department']), context.getExpandedPropertyRefs())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests the compiled property references against the string-based expansion
+and matching that the Resolver used before them.
+"""
+
+import re
+import unittest
+
+from requestfactory.server import property_path_trie
+from requestfactory.server.property_path_trie import compilePropertyRefs, \
+    expandPropertyRefs, snipIndexes
+
+
+def _expand(refs):
+    """Expands each reference into all of its dotted prefixes."""
+    toReturn = set()
+    for raw in refs:
+        segments = raw.split('.')
+        for i in range(1, len(segments) + 1):
+            toReturn.add('.'.join(segments[:i]))
+    return toReturn
+
+
+def _matches(paths, name):
+    """Returns true if a property is requested by a set of relative paths."""
+    return '*' in paths or re.sub(r'\[\d+\]', '', name) in paths
+
+
+def _descend(paths, name):
+    """Returns the paths relative to the named property."""
+    prefix = name + '.'
+    toReturn = set()
+    for path in paths:
+        if path.startswith(prefix):
+            toReturn.add(path[len(prefix):])
+        elif path.startswith('*.'):
+            toReturn.add(path[len('*.'):])
+    return toReturn
+
+
+REFS = [
+    [],
+    ['a'],
+    ['a.b.c'],
+    ['a.b', 'a.c', 'd'],
+    ['*'],
+    ['*.b'],
+    ['a.*'],
+    ['a.*.c', 'b'],
+    ['*.*.c'],
+    ['items[0].name'],
+]
+
+NAMES = ['a', 'b', 'c', 'd', 'e', 'items', 'items[0]', 'items[12]']
+
+
+class PropertyPathTrieTest(unittest.TestCase):
+
+    def assertSameAsStrings(self, node, paths, depth):
+        """Compares a node with the string paths it replaces, down to the given
+        depth.
+        """
+        self.assertEqual(frozenset(paths), node.getPaths())
+        self.assertEqual(len(paths) == 0, node.isEmpty())
+        for name in NAMES:
+            self.assertEqual(_matches(paths, name), node.matches(name),
+                    '%s matches %s' % (sorted(paths), name))
+            if depth > 0:
+                self.assertSameAsStrings(node.descend(name),
+                        _descend(paths, name), depth - 1)
+
+
+    def testExpandPropertyRefs(self):
+        self.assertEqual(set(['foo', 'foo.bar', 'foo.bar.baz']),
+                expandPropertyRefs(['foo.bar.baz']))
+        self.assertEqual(set(['*', '*.b']), expandPropertyRefs(['*.b']))
+        self.assertEqual(set(), expandPropertyRefs(None))
+        for refs in REFS:
+            self.assertEqual(_expand(refs), expandPropertyRefs(refs))
+
+
+    def testSameAsStrings(self):
+        for refs in REFS:
+            self.assertSameAsStrings(compilePropertyRefs(refs).getRoot(),
+                    _expand(refs), 3)
+
+
+    def testWildcard(self):
+        root = compilePropertyRefs(['*']).getRoot()
+        self.assertTrue(root.matches('anything'))
+        self.assertTrue(root.descend('anything').isEmpty())
+
+
+    def testWildcardPrefix(self):
+        root = compilePropertyRefs(['*.b', 'a.c']).getRoot()
+        self.assertTrue(root.matches('x'))
+        self.assertEqual(frozenset(['b']), root.descend('x').getPaths())
+        self.assertEqual(frozenset(['b', 'c']), root.descend('a').getPaths())
+        self.assertTrue(root.descend('x').matches('b'))
+        self.assertFalse(root.descend('x').matches('c'))
+
+
+    def testIndexSuffix(self):
+        self.assertEqual('a.b', snipIndexes('a[0].b[12]'))
+        self.assertEqual('a.b', snipIndexes('a.b'))
+        root = compilePropertyRefs(['items.name']).getRoot()
+        self.assertTrue(root.matches('items[0]'))
+        self.assertTrue(root.matches('items[12]'))
+        self.assertFalse(root.matches('other[0]'))
+
+
+    def testDescend(self):
+        root = compilePropertyRefs(['a.b.c', 'd']).getRoot()
+        a = root.descend('a')
+        self.assertEqual(frozenset(['b', 'b.c']), a.getPaths())
+        self.assertEqual(frozenset(['c']), a.descend('b').getPaths())
+        self.assertTrue(a.descend('b').descend('c').isEmpty())
+        self.assertTrue(root.descend('d').isEmpty())
+        # Lookups are memoized and equal path sets share a node
+        self.assertTrue(a is root.descend('a'))
+        self.assertTrue(root.descend('d') is root.descend('missing'))
+        self.assertTrue(root.descend('d') is compilePropertyRefs(
+                ['a.b.c', 'd']).getEmpty())
+
+
+    def testGetLeafPaths(self):
+        root = compilePropertyRefs(['a.b.c', 'a.d', 'e', 'a']).getRoot()
+        self.assertEqual(['a.b.c', 'a.d', 'e'], root.getLeafPaths())
+        self.assertEqual(['b.c', 'd'], root.descend('a').getLeafPaths())
+        self.assertEqual([], compilePropertyRefs([]).getRoot().getLeafPaths())
+
+
+    def testUnionAndDifference(self):
+        trie = compilePropertyRefs(['a.b', 'c'])
+        root = trie.getRoot()
+        self.assertTrue(root.union(trie.getEmpty()) is root)
+        self.assertTrue(trie.getEmpty().union(root) is root)
+        self.assertTrue(root.difference(frozenset(['x'])) is root)
+        self.assertEqual(frozenset(['a', 'a.b']),
+                root.difference(frozenset(['c'])).getPaths())
+        self.assertTrue(root.difference(frozenset(['c'])).union(
+                trie.getNode(frozenset(['c']))) is root)
+
+
+    def testCache(self):
+        trie = compilePropertyRefs(['a.b'])
+        self.assertTrue(trie is compilePropertyRefs(set(['a.b'])))
+        self.assertTrue(compilePropertyRefs(None) is compilePropertyRefs([]))
+
+
+    def testCacheEviction(self):
+        cacheSize = property_path_trie.CACHE_SIZE
+        property_path_trie.CACHE_SIZE = 2
+        try:
+            first = compilePropertyRefs(['first'])
+            compilePropertyRefs(['second'])
+            compilePropertyRefs(['third'])
+            self.assertFalse(first is compilePropertyRefs(['first']))
+        finally:
+            property_path_trie.CACHE_SIZE = cacheSize
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests the slotted proxy beans used when SLOTTED_PROXY_BEANS is set."""
+
+import unittest
+
+from requestfactory.shared.impl.constants import Constants
+from requestfactory.server import proxy_bean
+from requestfactory.server.proxy_bean import ProxyBean, getAutoBean, \
+    getAllProperties, getProperties, setProperties, toEncodable
+
+
+class PersonProxy(object):
+
+    def getName(self):
+        raise NotImplementedError
+
+    def setName(self, name):
+        raise NotImplementedError
+
+    def getFriend(self):
+        raise NotImplementedError
+
+    def getFriends(self):
+        raise NotImplementedError
+
+
+_PROPERTIES = (
+    proxy_bean._Property('name', str, None, True),
+    proxy_bean._Property('friend', PersonProxy, None, False),
+    proxy_bean._Property('friends', list, PersonProxy, False)
+)
+
+
+class _RecordingVisitor(object):
+    """Records the calls made by ProxyBean.accept()."""
+
+    def __init__(self, descend=False):
+        self.calls = list()
+        self._descend = descend
+
+    def visit(self, bean, ctx):
+        self.calls.append(('visit', bean))
+        return True
+
+    def endVisit(self, bean, ctx):
+        self.calls.append(('endVisit', bean))
+
+    def visitValueProperty(self, propertyName, value, ctx):
+        self.calls.append(('value', propertyName, ctx.getType()))
+        return False
+
+    def endVisitValueProperty(self, propertyName, value, ctx):
+        self.calls.append(('endValue', propertyName))
+
+    def visitReferenceProperty(self, propertyName, value, ctx):
+        self.calls.append(('reference', propertyName, ctx.getType()))
+        return self._descend
+
+    def endVisitReferenceProperty(self, propertyName, value, ctx):
+        self.calls.append(('endReference', propertyName))
+
+    def visitCollectionProperty(self, propertyName, value, ctx):
+        self.calls.append(('collection', propertyName, ctx.getElementType()))
+        return self._descend
+
+    def endVisitCollectionProperty(self, propertyName, value, ctx):
+        self.calls.append(('endCollection', propertyName))
+
+
+class ProxyBeanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.beanType = proxy_bean._defineBeanType(PersonProxy, True,
+                _PROPERTIES, None)
+
+
+    def createBean(self, stableId, name=None):
+        bean = self.beanType()
+        bean.setTag(Constants.STABLE_ID, stableId)
+        bean.as_().setName(name)
+        return bean
+
+
+    def testShimAccessors(self):
+        bean = self.createBean('id1', 'alice')
+        shim = bean.as_()
+        self.assertTrue(isinstance(shim, PersonProxy))
+        self.assertEqual('alice', shim.getName())
+        self.assertTrue(shim is bean.as_())
+        self.assertEqual('id1', shim.stableId())
+
+
+    def testGetAutoBean(self):
+        bean = self.createBean('id1')
+        self.assertTrue(getAutoBean(bean.as_()) is bean)
+
+
+    def testEntityEquality(self):
+        self.assertEqual(self.createBean('id1').as_(),
+                self.createBean('id1').as_())
+        self.assertNotEqual(self.createBean('id1').as_(),
+                self.createBean('id2').as_())
+
+
+    def testToEncodable(self):
+        friend = self.createBean('id2')
+        self.assertEqual('id2', toEncodable(friend.as_()))
+        self.assertEqual(['id2', 'x'], toEncodable([friend.as_(), 'x']))
+        self.assertEqual(set(['id2']), toEncodable(set([friend.as_()])))
+        self.assertEqual('x', toEncodable('x'))
+
+
+    def testPropertiesAreEncodable(self):
+        bean = self.createBean('id1', 'alice')
+        friend = self.createBean('id2', 'bob')
+        setProperties(bean, _PROPERTIES[1:], [friend.as_(), [friend.as_()]])
+        encoded = dict((name, toEncodable(value))
+                for name, value in getAllProperties(bean).items())
+        self.assertEqual({'name': 'alice', 'friend': 'id2',
+                'friends': ['id2']}, encoded)
+
+
+    def testAcceptVisitsEachProperty(self):
+        bean = self.createBean('id1')
+        visitor = _RecordingVisitor()
+        bean.accept(visitor)
+        self.assertEqual([
+            ('visit', bean),
+            ('value', 'name', str),
+            ('endValue', 'name'),
+            ('reference', 'friend', PersonProxy),
+            ('endReference', 'friend'),
+            ('collection', 'friends', PersonProxy),
+            ('endCollection', 'friends'),
+            ('endVisit', bean)
+        ], visitor.calls)
+
+
+    def testAcceptDescendsOnce(self):
+        bean = self.createBean('id1')
+        friend = self.createBean('id2')
+        setProperties(bean, _PROPERTIES[1:], [friend.as_(), [friend.as_()]])
+        # A cycle back to the first bean
+        setProperties(friend, _PROPERTIES[1:2], [bean.as_()])
+        visitor = _RecordingVisitor(True)
+        bean.accept(visitor)
+        visited = [call[1] for call in visitor.calls if call[0] == 'visit']
+        self.assertEqual([bean, friend], visited)
+
+
+    def testGetProperties(self):
+        bean = self.createBean('id1')
+        self.assertEqual(_PROPERTIES, getProperties(bean))
+
+
+    def testFrozen(self):
+        bean = self.createBean('id1')
+        bean.setFrozen()
+        self.assertRaises(RuntimeError, bean.as_().setName, 'bob')
+
+
+    def testTags(self):
+        bean = self.createBean('id1')
+        bean.setTag('other', 1)
+        self.assertEqual('id1', bean.getTag(Constants.STABLE_ID))
+        self.assertEqual(1, bean.getTag('other'))
+        self.assertTrue(isinstance(bean, ProxyBean))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests the single-flight, bounded caching of ServiceLayerCache."""
+
+import threading
+import time
+import unittest
+
+from requestfactory.server.service_layer_cache import ServiceLayerCache
+from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
+
+
+# The number of threads requesting the same value.
+THREADS = 8
+
+# Seconds to wait for the threads before failing.
+TIMEOUT = 10
+
+
+class _NextLayer(ServiceLayerDecorator):
+    """Counts calls to resolveTypeToken(), optionally holding them until
+    released or failing them.
+    """
+
+    def __init__(self, blocking=False, exception=None):
+        super(_NextLayer, self).__init__()
+        self.calls = list()
+        self.entered = threading.Event()
+        self.released = threading.Event()
+        if not blocking:
+            self.released.set()
+        self._exception = exception
+        self._lock = threading.Lock()
+
+    def resolveTypeToken(self, domainClass):
+        with self._lock:
+            self.calls.append(domainClass)
+        self.entered.set()
+        self.released.wait(TIMEOUT)
+        if self._exception is not None:
+            raise self._exception
+        return 'token:' + domainClass
+
+
+class ServiceLayerCacheTest(unittest.TestCase):
+
+    def createCache(self, next_, maxSize=None):
+        cache = ServiceLayerCache(maxSize)
+        cache._next = next_
+        return cache
+
+
+    def callConcurrently(self, cache, next_):
+        """Calls resolveTypeToken() for one key from THREADS threads while the
+        first call is held in the next layer.
+
+        @return a list of the value or exception seen by each thread
+        """
+        results = [None] * THREADS
+
+        def call(i):
+            try:
+                results[i] = cache.resolveTypeToken('Person')
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,))
+                for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(next_.entered.wait(TIMEOUT))
+        # Wait for the other threads to find the pending value
+        deadline = time.time() + TIMEOUT
+        stats = cache.getStatistics()['resolveTypeToken']
+        while stats.getHits() < THREADS - 1 and time.time() < deadline:
+            time.sleep(0.01)
+            stats = cache.getStatistics()['resolveTypeToken']
+        self.assertEqual(THREADS - 1, stats.getHits())
+        next_.released.set()
+        for thread in threads:
+            thread.join(TIMEOUT)
+            self.assertFalse(thread.is_alive())
+        return results
+
+
+    def testSingleFlight(self):
+        next_ = _NextLayer(blocking=True)
+        cache = self.createCache(next_)
+        results = self.callConcurrently(cache, next_)
+        self.assertEqual(['token:Person'] * THREADS, results)
+        self.assertEqual(['Person'], next_.calls)
+
+        stats = cache.getStatistics()['resolveTypeToken']
+        self.assertEqual(1, stats.getMisses())
+        self.assertEqual(THREADS - 1, stats.getHits())
+        self.assertTrue(stats.getComputeTime() > 0.0)
+
+
+    def testExceptionPropagatesToWaiters(self):
+        exception = ValueError('Person cannot be sent to the client')
+        next_ = _NextLayer(blocking=True, exception=exception)
+        cache = self.createCache(next_)
+        results = self.callConcurrently(cache, next_)
+        for result in results:
+            self.assertTrue(result is exception)
+        self.assertEqual(1, len(next_.calls))
+
+        # Failures are not cached
+        self.assertRaises(ValueError, cache.resolveTypeToken, 'Person')
+        self.assertEqual(2, len(next_.calls))
+
+
+    def testEviction(self):
+        next_ = _NextLayer()
+        cache = self.createCache(next_, 2)
+        cache.resolveTypeToken('A')
+        cache.resolveTypeToken('B')
+        # Using A makes B the least recently used entry
+        cache.resolveTypeToken('A')
+        cache.resolveTypeToken('C')
+        self.assertEqual(['A', 'B', 'C'], next_.calls)
+
+        cache.resolveTypeToken('A')
+        cache.resolveTypeToken('C')
+        self.assertEqual(['A', 'B', 'C'], next_.calls)
+        cache.resolveTypeToken('B')
+        self.assertEqual(['A', 'B', 'C', 'B'], next_.calls)
+
+        stats = cache.getStatistics()['resolveTypeToken']
+        self.assertEqual('resolveTypeToken', stats.getMethod())
+        self.assertEqual(3, stats.getHits())
+        self.assertEqual(4, stats.getMisses())
+        self.assertEqual(2, stats.getEvictions())
+
+
+    def testStatisticsPerMethod(self):
+        next_ = _NextLayer()
+        cache = self.createCache(next_)
+        cache.resolveTypeToken('A')
+        statistics = cache.getStatistics()
+        self.assertEqual(set(ServiceLayerCache.CACHED_METHODS),
+                set(statistics))
+        self.assertEqual(0, statistics['resolveClass'].getMisses())
+        self.assertEqual(1, statistics['resolveTypeToken'].getMisses())
+
+
+    def testClear(self):
+        next_ = _NextLayer()
+        cache = self.createCache(next_)
+        cache.resolveTypeToken('A')
+        cache.clear()
+        cache.resolveTypeToken('A')
+        self.assertEqual(['A', 'A'], next_.calls)
+        # The statistics are retained
+        self.assertEqual(2,
+                cache.getStatistics()['resolveTypeToken'].getMisses())
+
+
+if __name__ == '__main__':
+    unittest.main()
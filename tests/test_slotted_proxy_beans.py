@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Copyright 2012 Richard Lincoln
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+
+"""Tests resolving a response with SLOTTED_PROXY_BEANS set, from the Resolver
+through to the operations written by the SimpleRequestProcessor.
+"""
+
+import unittest
+
+from requestfactory.shared.entity_proxy import EntityProxy
+from requestfactory.shared.impl.constants import Constants
+from requestfactory.shared.impl.entity_codex import EntityCodex
+
+from requestfactory.server import request_state
+from requestfactory.server.proxy_bean import ProxyBean, getAutoBean
+from requestfactory.server.request_state import RequestState
+from requestfactory.server.service_layer import ServiceLayer
+from requestfactory.server.service_layer_decorator import ServiceLayerDecorator
+from requestfactory.server.simple_request_processor import \
+    SimpleRequestProcessor
+
+
+class Person(object):
+
+    def __init__(self, id_, name, friend=None):
+        self._id = id_
+        self._name = name
+        self._friend = friend
+
+    def getId(self):
+        return self._id
+
+    def getName(self):
+        return self._name
+
+    def getFriend(self):
+        return self._friend
+
+    def getVersion(self):
+        return 1
+
+
+class PersonProxy(EntityProxy):
+
+    def getName(self):
+        raise NotImplementedError
+
+    def setName(self, name):
+        raise NotImplementedError
+
+    def getFriend(self):
+        raise NotImplementedError
+
+    def setFriend(self, friend):
+        raise NotImplementedError
+
+
+class _PersonServiceLayer(ServiceLayerDecorator):
+    """Maps Person to PersonProxy and treats every Person as live."""
+
+    def __init__(self):
+        super(_PersonServiceLayer, self).__init__()
+        self.prefetched = list()
+
+    def getId(self, domainObject):
+        return domainObject.getId()
+
+    def getVersion(self, domainObject):
+        return domainObject.getVersion()
+
+    def getVersions(self, domainObjects):
+        return [o.getVersion() for o in domainObjects]
+
+    def isLiveBatch(self, domainObjects):
+        return [True] * len(domainObjects)
+
+    def prefetch(self, domainObjects, propertyPaths):
+        self.prefetched.append((list(domainObjects), propertyPaths))
+
+    def resolveClientType(self, domainClass, clientClass, required):
+        if domainClass is Person and issubclass(PersonProxy, clientClass):
+            return PersonProxy
+        return self.getNext().resolveClientType(domainClass, clientClass,
+                required)
+
+    def resolveTypeToken(self, clazz):
+        return clazz.__name__
+
+
+class SlottedProxyBeansTest(unittest.TestCase):
+
+    def setUp(self):
+        self.slotted = request_state.SLOTTED_PROXY_BEANS
+        request_state.SLOTTED_PROXY_BEANS = True
+        self.decorator = _PersonServiceLayer()
+        self.service = ServiceLayer.create(self.decorator)
+        self.state = RequestState(self.service)
+        self.bob = Person(2, 'bob')
+        self.alice = Person(1, 'alice', self.bob)
+
+
+    def tearDown(self):
+        request_state.SLOTTED_PROXY_BEANS = self.slotted
+
+
+    def resolve(self, propertyRefs):
+        return self.state.getResolver().resolveClientValue(self.alice,
+                PersonProxy, propertyRefs)
+
+
+    def testResolveClientValue(self):
+        alice = self.resolve(set(['friend']))
+        self.assertTrue(isinstance(alice, PersonProxy))
+        self.assertTrue(isinstance(getAutoBean(alice), ProxyBean))
+        self.assertTrue(getAutoBean(alice).getTag(Constants.DOMAIN_OBJECT)
+                is self.alice)
+        self.assertEqual('alice', alice.getName())
+
+        bob = alice.getFriend()
+        self.assertTrue(isinstance(getAutoBean(bob), ProxyBean))
+        self.assertEqual('bob', bob.getName())
+        self.assertEqual(None, bob.getFriend())
+
+        # The friend path is prefetched once for the group holding alice
+        self.assertEqual(1, len(self.decorator.prefetched))
+        self.assertTrue(self.decorator.prefetched[0][0][0] is self.alice)
+
+
+    def testUnrequestedReference(self):
+        alice = self.resolve(set())
+        self.assertEqual('alice', alice.getName())
+        self.assertEqual(None, alice.getFriend())
+        self.assertEqual(0, len(self.decorator.prefetched))
+
+
+    def testToEncodable(self):
+        alice = self.resolve(set(['friend']))
+        bobId = getAutoBean(alice.getFriend()).getTag(Constants.STABLE_ID)
+        self.assertEqual(bobId, self.state.toEncodable(alice.getFriend()))
+        self.assertEqual([bobId], self.state.toEncodable([alice.getFriend()]))
+        self.assertEqual('x', self.state.toEncodable('x'))
+
+        request_state.SLOTTED_PROXY_BEANS = False
+        self.assertTrue(self.state.toEncodable(alice) is alice)
+
+
+    def testCreateReturnOperations(self):
+        alice = self.resolve(set(['friend']))
+        bob = alice.getFriend()
+        for bean in self.state.beans.values():
+            self.assertTrue(isinstance(bean, ProxyBean))
+
+        operations = list()
+        SimpleRequestProcessor(self.service).createReturnOperations(operations,
+                self.state, self.state.beans)
+        self.assertEqual(2, len(operations))
+        for op in operations:
+            self.assertEqual('PersonProxy', op.getTypeToken())
+
+        propertyMaps = dict((op.getServerId(), op.getPropertyMap())
+                for op in operations)
+        aliceMap = propertyMaps[self.state.toBase64(
+                getAutoBean(alice).getTag(Constants.STABLE_ID).getServerId())]
+        self.assertEqual(set(['name', 'friend']), set(aliceMap.keys()))
+        # The friend is written as the stable id of its bean
+        bobId = getAutoBean(bob).getTag(Constants.STABLE_ID)
+        self.assertEqual(EntityCodex.encode(self.state, bobId).getPayload(),
+                aliceMap['friend'].getPayload())
+
+
+if __name__ == '__main__':
+    unittest.main()